@@ -1,3 +1,5 @@
+#include "interval.hpp"
+#include "report.hpp"
 #include <asio.hpp>
 #include <asio/experimental/channel.hpp>
 #include <chrono>
@@ -5,6 +7,10 @@
 static size_t buffer_size = 1024;
 static size_t num_messages = 1'000'000;
 static size_t task_pair = 1;
+static size_t producers = 1;
+static bool json_output = false;
+static int interval_ms = 0;
+static IntervalCounter progress;
 
 using asio::as_tuple;
 using asio::awaitable;
@@ -12,11 +18,15 @@ using asio::io_context;
 using asio::use_awaitable;
 using asio::experimental::channel;
 
-awaitable<void> producer(channel<void(asio::error_code, std::size_t)> &ch) {
+// The last producer of a channel to finish closes it
+awaitable<void> producer(channel<void(asio::error_code, std::size_t)> &ch,
+                         size_t &remaining) {
     for (int i = 0; i < num_messages; ++i) {
         co_await ch.async_send(asio::error_code{}, i);
     }
-    ch.close();
+    if (--remaining == 0) {
+        ch.close();
+    }
     co_return;
 }
 
@@ -27,27 +37,38 @@ awaitable<void> consumer(channel<void(asio::error_code, std::size_t)> &ch) {
         if (ec)
             break;
         ++count;
+        progress.add();
     }
     co_return;
 }
 
 void usage(const char *prog_name) {
     std::printf(
-        "Usage: %s [-h] [-b buffer_size] [-n num_messages] [-p task_pair]\n"
+        "Usage: %s [-hj] [-i interval_ms] [-b buffer_size] [-n num_messages] "
+        "[-p task_pair] [-P producers]\n"
         "  -h              Show this help message\n"
-        "  -b buffer_size  Set the buffer size\n"
-        "  -n num_messages Set the number of messages\n"
-        "  -p task_pair    Set the task pair\n",
+        "  -j              Print metrics and config as JSON\n"
+        "  -i interval_ms  Sample progress every interval_ms\n"
+        "  -b buffer_size  Set the buffer size, 0 for a rendezvous channel\n"
+        "  -n num_messages Set the number of messages per producer\n"
+        "  -p task_pair    Set the task pair\n"
+        "  -P producers    Producers feeding each consumer (default 1)\n",
         prog_name);
 }
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hmb:n:p:")) != -1) {
+    while ((opt = getopt(argc, argv, "hji:mb:n:p:P:")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
         case 'b':
             buffer_size = std::stoul(optarg);
             break;
@@ -57,6 +78,9 @@ int main(int argc, char *argv[]) {
         case 'p':
             task_pair = std::stoul(optarg);
             break;
+        case 'P':
+            producers = std::stoul(optarg);
+            break;
         default:
             usage(argv[0]);
             return 1;
@@ -65,25 +89,46 @@ int main(int argc, char *argv[]) {
 
     io_context io;
 
+    // A capacity of 0 makes every send wait for its receive
     std::vector<std::unique_ptr<channel<void(asio::error_code, std::size_t)>>>
         channels;
+    std::vector<size_t> remaining(task_pair, producers);
     for (size_t i = 0; i < task_pair; ++i) {
         channels.push_back(
             std::make_unique<channel<void(asio::error_code, std::size_t)>>(
                 io.get_executor(), buffer_size));
-        asio::co_spawn(io, producer(*channels.back()), asio::detached);
+        for (size_t j = 0; j < producers; ++j) {
+            asio::co_spawn(io, producer(*channels.back(), remaining[i]),
+                           asio::detached);
+        }
         asio::co_spawn(io, consumer(*channels.back()), asio::detached);
     }
 
+    IntervalSampler sampler(interval_ms, !json_output, &progress);
+    sampler.start();
+
     auto start = std::chrono::high_resolution_clock::now();
 
     io.run();
 
     auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
     auto duration =
         std::chrono::duration_cast<std::chrono::milliseconds>(end - start)
             .count();
-    std::printf("time_ms:%ld\n", duration);
+    std::chrono::duration<double> elapsed = end - start;
+    size_t total_messages = num_messages * producers * task_pair;
+    Report report("channel", "asio");
+    report.config("buffer_size", buffer_size);
+    report.config("num_messages", num_messages);
+    report.config("task_pair", task_pair);
+    report.config("producers", producers);
+    report.config("interval_ms", interval_ms);
+    report.metric("time_ms", duration);
+    report.metric("messages_per_s", total_messages / elapsed.count());
+    report.metric("ns_per_message", elapsed.count() * 1e9 / total_messages);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
 
     return 0;
 }
\ No newline at end of file
@@ -0,0 +1,284 @@
+#pragma once
+
+#include <algorithm>
+#include <cmath>
+#include <cstddef>
+#include <cstdint>
+#include <cstdio>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+// Bijection on [0, n): a 4-round Feistel network over the smallest even
+// number of bits covering n, cycle walking values that land outside. Stateless
+// and seeded, so any position is computed on demand in constant memory, and
+// matches benchmarks_rust/src/access.rs bit for bit.
+class Permutation {
+public:
+    Permutation(uint64_t n, uint64_t key) : n_(n) {
+        unsigned bits = 1;
+        while (bits < 64 && (uint64_t{1} << bits) < n) {
+            bits++;
+        }
+        half_bits_ = (bits + 1) / 2;
+        half_mask_ = (uint64_t{1} << half_bits_) - 1;
+        for (int r = 0; r < rounds; ++r) {
+            keys_[r] = stream(key, r);
+        }
+    }
+
+    uint64_t operator()(uint64_t x) const {
+        // The domain is under 4n, so this walks fewer than 4 steps on average
+        do {
+            x = encrypt(x);
+        } while (x >= n_);
+        return x;
+    }
+
+    // splitmix64 finalizer
+    static uint64_t mix(uint64_t z) {
+        z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9;
+        z = (z ^ (z >> 27)) * 0x94d049bb133111eb;
+        return z ^ (z >> 31);
+    }
+
+    // Output i of the splitmix64 generator seeded with key
+    static uint64_t stream(uint64_t key, uint64_t i) {
+        return mix(key + (i + 1) * 0x9e3779b97f4a7c15);
+    }
+
+private:
+    static constexpr int rounds = 4;
+
+    uint64_t encrypt(uint64_t x) const {
+        uint64_t left = x >> half_bits_;
+        uint64_t right = x & half_mask_;
+        for (int r = 0; r < rounds; ++r) {
+            uint64_t next = left ^ (mix(right ^ keys_[r]) & half_mask_);
+            left = right;
+            right = next;
+        }
+        return (left << half_bits_) | right;
+    }
+
+    uint64_t n_;
+    unsigned half_bits_;
+    uint64_t half_mask_;
+    uint64_t keys_[rounds];
+};
+
+struct AccessPattern;
+
+// Offset of every read, computed from its index on demand rather than stored,
+// so a multi-terabyte device costs no memory. Draws for read i come from
+// index i of a seeded stream, never from shared generator state.
+class AccessOffsets {
+public:
+    AccessOffsets(const AccessPattern &pattern, size_t num_blocks,
+                  size_t block_size, size_t num_ops, size_t seed);
+
+    size_t size() const { return num_ops_; }
+
+    size_t operator[](size_t i) const;
+
+private:
+    // Uniform in [0, bound) from a 64-bit draw
+    static uint64_t below(uint64_t draw, uint64_t bound) {
+        return static_cast<uint64_t>(
+            (static_cast<unsigned __int128>(draw) * bound) >> 64);
+    }
+
+    static double unit(uint64_t draw) {
+        return static_cast<double>(draw >> 11) * 0x1.0p-53;
+    }
+
+    int kind_;
+    size_t num_blocks_;
+    size_t block_size_;
+    size_t num_ops_;
+    uint64_t seed_;
+    uint64_t draws_;
+    Permutation blocks_;
+    // Zipf
+    double theta_ = 0, zetan_ = 0, zeta2_ = 0, alpha_ = 0, eta_ = 0;
+    // Hotspot
+    double hot_ops_ = 0;
+    size_t hot_ = 0;
+    // Runs
+    size_t run_length_ = 0;
+};
+
+// Which blocks a random read benchmark reads, and in what order. Parsed from
+// the -a option:
+//   uniform          every block once in random order, reshuffled each pass
+//   zipf:THETA       zipfian block popularity, 0 < THETA < 1
+//   hotspot:OPS:DATA OPS% of reads go to DATA% of the blocks
+//   runs:LEN         runs of LEN sequential blocks from random starts
+// Hot blocks are scattered over the file, not packed at its start.
+struct AccessPattern {
+    enum Kind { Uniform, Zipf, Hotspot, Runs };
+
+    Kind kind = Uniform;
+    double theta = 0.99;
+    double hot_ops = 0.9;
+    double hot_data = 0.1;
+    size_t run_length = 16;
+
+    static AccessPattern parse(const std::string &spec) {
+        AccessPattern pattern;
+        std::vector<std::string> parts;
+        size_t start = 0;
+        while (true) {
+            size_t colon = spec.find(':', start);
+            parts.push_back(spec.substr(start, colon - start));
+            if (colon == std::string::npos) {
+                break;
+            }
+            start = colon + 1;
+        }
+        const std::string &name = parts[0];
+        if (name == "uniform" && parts.size() == 1) {
+            pattern.kind = Uniform;
+        } else if (name == "zipf" && parts.size() == 2) {
+            pattern.kind = Zipf;
+            pattern.theta = std::stod(parts[1]);
+            if (!(pattern.theta > 0 && pattern.theta < 1)) {
+                throw std::invalid_argument("zipf theta must be in (0, 1)");
+            }
+        } else if (name == "hotspot" && parts.size() == 3) {
+            pattern.kind = Hotspot;
+            pattern.hot_ops = std::stod(parts[1]) / 100;
+            pattern.hot_data = std::stod(parts[2]) / 100;
+            if (!(pattern.hot_ops >= 0 && pattern.hot_ops <= 1 &&
+                  pattern.hot_data > 0 && pattern.hot_data <= 1)) {
+                throw std::invalid_argument("hotspot percentages out of range");
+            }
+        } else if (name == "runs" && parts.size() == 2) {
+            pattern.kind = Runs;
+            pattern.run_length = std::stoul(parts[1]);
+            if (pattern.run_length == 0) {
+                throw std::invalid_argument("run length must be positive");
+            }
+        } else {
+            throw std::invalid_argument("unknown access pattern: " + spec);
+        }
+        return pattern;
+    }
+
+    // Offsets of num_ops reads; num_ops == 0 reads as many blocks as the
+    // file has, so uniform keeps reading every block exactly once
+    AccessOffsets offsets(size_t num_blocks, size_t block_size,
+                          size_t num_ops, size_t seed) const {
+        return AccessOffsets(*this, num_blocks, block_size, num_ops, seed);
+    }
+
+    std::string name() const {
+        switch (kind) {
+        case Zipf:
+            return "zipf:" + format(theta);
+        case Hotspot:
+            return "hotspot:" + format(hot_ops * 100) + ":" +
+                   format(hot_data * 100);
+        case Runs:
+            return "runs:" + std::to_string(run_length);
+        default:
+            return "uniform";
+        }
+    }
+
+private:
+    static std::string format(double value) {
+        char buf[32];
+        std::snprintf(buf, sizeof(buf), "%g", value);
+        return buf;
+    }
+};
+
+inline AccessOffsets::AccessOffsets(const AccessPattern &pattern,
+                                    size_t num_blocks, size_t block_size,
+                                    size_t num_ops, size_t seed)
+    : kind_(pattern.kind), num_blocks_(num_blocks), block_size_(block_size),
+      num_ops_(num_blocks == 0 ? 0 : num_ops == 0 ? num_blocks : num_ops),
+      seed_(seed), draws_(Permutation::mix(seed)), blocks_(num_blocks, seed) {
+    if (num_blocks == 0) {
+        return;
+    }
+    switch (pattern.kind) {
+    case AccessPattern::Zipf: {
+        // Gray et al., "Quickly generating billion-record synthetic
+        // databases", as used by YCSB; rank 0 is the most popular block.
+        // Past 2^20 blocks the tail of zeta(n) is integrated instead of
+        // summed, so setup stays fast on whole devices.
+        theta_ = pattern.theta;
+        size_t exact = std::min<size_t>(num_blocks, size_t{1} << 20);
+        for (size_t i = 1; i <= exact; ++i) {
+            zetan_ += 1 / std::pow(static_cast<double>(i), theta_);
+        }
+        if (num_blocks > exact) {
+            double a = static_cast<double>(exact) + 0.5;
+            double b = static_cast<double>(num_blocks) + 0.5;
+            zetan_ +=
+                (std::pow(b, 1 - theta_) - std::pow(a, 1 - theta_)) /
+                (1 - theta_);
+        }
+        zeta2_ = 1 + 1 / std::pow(2.0, theta_);
+        alpha_ = 1 / (1 - theta_);
+        eta_ = (1 - std::pow(2.0 / num_blocks, 1 - theta_)) /
+               (1 - zeta2_ / zetan_);
+        break;
+    }
+    case AccessPattern::Hotspot:
+        hot_ops_ = pattern.hot_ops;
+        hot_ = std::max<size_t>(
+            1, static_cast<size_t>(std::round(pattern.hot_data * num_blocks)));
+        hot_ = std::min(hot_, num_blocks);
+        break;
+    case AccessPattern::Runs:
+        run_length_ = std::min(pattern.run_length, num_blocks);
+        break;
+    default:
+        break;
+    }
+}
+
+inline size_t AccessOffsets::operator[](size_t i) const {
+    switch (kind_) {
+    case AccessPattern::Zipf: {
+        double u = unit(Permutation::stream(draws_, i));
+        double uz = u * zetan_;
+        size_t rank;
+        if (uz < 1) {
+            rank = 0;
+        } else if (uz < zeta2_) {
+            rank = 1;
+        } else {
+            rank = static_cast<size_t>(
+                num_blocks_ * std::pow(eta_ * u - eta_ + 1, alpha_));
+        }
+        rank = std::min(rank, num_blocks_ - 1);
+        return blocks_(rank) * block_size_;
+    }
+    case AccessPattern::Hotspot: {
+        bool to_hot = hot_ == num_blocks_ ||
+                      unit(Permutation::stream(draws_, 2 * i)) < hot_ops_;
+        uint64_t draw = Permutation::stream(draws_, 2 * i + 1);
+        size_t index = to_hot ? below(draw, hot_)
+                              : hot_ + below(draw, num_blocks_ - hot_);
+        return blocks_(index) * block_size_;
+    }
+    case AccessPattern::Runs: {
+        size_t run = i / run_length_;
+        size_t first = below(Permutation::stream(draws_, run),
+                             num_blocks_ - run_length_ + 1);
+        return (first + i % run_length_) * block_size_;
+    }
+    default: {
+        // Each pass over the file is a fresh permutation
+        size_t pass = i / num_blocks_;
+        size_t block = pass == 0 ? blocks_(i)
+                                 : Permutation(num_blocks_, seed_ + pass)(
+                                       i % num_blocks_);
+        return block * block_size_;
+    }
+    }
+}
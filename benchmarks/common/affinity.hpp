@@ -0,0 +1,36 @@
+#pragma once
+
+#include <pthread.h>
+#include <sched.h>
+#include <sys/resource.h>
+
+// Lift the soft open file limit to the hard one, for many connections
+inline void raise_fd_limit() {
+    rlimit limit;
+    if (getrlimit(RLIMIT_NOFILE, &limit) == 0 &&
+        limit.rlim_cur < limit.rlim_max) {
+        limit.rlim_cur = limit.rlim_max;
+        setrlimit(RLIMIT_NOFILE, &limit);
+    }
+}
+
+// Pin the calling thread to the n-th CPU it may run on, wrapping around, so
+// workers spread over whatever set taskset gave the process
+inline void pin_to_nth_allowed_cpu(int n) {
+    cpu_set_t allowed;
+    CPU_ZERO(&allowed);
+    if (sched_getaffinity(0, sizeof(allowed), &allowed) < 0) {
+        return;
+    }
+    int count = CPU_COUNT(&allowed);
+    int target = n % count;
+    for (int cpu = 0; cpu < CPU_SETSIZE; ++cpu) {
+        if (CPU_ISSET(cpu, &allowed) && target-- == 0) {
+            cpu_set_t set;
+            CPU_ZERO(&set);
+            CPU_SET(cpu, &set);
+            pthread_setaffinity_np(pthread_self(), sizeof(set), &set);
+            return;
+        }
+    }
+}
@@ -0,0 +1,113 @@
+#pragma once
+
+#include "report.hpp"
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <cstdio>
+#include <mutex>
+#include <thread>
+
+// Work completed by one thread. Only the owning thread writes, so a relaxed
+// load and store is enough and compiles to plain moves, the hot path pays no
+// locked instruction. Aligned so counters of different threads never share a
+// cache line.
+struct alignas(64) IntervalCounter {
+    std::atomic<uint64_t> ops{0};
+    std::atomic<uint64_t> bytes{0};
+
+    void add(uint64_t n = 0) {
+        ops.store(ops.load(std::memory_order_relaxed) + 1,
+                  std::memory_order_relaxed);
+        bytes.store(bytes.load(std::memory_order_relaxed) + n,
+                    std::memory_order_relaxed);
+    }
+};
+
+// Snapshots the sum of a set of counters every interval_ms from a background
+// thread, plus once more at stop(), so the last interval is usually partial.
+// With interval_ms == 0 it does nothing and the record has no intervals.
+class IntervalSampler {
+public:
+    IntervalSampler(int interval_ms, bool live, const IntervalCounter *counters,
+                    size_t num_counters = 1)
+        : interval_(interval_ms), live_(live), counters_(counters),
+          num_counters_(num_counters) {}
+
+    ~IntervalSampler() { stop(); }
+
+    void start() {
+        if (interval_.count() <= 0) {
+            return;
+        }
+        start_ = std::chrono::steady_clock::now();
+        thread_ = std::thread([this] { loop(); });
+    }
+
+    void stop() {
+        if (!thread_.joinable()) {
+            return;
+        }
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            stopping_ = true;
+        }
+        cv_.notify_one();
+        thread_.join();
+        sample();
+    }
+
+    const Intervals &intervals() const { return intervals_; }
+
+private:
+    void loop() {
+        auto next = start_;
+        std::unique_lock<std::mutex> lock(mutex_);
+        while (true) {
+            // Wake on a fixed grid so a slow sample does not shift later ones
+            next += interval_;
+            if (cv_.wait_until(lock, next, [this] { return stopping_; })) {
+                return;
+            }
+            sample();
+        }
+    }
+
+    void sample() {
+        uint64_t ops = 0;
+        uint64_t bytes = 0;
+        for (size_t i = 0; i < num_counters_; ++i) {
+            ops += counters_[i].ops.load(std::memory_order_relaxed);
+            bytes += counters_[i].bytes.load(std::memory_order_relaxed);
+        }
+        std::chrono::duration<double, std::milli> t =
+            std::chrono::steady_clock::now() - start_;
+        if (live_) {
+            double dt_s = (t.count() - last_t_ms_) / 1000;
+            std::fprintf(stderr, "interval:%.0fms ops/s:%.0f MB/s:%.2f\n",
+                         t.count(), (ops - last_ops_) / dt_s,
+                         (bytes - last_bytes_) / dt_s / (1024 * 1024));
+        }
+        intervals_.t_ms.push_back(t.count());
+        intervals_.ops.push_back(ops);
+        intervals_.bytes.push_back(bytes);
+        last_t_ms_ = t.count();
+        last_ops_ = ops;
+        last_bytes_ = bytes;
+    }
+
+    std::chrono::milliseconds interval_;
+    bool live_;
+    const IntervalCounter *counters_;
+    size_t num_counters_;
+    std::chrono::steady_clock::time_point start_;
+    std::thread thread_;
+    std::mutex mutex_;
+    std::condition_variable cv_;
+    bool stopping_ = false;
+    Intervals intervals_;
+    double last_t_ms_ = 0;
+    uint64_t last_ops_ = 0;
+    uint64_t last_bytes_ = 0;
+};
@@ -0,0 +1,54 @@
+#pragma once
+
+#include "report.hpp"
+#include <cstdint>
+#include <cstdio>
+#include <dlfcn.h>
+#include <optional>
+#include <sys/resource.h>
+#include <unistd.h>
+
+// Resident set size right now, from /proc/self/statm
+inline size_t current_rss_kb() {
+    size_t pages = 0, resident = 0;
+    FILE *statm = std::fopen("/proc/self/statm", "r");
+    if (statm == nullptr) {
+        return 0;
+    }
+    if (std::fscanf(statm, "%zu %zu", &pages, &resident) != 2) {
+        resident = 0;
+    }
+    std::fclose(statm);
+    return resident * (sysconf(_SC_PAGESIZE) / 1024);
+}
+
+// Highest resident set size of this process so far
+inline size_t peak_rss_kb() {
+    rusage usage;
+    getrusage(RUSAGE_SELF, &usage);
+    return usage.ru_maxrss;
+}
+
+// Heap allocations so far, when the malloc_count library is preloaded
+inline std::optional<uint64_t> malloc_count() {
+    using counter = uint64_t (*)();
+    auto allocations = reinterpret_cast<counter>(
+        dlsym(RTLD_DEFAULT, "malloc_count_allocations"));
+    if (allocations == nullptr) {
+        return std::nullopt;
+    }
+    return allocations();
+}
+
+// Baseline and peak RSS, and the heap allocations since allocations_start
+// when they are counted. Taken before any task is spawned, the baseline
+// leaves only the tasks' own cost in the difference.
+inline void add_memory_metrics(Report &report, size_t rss_baseline_kb,
+                               std::optional<uint64_t> allocations_start) {
+    report.metric("rss_baseline_kb", rss_baseline_kb);
+    report.metric("peak_rss_kb", peak_rss_kb());
+    std::optional<uint64_t> allocations_end = malloc_count();
+    if (allocations_start && allocations_end) {
+        report.metric("allocations", *allocations_end - *allocations_start);
+    }
+}
@@ -0,0 +1,216 @@
+#pragma once
+
+#include <charconv>
+#include <cmath>
+#include <cstdint>
+#include <cstdio>
+#include <ctime>
+#include <fstream>
+#include <string>
+#include <sys/resource.h>
+#include <sys/utsname.h>
+#include <type_traits>
+#include <unistd.h>
+#include <utility>
+#include <vector>
+
+// Bump whenever fields are renamed or change meaning, scripts/record.py
+// rejects versions it does not know
+constexpr int REPORT_SCHEMA_VERSION = 1;
+
+// Cumulative progress sampled while a benchmark runs, one entry per sample
+struct Intervals {
+    std::vector<double> t_ms;
+    std::vector<uint64_t> ops;
+    std::vector<uint64_t> bytes;
+};
+
+// Collects the metrics and effective configuration of one run. print()
+// writes the metrics as key:value lines, or everything as one JSON record.
+class Report {
+public:
+    Report(std::string benchmark, std::string implementation)
+        : benchmark_(std::move(benchmark)),
+          implementation_(std::move(implementation)) {}
+
+    template <typename T> void config(const std::string &key, const T &value) {
+        config_.emplace_back(key, to_json(value));
+    }
+
+    template <typename T>
+    void metric(const std::string &key, T value, int precision = 2) {
+        std::string text;
+        if constexpr (std::is_integral_v<T>) {
+            text = std::to_string(value);
+        } else {
+            char buf[64];
+            std::snprintf(buf, sizeof(buf), "%.*f", precision,
+                          static_cast<double>(value));
+            text = buf;
+        }
+        metrics_.push_back({key, text, to_json(value)});
+    }
+
+    // Only written to the JSON record, as columns of equal length
+    void intervals(const Intervals &intervals) {
+        if (intervals.t_ms.empty()) {
+            intervals_.clear();
+            return;
+        }
+        intervals_ = "{\"t_ms\":" + array(intervals.t_ms) +
+                     ",\"ops\":" + array(intervals.ops) +
+                     ",\"bytes\":" + array(intervals.bytes) + "}";
+    }
+
+    void print(bool json) const {
+        auto all = with_max_rss();
+        if (!json) {
+            for (const auto &m : all) {
+                std::printf("%s:%s\n", m.key.c_str(), m.text.c_str());
+            }
+            return;
+        }
+
+        std::string out = "{\"schema_version\":" +
+                          std::to_string(REPORT_SCHEMA_VERSION);
+        out += ",\"benchmark\":" + to_json(benchmark_);
+        out += ",\"implementation\":" + to_json(implementation_);
+        out += ",\"timestamp\":" + std::to_string(std::time(nullptr));
+        out += ",\"config\":" + object(config_);
+        out += ",\"env\":" + object(environment());
+        std::vector<std::pair<std::string, std::string>> metrics;
+        for (const auto &m : all) {
+            metrics.emplace_back(m.key, m.json);
+        }
+        out += ",\"metrics\":" + object(metrics);
+        if (!intervals_.empty()) {
+            out += ",\"intervals\":" + intervals_;
+        }
+        out += "}";
+        std::printf("%s\n", out.c_str());
+    }
+
+private:
+    struct Metric {
+        std::string key;
+        std::string text;
+        std::string json;
+    };
+
+    // Peak RSS is only meaningful from inside the process, the harness sees
+    // its own high-water mark folded in at fork and exec
+    std::vector<Metric> with_max_rss() const {
+        auto metrics = metrics_;
+        rusage usage;
+        if (getrusage(RUSAGE_SELF, &usage) == 0) {
+            auto kb = std::to_string(usage.ru_maxrss);
+            metrics.push_back({"max_rss_kb", kb, kb});
+        }
+        return metrics;
+    }
+
+    static std::string to_json(const std::string &value) {
+        std::string out = "\"";
+        for (char c : value) {
+            if (c == '"' || c == '\\') {
+                out += '\\';
+                out += c;
+            } else if (static_cast<unsigned char>(c) < 0x20) {
+                char buf[8];
+                std::snprintf(buf, sizeof(buf), "\\u%04x", c);
+                out += buf;
+            } else {
+                out += c;
+            }
+        }
+        return out + "\"";
+    }
+
+    static std::string to_json(const char *value) {
+        return to_json(std::string(value));
+    }
+
+    template <typename T> static std::string to_json(T value) {
+        static_assert(std::is_arithmetic_v<T>, "unsupported value type");
+        if constexpr (std::is_same_v<T, bool>) {
+            return value ? "true" : "false";
+        } else if constexpr (std::is_integral_v<T>) {
+            return std::to_string(value);
+        } else {
+            if (!std::isfinite(value)) {
+                return "null";
+            }
+            // Shortest representation that parses back to the same double
+            char buf[64];
+            auto [end, ec] = std::to_chars(buf, buf + sizeof(buf),
+                                           static_cast<double>(value));
+            return std::string(buf, end);
+        }
+    }
+
+    static std::string
+    object(const std::vector<std::pair<std::string, std::string>> &fields) {
+        std::string out = "{";
+        for (size_t i = 0; i < fields.size(); ++i) {
+            if (i > 0) {
+                out += ",";
+            }
+            out += to_json(fields[i].first) + ":" + fields[i].second;
+        }
+        return out + "}";
+    }
+
+    template <typename T>
+    static std::string array(const std::vector<T> &values) {
+        std::string out = "[";
+        for (size_t i = 0; i < values.size(); ++i) {
+            if (i > 0) {
+                out += ",";
+            }
+            out += to_json(values[i]);
+        }
+        return out + "]";
+    }
+
+    static std::string cpu_model() {
+        std::ifstream cpuinfo("/proc/cpuinfo");
+        std::string line;
+        while (std::getline(cpuinfo, line)) {
+            if (line.rfind("model name", 0) == 0) {
+                auto pos = line.find(':');
+                if (pos != std::string::npos) {
+                    return line.substr(line.find_first_not_of(' ', pos + 1));
+                }
+            }
+        }
+        return "unknown";
+    }
+
+    static std::vector<std::pair<std::string, std::string>> environment() {
+        utsname uts;
+        uname(&uts);
+        char hostname[256] = {};
+        gethostname(hostname, sizeof(hostname) - 1);
+        std::vector<std::pair<std::string, std::string>> env = {
+            {"hostname", to_json(std::string(hostname))},
+            {"kernel", to_json(std::string(uts.release))},
+            {"machine", to_json(std::string(uts.machine))},
+            {"cpu_model", to_json(cpu_model())},
+            {"online_cpus", to_json(sysconf(_SC_NPROCESSORS_ONLN))},
+            {"compiler", to_json(__VERSION__)},
+        };
+        // Only defined for binaries that link Condy, so that a submodule bump
+        // leaves every other binary, and its cached results, untouched. The
+        // repository commit is added by scripts/record.py at run time.
+#ifdef CONDY_COMMIT
+        env.emplace_back("condy_commit", to_json(CONDY_COMMIT));
+#endif
+        return env;
+    }
+
+    std::string benchmark_;
+    std::string implementation_;
+    std::vector<std::pair<std::string, std::string>> config_;
+    std::vector<Metric> metrics_;
+    std::string intervals_;
+};
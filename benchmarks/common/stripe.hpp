@@ -0,0 +1,88 @@
+#pragma once
+
+#include <algorithm>
+#include <cstddef>
+#include <cstdio>
+#include <fcntl.h>
+#include <string>
+#include <unistd.h>
+#include <vector>
+
+// Which of num_files files a byte offset into the stripe falls in, and where
+// in that file
+inline size_t stripe_file(size_t offset, size_t block_size, size_t num_files) {
+    return offset / block_size % num_files;
+}
+
+inline size_t stripe_offset(size_t offset, size_t block_size,
+                            size_t num_files) {
+    return offset / block_size / num_files * block_size + offset % block_size;
+}
+
+// Reads striped across several files, typically one per device. Block b of
+// the stripe lives in file b % num_files at block b / num_files, like RAID 0
+// with one block per chunk, so a single file reads exactly as before.
+class Stripe {
+public:
+    bool open(char **names, size_t count, size_t block_size, bool direct_io) {
+        int oflags = O_RDONLY;
+        if (direct_io) {
+            oflags |= O_DIRECT;
+        }
+        for (size_t i = 0; i < count; ++i) {
+            int file = ::open(names[i], oflags);
+            if (file < 0) {
+                perror(names[i]);
+                close();
+                return false;
+            }
+            size_t file_size = lseek(file, 0, SEEK_END);
+            lseek(file, 0, SEEK_SET);
+            size_t blocks = (file_size + block_size - 1) / block_size;
+            // The stripe is as deep as its shortest file
+            blocks_per_file_ =
+                i == 0 ? blocks : std::min(blocks_per_file_, blocks);
+            sizes_.push_back(file_size);
+            names_.push_back(names[i]);
+            fds_.push_back(file);
+        }
+        return !fds_.empty();
+    }
+
+    void close() {
+        for (int file : fds_) {
+            ::close(file);
+        }
+        fds_.clear();
+    }
+
+    size_t num_files() const { return fds_.size(); }
+    size_t num_blocks() const { return blocks_per_file_ * fds_.size(); }
+    size_t blocks_per_file() const { return blocks_per_file_; }
+    // Bytes across all files, the file size when there is only one
+    size_t size() const {
+        size_t total = 0;
+        for (size_t file_size : sizes_) {
+            total += file_size;
+        }
+        return total;
+    }
+    size_t file_size(size_t i) const { return sizes_[i]; }
+    int fd(size_t i) const { return fds_[i]; }
+    const int *fds() const { return fds_.data(); }
+
+    // Comma separated, for the report
+    std::string names() const {
+        std::string out;
+        for (size_t i = 0; i < names_.size(); ++i) {
+            out += (i > 0 ? "," : "") + names_[i];
+        }
+        return out;
+    }
+
+private:
+    size_t blocks_per_file_ = 0;
+    std::vector<std::string> names_;
+    std::vector<size_t> sizes_;
+    std::vector<int> fds_;
+};
@@ -0,0 +1,73 @@
+#pragma once
+
+#include "access.hpp"
+#include <cstddef>
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+#include <fcntl.h>
+#include <random>
+#include <string>
+#include <unistd.h>
+#include <vector>
+
+// Where a write benchmark writes, selected with the -m option:
+//   append  blocks in file order into a truncated file, like a log
+//   random  every block of an existing file overwritten once in random order
+inline bool valid_write_mode(const std::string &mode) {
+    return mode == "append" || mode == "random";
+}
+
+inline std::vector<size_t> write_offsets(const std::string &mode,
+                                         size_t num_blocks, size_t block_size,
+                                         size_t seed) {
+    AccessOffsets shuffled = AccessPattern().offsets(num_blocks, block_size,
+                                                     0, seed);
+    std::vector<size_t> offsets(num_blocks);
+    for (size_t i = 0; i < num_blocks; ++i) {
+        offsets[i] = mode == "random" ? shuffled[i] : i * block_size;
+    }
+    return offsets;
+}
+
+// Random overwrites need the extents allocated up front, otherwise they
+// measure block allocation rather than overwriting
+inline int open_write_file(const std::string &filename,
+                           const std::string &mode, size_t size,
+                           bool direct_io) {
+    int oflags = O_WRONLY;
+    if (direct_io) {
+        oflags |= O_DIRECT;
+    }
+    if (mode == "append") {
+        oflags |= O_CREAT | O_TRUNC;
+    }
+    int file = open(filename.c_str(), oflags, 0644);
+    if (file < 0) {
+        perror("open");
+        return -1;
+    }
+    if (mode == "random" &&
+        static_cast<size_t>(lseek(file, 0, SEEK_END)) < size) {
+        std::fprintf(stderr, "%s is smaller than %zu bytes\n",
+                     filename.c_str(), size);
+        close(file);
+        return -1;
+    }
+    return file;
+}
+
+// Incompressible data, so compressing or deduplicating filesystems cannot
+// skip the writes
+inline void fill_random(char *buffer, size_t size, size_t seed) {
+    std::mt19937_64 rng{seed};
+    for (size_t i = 0; i + sizeof(uint64_t) <= size; i += sizeof(uint64_t)) {
+        uint64_t value = rng();
+        std::memcpy(buffer + i, &value, sizeof(value));
+    }
+}
+
+// An fdatasync follows every sync_every-th write, none if it is 0
+inline bool syncs_after(size_t index, size_t sync_every) {
+    return sync_every > 0 && (index + 1) % sync_every == 0;
+}
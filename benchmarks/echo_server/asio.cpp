@@ -1,4 +1,9 @@
+#include "affinity.hpp"
 #include <asio.hpp>
+#include <memory>
+#include <thread>
+#include <unistd.h>
+#include <vector>
 
 using asio::awaitable;
 using asio::co_spawn;
@@ -7,8 +12,12 @@ using asio::use_awaitable;
 using asio::ip::tcp;
 namespace this_coro = asio::this_coro;
 
+constexpr int BACKLOG = 4096;
 constexpr size_t MAX_MESSAGE_LEN = 2048;
 
+using reuse_port =
+    asio::detail::socket_option::boolean<SOL_SOCKET, SO_REUSEPORT>;
+
 awaitable<void> session(tcp::socket socket) {
     char data[MAX_MESSAGE_LEN];
     for (;;) {
@@ -23,10 +32,8 @@ awaitable<void> session(tcp::socket socket) {
     }
 }
 
-awaitable<void> listener(std::string host, uint16_t port) {
+awaitable<void> listener(tcp::acceptor acceptor) {
     auto executor = co_await this_coro::executor;
-    tcp::endpoint endpoint(asio::ip::make_address(host), port);
-    tcp::acceptor acceptor(executor, endpoint);
 
     for (;;) {
         tcp::socket socket = co_await acceptor.async_accept(use_awaitable);
@@ -34,18 +41,76 @@ awaitable<void> listener(std::string host, uint16_t port) {
     }
 }
 
+// Every worker owns a listening socket bound to the same port, the kernel
+// spreads incoming connections across them
+tcp::acceptor create_listener(asio::io_context &ctx,
+                              const tcp::endpoint &endpoint) {
+    tcp::acceptor acceptor(ctx);
+    acceptor.open(endpoint.protocol());
+    acceptor.set_option(tcp::acceptor::reuse_address(true));
+    acceptor.set_option(reuse_port(true));
+    acceptor.bind(endpoint);
+    acceptor.listen(BACKLOG);
+    return acceptor;
+}
+
+void usage(const char *prog_name) {
+    std::fprintf(stderr,
+                 "Usage: %s [-h] [-n workers] <host> <port>\n"
+                 "  -h         Show this help message\n"
+                 "  -n         Number of workers, one io_context per allowed "
+                 "CPU (default 1)\n",
+                 prog_name);
+}
+
 int main(int argc, char *argv[]) {
-    if (argc < 3) {
-        std::printf("Usage: %s <host> <port>\n", argv[0]);
+    int num_workers = 1;
+
+    int opt;
+    while ((opt = getopt(argc, argv, "hn:")) != -1) {
+        switch (opt) {
+        case 'h':
+            usage(argv[0]);
+            return 0;
+        case 'n':
+            num_workers = std::stoi(optarg);
+            break;
+        default:
+            usage(argv[0]);
+            return 1;
+        }
+    }
+
+    if (argc - optind != 2 || num_workers < 1) {
+        usage(argv[0]);
         return 1;
     }
-    std::string host = argv[1];
-    uint16_t port = static_cast<uint16_t>(std::stoi(argv[2]));
+    raise_fd_limit();
 
-    asio::io_context ctx(1);
-    co_spawn(ctx, listener(host, port), detached);
-    std::printf("Echo server listening on %s:%d\n", host.c_str(), port);
-    ctx.run();
+    std::string host = argv[optind];
+    uint16_t port = static_cast<uint16_t>(std::stoi(argv[optind + 1]));
+    tcp::endpoint endpoint(asio::ip::make_address(host), port);
+
+    // One single-threaded io_context per pinned worker
+    std::vector<std::unique_ptr<asio::io_context>> contexts;
+    for (int i = 0; i < num_workers; ++i) {
+        auto &ctx =
+            *contexts.emplace_back(std::make_unique<asio::io_context>(1));
+        co_spawn(ctx, listener(create_listener(ctx, endpoint)), detached);
+    }
+    std::printf("Echo server listening on %s:%d with %d workers\n",
+                host.c_str(), port, num_workers);
+
+    std::vector<std::thread> threads;
+    for (int i = 0; i < num_workers; ++i) {
+        threads.emplace_back([&contexts, i] {
+            pin_to_nth_allowed_cpu(i);
+            contexts[i]->run();
+        });
+    }
+    for (auto &t : threads) {
+        t.join();
+    }
 
     return 0;
-}
\ No newline at end of file
+}
@@ -1,3 +1,4 @@
+#include "affinity.hpp"
 #include <arpa/inet.h>
 #include <condy.hpp>
 #include <cstdint>
@@ -5,15 +6,18 @@
 #include <cstring>
 #include <netinet/in.h>
 #include <sys/socket.h>
+#include <thread>
 #include <unistd.h>
+#include <vector>
 
-constexpr size_t BACKLOG = 128;
-constexpr size_t MAX_CONNECTIONS = 1024;
+constexpr size_t BACKLOG = 4096;
+constexpr size_t MAX_CONNECTIONS = 16384;
 constexpr size_t MAX_MESSAGE_LEN = 2048;
 
 static std::string host;
 static uint16_t port;
 static bool use_fixed_fd = false;
+static int num_workers = 1;
 
 condy::Coro<void> session(int client_fd) {
     char buffer[MAX_MESSAGE_LEN];
@@ -27,16 +31,30 @@ condy::Coro<void> session(int client_fd) {
             n = co_await condy::async_recv(client_fd, condy::buffer(buffer), 0);
         }
 
-        if (n == 0) {
-            // Connection closed by client
+        if (n <= 0) {
+            // Connection closed by client or failed
             break;
         }
 
-        if (use_fixed_fd) {
-            co_await condy::async_send(condy::fixed(client_fd),
-                                       condy::buffer(buffer, n), 0);
-        } else {
-            co_await condy::async_send(client_fd, condy::buffer(buffer, n), 0);
+        // Large messages can be sent short, echo everything before reading
+        int sent = 0;
+        while (sent < n) {
+            int m;
+            if (use_fixed_fd) {
+                m = co_await condy::async_send(
+                    condy::fixed(client_fd),
+                    condy::buffer(buffer + sent, n - sent), 0);
+            } else {
+                m = co_await condy::async_send(
+                    client_fd, condy::buffer(buffer + sent, n - sent), 0);
+            }
+            if (m <= 0) {
+                break;
+            }
+            sent += m;
+        }
+        if (sent < n) {
+            break;
         }
     }
 
@@ -74,17 +92,66 @@ void prepare_address(const std::string &host, uint16_t port,
     inet_pton(AF_INET, host.c_str(), &addr.sin_addr);
 }
 
+// Every worker owns a listening socket bound to the same port, the kernel
+// spreads incoming connections across them
+int create_listener(const sockaddr_in &server_addr) {
+    int server_fd = socket(AF_INET, SOCK_STREAM, 0);
+    if (server_fd < 0) {
+        std::perror("Failed to create socket");
+        return -1;
+    }
+
+    int optval = 1;
+    if (setsockopt(server_fd, SOL_SOCKET, SO_REUSEADDR, &optval,
+                   sizeof(optval)) < 0 ||
+        setsockopt(server_fd, SOL_SOCKET, SO_REUSEPORT, &optval,
+                   sizeof(optval)) < 0) {
+        std::perror("Failed to set socket options");
+        close(server_fd);
+        return -1;
+    }
+
+    if (bind(server_fd, (struct sockaddr *)&server_addr, sizeof(server_addr)) <
+        0) {
+        std::perror("Failed to bind socket");
+        close(server_fd);
+        return -1;
+    }
+
+    if (listen(server_fd, BACKLOG) < 0) {
+        std::perror("Failed to listen on socket");
+        close(server_fd);
+        return -1;
+    }
+    return server_fd;
+}
+
+// One runtime per pinned worker, nothing is shared between them
+int worker(int worker_id, int server_fd) {
+    pin_to_nth_allowed_cpu(worker_id);
+
+    condy::Runtime runtime(condy::RuntimeOptions().sq_size(MAX_CONNECTIONS));
+
+    if (use_fixed_fd) {
+        runtime.fd_table().init(MAX_CONNECTIONS);
+    }
+
+    return condy::sync_wait(runtime, co_main(server_fd));
+}
+
 void usage(const char *prog_name) {
     std::fprintf(stderr,
-                 "Usage: %s [-hf] <host> <port>\n"
+                 "Usage: %s [-hf] [-n workers] <host> <port>\n"
                  "  -h         Show this help message\n"
-                 "  -f         Use fixed file descriptor\n",
+                 "  -f         Use fixed file descriptor\n"
+                 "  -n         Number of workers, one runtime per allowed CPU "
+                 "(default 1)\n",
                  prog_name);
 }
 
 int main(int argc, char **argv) noexcept(false) {
     int opt;
-    while ((opt = getopt(argc, argv, "hf")) != -1) {
+    while ((opt = getopt(argc, argv, "hfn:")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
@@ -92,57 +159,55 @@ int main(int argc, char **argv) noexcept(false) {
         case 'f':
             use_fixed_fd = true;
             break;
+        case 'n':
+            num_workers = std::stoi(optarg);
+            break;
         default:
             usage(argv[0]);
             return 1;
         }
     }
 
-    if (argc - optind != 2) {
+    if (argc - optind != 2 || num_workers < 1) {
         usage(argv[0]);
         return 1;
     }
 
+    raise_fd_limit();
+
     host = argv[optind];
     port = static_cast<uint16_t>(std::stoi(argv[optind + 1]));
 
     sockaddr_in server_addr;
     prepare_address(host, port, server_addr);
 
-    int server_fd = socket(AF_INET, SOCK_STREAM, 0);
-    if (server_fd < 0) {
-        std::perror("Failed to create socket");
-        return 1;
+    std::vector<int> server_fds;
+    for (int i = 0; i < num_workers; ++i) {
+        int server_fd = create_listener(server_addr);
+        if (server_fd < 0) {
+            return 1;
+        }
+        server_fds.push_back(server_fd);
     }
 
-    int optval = 1;
-    if (setsockopt(server_fd, SOL_SOCKET, SO_REUSEADDR, &optval,
-                   sizeof(optval)) < 0) {
-        std::perror("Failed to set socket options");
-        close(server_fd);
-        return 1;
-    }
+    std::printf("Echo server listening on %s:%d with %d workers\n",
+                host.c_str(), port, num_workers);
 
-    if (bind(server_fd, (struct sockaddr *)&server_addr, sizeof(server_addr)) <
-        0) {
-        std::perror("Failed to bind socket");
-        close(server_fd);
-        return 1;
+    std::vector<std::thread> threads;
+    std::vector<int> results(num_workers);
+    for (int i = 0; i < num_workers; ++i) {
+        threads.emplace_back([&results, &server_fds, i] {
+            results[i] = worker(i, server_fds[i]);
+        });
     }
-
-    if (listen(server_fd, BACKLOG) < 0) {
-        std::perror("Failed to listen on socket");
-        close(server_fd);
-        return 1;
+    for (auto &t : threads) {
+        t.join();
     }
 
-    std::printf("Echo server listening on %s:%d\n", host.c_str(), port);
-
-    condy::Runtime runtime(condy::RuntimeOptions().sq_size(MAX_CONNECTIONS));
-
-    if (use_fixed_fd) {
-        runtime.fd_table().init(MAX_CONNECTIONS);
+    for (int result : results) {
+        if (result != 0) {
+            return result;
+        }
     }
-
-    return condy::sync_wait(runtime, co_main(server_fd));
+    return 0;
 }
\ No newline at end of file
@@ -1,15 +1,19 @@
+#include "affinity.hpp"
 #include <arpa/inet.h>
 #include <cerrno>
 #include <cstdio>
+#include <cstdlib>
 #include <cstring>
 #include <fcntl.h>
 #include <netinet/in.h>
 #include <string>
 #include <sys/epoll.h>
 #include <sys/socket.h>
+#include <thread>
 #include <unistd.h>
+#include <vector>
 
-constexpr size_t BACKLOG = 128;
+constexpr size_t BACKLOG = 4096;
 constexpr size_t MAX_CONNECTIONS = 1024;
 constexpr size_t MAX_MESSAGE_LEN = 2048;
 
@@ -21,6 +25,43 @@ void prepare_address(const std::string &host, uint16_t port,
     inet_pton(AF_INET, host.c_str(), &addr.sin_addr);
 }
 
+// Bytes read from a client but not yet echoed because its send buffer is full
+struct Pending {
+    char data[MAX_MESSAGE_LEN];
+    size_t offset = 0;
+    size_t length = 0;
+};
+
+// Returns false if the connection should be closed
+bool handle_client(int fd, Pending &pending) {
+    while (true) {
+        while (pending.offset < pending.length) {
+            ssize_t m = send(fd, pending.data + pending.offset,
+                             pending.length - pending.offset, MSG_NOSIGNAL);
+            if (m > 0) {
+                pending.offset += m;
+            } else if (m < 0 && (errno == EAGAIN || errno == EWOULDBLOCK)) {
+                // Send buffer full, stop reading until EPOLLOUT
+                return true;
+            } else {
+                return false;
+            }
+        }
+
+        ssize_t n = recv(fd, pending.data, MAX_MESSAGE_LEN, 0);
+        if (n > 0) {
+            pending.offset = 0;
+            pending.length = n;
+        } else if (n < 0 && (errno == EAGAIN || errno == EWOULDBLOCK)) {
+            // Finished reading
+            return true;
+        } else {
+            // Client closed connection or other errors
+            return false;
+        }
+    }
+}
+
 int set_nonblocking(int fd) {
     int flags = fcntl(fd, F_GETFL, 0);
     if (flags == -1)
@@ -28,51 +69,52 @@ int set_nonblocking(int fd) {
     return fcntl(fd, F_SETFL, flags | O_NONBLOCK);
 }
 
-int main(int argc, char **argv) {
-    if (argc < 3) {
-        std::fprintf(stderr, "Usage: %s <host> <port>\n", argv[0]);
-        return 1;
-    }
-
-    std::string host = argv[1];
-    uint16_t port = static_cast<uint16_t>(std::stoi(argv[2]));
-
-    sockaddr_in server_addr;
-    prepare_address(host, port, server_addr);
-
+// Every worker owns a listening socket bound to the same port, the kernel
+// spreads incoming connections across them
+int create_listener(const sockaddr_in &server_addr) {
     int server_fd = socket(AF_INET, SOCK_STREAM, 0);
     if (server_fd < 0) {
         std::perror("Failed to create socket");
-        return 1;
+        return -1;
     }
 
     int opt = 1;
     setsockopt(server_fd, SOL_SOCKET, SO_REUSEADDR, &opt, sizeof(opt));
+    if (setsockopt(server_fd, SOL_SOCKET, SO_REUSEPORT, &opt, sizeof(opt)) <
+        0) {
+        std::perror("Failed to set SO_REUSEPORT");
+        close(server_fd);
+        return -1;
+    }
 
     if (bind(server_fd, (struct sockaddr *)&server_addr, sizeof(server_addr)) <
         0) {
         std::perror("Failed to bind socket");
         close(server_fd);
-        return 1;
+        return -1;
     }
 
     if (listen(server_fd, BACKLOG) < 0) {
         std::perror("Failed to listen on socket");
         close(server_fd);
-        return 1;
+        return -1;
     }
 
     if (set_nonblocking(server_fd) < 0) {
         std::perror("Failed to set server socket non-blocking");
         close(server_fd);
-        return 1;
+        return -1;
     }
+    return server_fd;
+}
+
+void worker(int worker_id, int server_fd) {
+    pin_to_nth_allowed_cpu(worker_id);
 
     int epoll_fd = epoll_create1(0);
     if (epoll_fd < 0) {
         std::perror("Failed to create epoll");
-        close(server_fd);
-        return 1;
+        exit(1);
     }
 
     epoll_event ev;
@@ -80,15 +122,11 @@ int main(int argc, char **argv) {
     ev.data.fd = server_fd;
     if (epoll_ctl(epoll_fd, EPOLL_CTL_ADD, server_fd, &ev) < 0) {
         std::perror("Failed to add server fd to epoll");
-        close(server_fd);
-        close(epoll_fd);
-        return 1;
+        exit(1);
     }
 
-    std::printf("Echo server listening on %s:%d\n", host.c_str(), port);
-
     epoll_event events[MAX_CONNECTIONS];
-    char buffer[MAX_MESSAGE_LEN];
+    std::vector<Pending> pendings;
 
     while (true) {
         int nfds = epoll_wait(epoll_fd, events, MAX_CONNECTIONS, -1);
@@ -117,7 +155,7 @@ int main(int argc, char **argv) {
                     continue;
                 }
                 epoll_event client_ev;
-                client_ev.events = EPOLLIN | EPOLLET;
+                client_ev.events = EPOLLIN | EPOLLOUT | EPOLLET;
                 client_ev.data.fd = client_fd;
                 if (epoll_ctl(epoll_fd, EPOLL_CTL_ADD, client_fd, &client_ev) <
                     0) {
@@ -125,48 +163,85 @@ int main(int argc, char **argv) {
                     close(client_fd);
                     continue;
                 }
+                if (pendings.size() <= static_cast<size_t>(client_fd)) {
+                    pendings.resize(client_fd + 1);
+                }
+                pendings[client_fd] = Pending{};
             } else {
-                // Connected client has data to read
-                while (true) {
-                    ssize_t n = recv(fd, buffer, MAX_MESSAGE_LEN, 0);
-                    if (n > 0) {
-                        ssize_t sent = 0;
-                        while (sent < n) {
-                            ssize_t m = send(fd, buffer + sent, n - sent, 0);
-                            if (m > 0) {
-                                sent += m;
-                            } else if (m < 0 && (errno == EAGAIN ||
-                                                 errno == EWOULDBLOCK)) {
-                                // Send buffer full, try again later
-                                break;
-                            } else {
-                                // Send error
-                                close(fd);
-                                epoll_ctl(epoll_fd, EPOLL_CTL_DEL, fd, nullptr);
-                                break;
-                            }
-                        }
-                    } else if (n == 0) {
-                        // Client closed connection
-                        close(fd);
-                        epoll_ctl(epoll_fd, EPOLL_CTL_DEL, fd, nullptr);
-                        break;
-                    } else if (n < 0 &&
-                               (errno == EAGAIN || errno == EWOULDBLOCK)) {
-                        // Finished reading
-                        break;
-                    } else {
-                        // Other errors
-                        close(fd);
-                        epoll_ctl(epoll_fd, EPOLL_CTL_DEL, fd, nullptr);
-                        break;
-                    }
+                // Connected client is readable or writable again
+                if (!handle_client(fd, pendings[fd])) {
+                    epoll_ctl(epoll_fd, EPOLL_CTL_DEL, fd, nullptr);
+                    close(fd);
                 }
             }
         }
     }
 
-    close(server_fd);
     close(epoll_fd);
+}
+
+void usage(const char *prog_name) {
+    std::fprintf(stderr,
+                 "Usage: %s [-h] [-n workers] <host> <port>\n"
+                 "  -h         Show this help message\n"
+                 "  -n         Number of workers, one epoll loop per allowed "
+                 "CPU (default 1)\n",
+                 prog_name);
+}
+
+int main(int argc, char **argv) {
+    int num_workers = 1;
+
+    int opt;
+    while ((opt = getopt(argc, argv, "hn:")) != -1) {
+        switch (opt) {
+        case 'h':
+            usage(argv[0]);
+            return 0;
+        case 'n':
+            num_workers = std::stoi(optarg);
+            break;
+        default:
+            usage(argv[0]);
+            return 1;
+        }
+    }
+
+    if (argc - optind != 2 || num_workers < 1) {
+        usage(argv[0]);
+        return 1;
+    }
+
+    raise_fd_limit();
+
+    std::string host = argv[optind];
+    uint16_t port = static_cast<uint16_t>(std::stoi(argv[optind + 1]));
+
+    sockaddr_in server_addr;
+    prepare_address(host, port, server_addr);
+
+    std::vector<int> server_fds;
+    for (int i = 0; i < num_workers; ++i) {
+        int server_fd = create_listener(server_addr);
+        if (server_fd < 0) {
+            return 1;
+        }
+        server_fds.push_back(server_fd);
+    }
+
+    std::printf("Echo server listening on %s:%d with %d workers\n",
+                host.c_str(), port, num_workers);
+
+    std::vector<std::thread> threads;
+    for (int i = 0; i < num_workers; ++i) {
+        threads.emplace_back(worker, i, server_fds[i]);
+    }
+    for (auto &t : threads) {
+        t.join();
+    }
+
+    for (int server_fd : server_fds) {
+        close(server_fd);
+    }
     return 0;
-}
\ No newline at end of file
+}
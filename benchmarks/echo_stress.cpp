@@ -1,10 +1,21 @@
+#include "affinity.hpp"
+#include "interval.hpp"
+#include "report.hpp"
+#include <algorithm>
 #include <arpa/inet.h>
 #include <atomic>
+#include <bit>
+#include <chrono>
 #include <cstdint>
 #include <cstdio>
+#include <cerrno>
 #include <cstring>
+#include <ctime>
+#include <deque>
+#include <fcntl.h>
 #include <netinet/in.h>
 #include <string>
+#include <sys/epoll.h>
 #include <sys/socket.h>
 #include <thread>
 #include <unistd.h>
@@ -15,22 +26,112 @@ static int port = 12345;
 static int message_length = 512;
 static int connection_count = 50;
 static int test_duration_s = 60;
+static int num_workers = 0;
+static int pipeline_depth = 1;
+static bool json_output = false;
+static int interval_ms = 0;
+
+// Connection setup can take seconds at high connection counts, so the test
+// window only opens once every connection is established
+static std::atomic<int> connected{0};
+static std::atomic<bool> started{false};
+
+void wait_for_start() {
+    connected.fetch_add(1);
+    while (!started.load()) {
+        std::this_thread::sleep_for(std::chrono::milliseconds(1));
+    }
+}
+
+// Log-bucketed latency histogram in the style of HdrHistogram. Values below
+// 2^SUB_BITS are exact, larger values keep SUB_BITS significant bits, so the
+// relative error stays under 1% across the whole 64-bit range.
+class Histogram {
+public:
+    static constexpr int SUB_BITS = 7;
+    static constexpr int HALF = 1 << (SUB_BITS - 1);
+    static constexpr size_t NUM_BUCKETS = (64 - SUB_BITS + 2) * HALF;
+
+    void record(uint64_t value) {
+        counts_[index_of(value)]++;
+        total_++;
+        max_ = std::max(max_, value);
+    }
+
+    void merge(const Histogram &other) {
+        for (size_t i = 0; i < NUM_BUCKETS; ++i) {
+            counts_[i] += other.counts_[i];
+        }
+        total_ += other.total_;
+        max_ = std::max(max_, other.max_);
+    }
+
+    uint64_t percentile(double p) const {
+        if (total_ == 0) {
+            return 0;
+        }
+        uint64_t rank = static_cast<uint64_t>(p / 100.0 * total_ + 0.5);
+        rank = std::max<uint64_t>(rank, 1);
+        uint64_t seen = 0;
+        for (size_t i = 0; i < NUM_BUCKETS; ++i) {
+            seen += counts_[i];
+            if (seen >= rank) {
+                return std::min(highest_value_at(i), max_);
+            }
+        }
+        return max_;
+    }
+
+    uint64_t max() const { return max_; }
+    uint64_t total() const { return total_; }
+
+private:
+    static size_t index_of(uint64_t value) {
+        if (value < (1u << SUB_BITS)) {
+            return value;
+        }
+        int shift = (63 - std::countl_zero(value)) - SUB_BITS + 1;
+        return static_cast<size_t>(shift) * HALF + (value >> shift);
+    }
+
+    static uint64_t highest_value_at(size_t index) {
+        if (index < (1u << SUB_BITS)) {
+            return index;
+        }
+        int shift = static_cast<int>(index / HALF) - 1;
+        uint64_t sub = index - static_cast<size_t>(shift) * HALF;
+        return ((sub + 1) << shift) - 1;
+    }
+
+    std::vector<uint64_t> counts_ = std::vector<uint64_t>(NUM_BUCKETS);
+    uint64_t total_ = 0;
+    uint64_t max_ = 0;
+};
 
 struct Count {
     uint64_t inbytes = 0;
     uint64_t outbytes = 0;
+    Histogram latency_ns;
+    double cpu_s = 0;
+    IntervalCounter *round_trips = nullptr; // Sampled while the test runs
 };
 
 void usage(const char *prog_name) {
     std::printf(
-        "Usage: %s [-h] [-a address] [-p port] [-l length] [-c number] [-t "
-        "duration]\n"
+        "Usage: %s [-hj] [-i interval_ms] [-a address] [-p port] [-l length] "
+        "[-c number] [-t duration] [-w workers] [-k depth]\n"
         "  -h           Show this help message\n"
+        "  -j           Print metrics and config as JSON\n"
+        "  -i interval_ms\n"
+        "               Sample round trips every interval_ms\n"
         "  -a address   Specify the server address\n"
         "  -p port      Specify the server port\n"
         "  -l length    Specify the message length\n"
         "  -c number    Specify the number of connections\n"
-        "  -t duration  Specify the test duration in seconds\n",
+        "  -t duration  Specify the test duration in seconds\n"
+        "  -w workers   Multiplex connections over this many epoll worker\n"
+        "               threads instead of one thread per connection\n"
+        "  -k depth     Keep this many messages in flight per connection\n",
         prog_name);
 }
 
@@ -61,55 +162,175 @@ int do_connect(const std::string &address, int port) {
     return sockfd;
 }
 
-void do_echo(std::atomic<bool> &running, Count &count) {
-    std::string message(message_length, 'x');
-    std::vector<char> buffer(message_length);
+double thread_cpu_seconds() {
+    timespec ts;
+    clock_gettime(CLOCK_THREAD_CPUTIME_ID, &ts);
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+}
 
-    int sockfd = do_connect(address, port);
-    if (sockfd < 0) {
-        exit(2);
-    }
+struct Connection {
+    int fd;
+    int sent = 0;          // Bytes of the message currently being sent
+    uint64_t received = 0; // Bytes received towards the oldest outstanding one
+    // Send start time of every message in flight, oldest first
+    std::deque<std::chrono::steady_clock::time_point> in_flight;
+};
 
-    while (true) {
-        if (!running.load()) [[unlikely]] {
-            break;
-        }
+// Drive one connection as far as it can go without blocking, keeping up to
+// pipeline_depth messages in flight. Returns false if the connection failed.
+bool progress(Connection &conn, const std::string &message,
+              std::vector<char> &buffer, std::atomic<bool> &running,
+              Count &count) {
+    bool can_send = true;
+    bool can_recv = true;
+    while (can_send || can_recv) {
+        bool moved = false;
 
-        int r = 0;
-        while (r < message_length) {
-            int n = send(sockfd, message.data() + r, message_length - r, 0);
+        while (can_send) {
+            if (conn.sent == 0) {
+                if (conn.in_flight.size() >=
+                        static_cast<size_t>(pipeline_depth) ||
+                    !running.load(std::memory_order_relaxed)) {
+                    break;
+                }
+                conn.in_flight.push_back(std::chrono::steady_clock::now());
+            }
+            int n = send(conn.fd, message.data() + conn.sent,
+                         message_length - conn.sent, MSG_NOSIGNAL);
+            if (n < 0 && (errno == EAGAIN || errno == EWOULDBLOCK)) {
+                can_send = false;
+                break;
+            }
             if (n <= 0) [[unlikely]] {
-                std::perror("Send failed");
-                close(sockfd);
-                exit(3);
+                return false;
             }
-            r += n;
+            conn.sent = (conn.sent + n) % message_length;
             count.outbytes += n;
+            moved = true;
         }
 
-        if (!running.load()) [[unlikely]] {
+        while (can_recv) {
+            int n = recv(conn.fd, buffer.data(), buffer.size(), 0);
+            if (n < 0 && (errno == EAGAIN || errno == EWOULDBLOCK)) {
+                can_recv = false;
+                break;
+            }
+            if (n <= 0) [[unlikely]] {
+                return false;
+            }
+            count.inbytes += n;
+            conn.received += n;
+            moved = true;
+
+            // A round trip ends when the whole message has been echoed back
+            auto now = std::chrono::steady_clock::now();
+            while (conn.received >= static_cast<uint64_t>(message_length) &&
+                   !conn.in_flight.empty()) {
+                conn.received -= message_length;
+                count.latency_ns.record(
+                    std::chrono::duration_cast<std::chrono::nanoseconds>(
+                        now - conn.in_flight.front())
+                        .count());
+                count.round_trips->add(message_length);
+                conn.in_flight.pop_front();
+            }
+        }
+
+        // Completed round trips may have opened the window for more sends
+        if (!moved) {
             break;
         }
+        can_send = true;
+    }
+    return true;
+}
+
+void do_echo(int worker_id, int num_connections, bool pin,
+             std::atomic<bool> &running, Count &count) {
+    if (pin) {
+        pin_to_nth_allowed_cpu(worker_id);
+    }
+
+    std::string message(message_length, 'x');
+    std::vector<char> buffer(
+        std::min(message_length * pipeline_depth, 1 << 18));
+    std::vector<Connection> conns(num_connections);
+
+    int epoll_fd = epoll_create1(0);
+    if (epoll_fd < 0) {
+        std::perror("Failed to create epoll");
+        exit(2);
+    }
+
+    for (int i = 0; i < num_connections; ++i) {
+        int sockfd = do_connect(address, port);
+        if (sockfd < 0) {
+            exit(2);
+        }
+        fcntl(sockfd, F_SETFL, fcntl(sockfd, F_GETFL, 0) | O_NONBLOCK);
+        conns[i].fd = sockfd;
+
+        epoll_event ev;
+        ev.events = EPOLLIN | EPOLLOUT | EPOLLET;
+        ev.data.ptr = &conns[i];
+        if (epoll_ctl(epoll_fd, EPOLL_CTL_ADD, sockfd, &ev) < 0) {
+            std::perror("Failed to add socket to epoll");
+            exit(2);
+        }
+    }
+
+    wait_for_start();
 
-        r = recv(sockfd, buffer.data(), message_length, 0);
-        if (r <= 0) [[unlikely]] {
-            std::perror("Receive failed");
-            close(sockfd);
+    double cpu_start = thread_cpu_seconds();
+
+    for (auto &conn : conns) {
+        if (!progress(conn, message, buffer, running, count)) [[unlikely]] {
+            std::perror("Connection failed");
             exit(4);
         }
-        count.inbytes += r;
     }
 
-    close(sockfd);
+    std::vector<epoll_event> events(std::max(num_connections, 1));
+    while (running.load(std::memory_order_relaxed)) {
+        int nfds = epoll_wait(epoll_fd, events.data(), events.size(), 100);
+        if (nfds < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            std::perror("epoll_wait failed");
+            exit(3);
+        }
+        for (int i = 0; i < nfds; ++i) {
+            auto &conn = *static_cast<Connection *>(events[i].data.ptr);
+            if (!progress(conn, message, buffer, running, count))
+                [[unlikely]] {
+                std::perror("Connection failed");
+                exit(4);
+            }
+        }
+    }
+
+    count.cpu_s = thread_cpu_seconds() - cpu_start;
+
+    for (auto &conn : conns) {
+        close(conn.fd);
+    }
+    close(epoll_fd);
 }
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "ha:p:l:c:t:")) != -1) {
+    while ((opt = getopt(argc, argv, "hji:a:p:l:c:t:w:k:")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::atoi(optarg);
+            break;
         case 'a':
             address = optarg;
             break;
@@ -125,20 +346,52 @@ int main(int argc, char *argv[]) {
         case 't':
             test_duration_s = std::atoi(optarg);
             break;
+        case 'w':
+            num_workers = std::atoi(optarg);
+            break;
+        case 'k':
+            pipeline_depth = std::atoi(optarg);
+            break;
         default:
             usage(argv[0]);
             return 1;
         }
     }
 
-    std::vector<Count> counts(connection_count);
+    raise_fd_limit();
 
     std::atomic<bool> running(true);
     std::vector<std::thread> threads;
-    for (int i = 0; i < connection_count; ++i) {
-        threads.emplace_back(do_echo, std::ref(running), std::ref(counts[i]));
+    size_t num_threads = num_workers > 0 ? num_workers : connection_count;
+    std::vector<Count> counts(num_threads);
+    std::vector<IntervalCounter> round_trips(num_threads);
+    for (size_t i = 0; i < num_threads; ++i) {
+        counts[i].round_trips = &round_trips[i];
     }
+    if (num_workers > 0) {
+        // Event-driven mode: a few pinned threads each own a share of the
+        // connections, so the client scales past thread-per-connection
+        for (int i = 0; i < num_workers; ++i) {
+            int share = connection_count / num_workers +
+                        (i < connection_count % num_workers ? 1 : 0);
+            threads.emplace_back(do_echo, i, share, true, std::ref(running),
+                                 std::ref(counts[i]));
+        }
+    } else {
+        for (int i = 0; i < connection_count; ++i) {
+            threads.emplace_back(do_echo, i, 1, false, std::ref(running),
+                                 std::ref(counts[i]));
+        }
+    }
+    while (connected.load() < static_cast<int>(threads.size())) {
+        std::this_thread::sleep_for(std::chrono::milliseconds(10));
+    }
+    IntervalSampler sampler(interval_ms, !json_output, round_trips.data(),
+                            round_trips.size());
+    sampler.start();
+    started.store(true);
     sleep(test_duration_s);
+    sampler.stop();
     running.store(false);
     for (auto &t : threads) {
         t.join();
@@ -146,15 +399,41 @@ int main(int argc, char *argv[]) {
 
     uint64_t total_inbytes = 0;
     uint64_t total_outbytes = 0;
+    Histogram latency_ns;
+    double max_cpu_s = 0;
     for (const auto &c : counts) {
         total_inbytes += c.inbytes;
         total_outbytes += c.outbytes;
+        latency_ns.merge(c.latency_ns);
+        max_cpu_s = std::max(max_cpu_s, c.cpu_s);
     }
 
     float req_bytes_per_sec =
         static_cast<float>(total_outbytes) / test_duration_s;
     float resp_bytes_per_sec =
         static_cast<float>(total_inbytes) / test_duration_s;
-    std::printf("req_bytes_per_sec:%.2f\nresp_bytes_per_sec:%.2f\n",
-                req_bytes_per_sec, resp_bytes_per_sec);
+    Report report("echo_stress", num_workers > 0 ? "epoll" : "threads");
+    report.config("address", address);
+    report.config("port", port);
+    report.config("message_length", message_length);
+    report.config("connection_count", connection_count);
+    report.config("test_duration_s", test_duration_s);
+    report.config("num_workers", num_workers);
+    report.config("pipeline_depth", pipeline_depth);
+    report.config("interval_ms", interval_ms);
+    report.metric("req_bytes_per_sec", req_bytes_per_sec);
+    report.metric("resp_bytes_per_sec", resp_bytes_per_sec);
+    report.metric("round_trips", latency_ns.total());
+    report.metric("latency_p50_us", latency_ns.percentile(50.0) / 1e3);
+    report.metric("latency_p90_us", latency_ns.percentile(90.0) / 1e3);
+    report.metric("latency_p99_us", latency_ns.percentile(99.0) / 1e3);
+    report.metric("latency_p999_us", latency_ns.percentile(99.9) / 1e3);
+    report.metric("latency_max_us", latency_ns.max() / 1e3);
+    if (num_workers > 0) {
+        // Busiest worker's CPU time over the run; close to 1 means the client,
+        // not the server, is the bottleneck
+        report.metric("client_cpu_util", max_cpu_s / test_duration_s, 3);
+    }
+    report.intervals(sampler.intervals());
+    report.print(json_output);
 }
\ No newline at end of file
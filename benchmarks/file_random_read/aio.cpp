@@ -1,3 +1,7 @@
+#include "access.hpp"
+#include "interval.hpp"
+#include "report.hpp"
+#include "stripe.hpp"
 #include <algorithm>
 #include <chrono>
 #include <cstdio>
@@ -6,6 +10,7 @@
 #include <getopt.h>
 #include <libaio.h>
 #include <random>
+#include <stdexcept>
 #include <sys/mman.h>
 #include <sys/stat.h>
 #include <unistd.h>
@@ -14,24 +19,42 @@
 static size_t block_size = 1024 * 1024; // 1MB
 static size_t num_tasks = 32;
 static size_t seed = 42;
+static size_t num_ops = 0;
+static AccessPattern pattern;
+static bool json_output = false;
+static int interval_ms = 0;
+static IntervalCounter progress;
 
 void usage(const char *prog_name) {
     std::printf(
-        "Usage: %s [-h] [-b block_size] [-t num_tasks] [-s seed] <filename>\n"
+        "Usage: %s [-hj] [-i interval_ms] [-b block_size] [-t num_tasks] "
+        "[-s seed] [-n num_ops] [-a access] <filename>...\n"
         "  -h              Show this help message\n"
+        "  -j              Print metrics and config as JSON\n"
+        "  -i interval_ms  Sample progress every interval_ms\n"
         "  -b block_size   Block size of each read operation in bytes\n"
         "  -t num_tasks    Number of concurrent tasks\n"
-        "  -s seed         Seed for random number generator\n",
+        "  -s seed         Seed for random number generator\n"
+        "  -n num_ops      Number of reads, default one per block\n"
+        "  -a access       uniform, zipf:THETA, hotspot:OPS:DATA (in\n"
+        "                  percent) or runs:LEN, default uniform\n"
+        "Reads are striped across the files block by block\n",
         prog_name);
 }
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hb:t:s:")) != -1) {
+    while ((opt = getopt(argc, argv, "hji:b:t:s:n:a:")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
         case 'b':
             block_size = std::stoul(optarg);
             break;
@@ -41,6 +64,18 @@ int main(int argc, char *argv[]) {
         case 's':
             seed = std::stoul(optarg);
             break;
+        case 'n':
+            num_ops = std::stoul(optarg);
+            break;
+        case 'a':
+            try {
+                pattern = AccessPattern::parse(optarg);
+            } catch (const std::exception &e) {
+                std::fprintf(stderr, "-a %s: %s\n", optarg, e.what());
+                usage(argv[0]);
+                return 1;
+            }
+            break;
         default:
             usage(argv[0]);
             return 1;
@@ -52,30 +87,21 @@ int main(int argc, char *argv[]) {
         return 1;
     }
 
-    std::string filename = argv[optind];
-
-    int file = open(filename.c_str(), O_RDONLY | O_DIRECT);
-    if (file < 0) {
-        perror("open");
+    Stripe stripe;
+    if (!stripe.open(argv + optind, argc - optind, block_size, true)) {
         return 1;
     }
 
-    size_t file_size = lseek(file, 0, SEEK_END);
-    lseek(file, 0, SEEK_SET);
-
-    size_t num_blocks = (file_size + block_size - 1) / block_size;
-    std::vector<size_t> offsets(num_blocks);
-    for (size_t i = 0; i < num_blocks; ++i) {
-        offsets[i] = i * block_size;
-    }
-    std::shuffle(offsets.begin(), offsets.end(), std::mt19937{seed});
+    AccessOffsets offsets =
+        pattern.offsets(stripe.num_blocks(), block_size, num_ops, seed);
+    size_t num_reads = offsets.size();
 
     size_t total_buffer_size = block_size * num_tasks;
     void *data = mmap(nullptr, total_buffer_size, PROT_READ | PROT_WRITE,
                       MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
     if (data == MAP_FAILED) {
         perror("mmap");
-        close(file);
+        stripe.close();
         return 1;
     }
     char *total_buffer = static_cast<char *>(data);
@@ -84,12 +110,12 @@ int main(int argc, char *argv[]) {
     if (io_setup(num_tasks, &ctx) < 0) {
         perror("io_setup");
         munmap(data, total_buffer_size);
-        close(file);
+        stripe.close();
         return 1;
     }
 
     size_t index = 0;
-    size_t left = num_blocks;
+    size_t left = num_reads;
 
     std::vector<iocb> cbs(num_tasks);
     std::vector<iocb *> cbs_ptr(num_tasks);
@@ -99,35 +125,44 @@ int main(int argc, char *argv[]) {
         cbs_ptr[i] = &cbs[i];
     }
 
+    // Reuses the slot's iocb for the read of the stripe offset off
+    auto prep = [&](size_t slot, size_t off) {
+        size_t k = stripe_file(off, block_size, stripe.num_files());
+        size_t file_off = stripe_offset(off, block_size, stripe.num_files());
+        size_t to_read = std::min(block_size, stripe.file_size(k) - file_off);
+
+        std::memset(&cbs[slot], 0, sizeof(iocb));
+        io_prep_pread(&cbs[slot], stripe.fd(k),
+                      total_buffer + slot * block_size, to_read, file_off);
+        cbs[slot].data = (void *)slot;
+    };
+
+    IntervalSampler sampler(interval_ms, !json_output, &progress);
+    sampler.start();
+
     auto start = std::chrono::high_resolution_clock::now();
 
     // Launch initial read requests (fill the window)
-    for (size_t i = 0; i < num_tasks && index < num_blocks; ++i) {
-        size_t off = offsets[index];
-        size_t to_read = std::min(block_size, file_size - off);
-
-        std::memset(&cbs[i], 0, sizeof(iocb));
-        io_prep_pread(&cbs[i], file, total_buffer + i * block_size, to_read,
-                      off);
-        cbs[i].data = (void *)i;
+    for (size_t i = 0; i < num_tasks && index < num_reads; ++i) {
+        prep(i, offsets[index]);
 
         if (io_submit(ctx, 1, &cbs_ptr[i]) < 0) {
             perror("io_submit");
             io_destroy(ctx);
             munmap(data, total_buffer_size);
-            close(file);
+            stripe.close();
             return 1;
         }
         ++index;
     }
 
-    while (index < num_blocks || left > 0) {
+    while (index < num_reads || left > 0) {
         int ret = io_getevents(ctx, 1, (long)num_tasks, events.data(), nullptr);
         if (ret < 0) {
             perror("io_getevents");
             io_destroy(ctx);
             munmap(data, total_buffer_size);
-            close(file);
+            stripe.close();
             return 1;
         }
 
@@ -138,26 +173,21 @@ int main(int argc, char *argv[]) {
                 std::fprintf(stderr, "AIO read error: %zd\n", events[j].res);
                 io_destroy(ctx);
                 munmap(data, total_buffer_size);
-                close(file);
+                stripe.close();
                 return 1;
             }
 
             left--;
+            progress.add(events[j].res);
 
-            if (index < num_blocks) {
-                size_t off = offsets[index];
-                size_t to_read = std::min(block_size, file_size - off);
-
-                std::memset(&cbs[slot], 0, sizeof(iocb));
-                io_prep_pread(&cbs[slot], file,
-                              total_buffer + slot * block_size, to_read, off);
-                cbs[slot].data = (void *)slot;
+            if (index < num_reads) {
+                prep(slot, offsets[index]);
 
                 if (io_submit(ctx, 1, &cbs_ptr[slot]) < 0) {
                     perror("io_submit");
                     io_destroy(ctx);
                     munmap(data, total_buffer_size);
-                    close(file);
+                    stripe.close();
                     return 1;
                 }
 
@@ -167,15 +197,29 @@ int main(int argc, char *argv[]) {
     }
 
     auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
     std::chrono::duration<double> elapsed = end - start;
-    double iops = static_cast<double>(num_blocks) / elapsed.count();
-    std::printf(
-        "time_ms:%ld\n",
+    double iops = static_cast<double>(num_reads) / elapsed.count();
+    Report report("file_random_read", "aio");
+    report.config("file", stripe.names());
+    report.config("num_files", stripe.num_files());
+    report.config("file_size", stripe.size());
+    report.config("block_size", block_size);
+    report.config("seed", seed);
+    report.config("access", pattern.name());
+    report.config("num_ops", num_reads);
+    report.config("num_tasks", num_tasks);
+    report.config("direct_io", true);
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
         std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
-    std::printf("iops:%.2f\n", iops);
+    report.metric("iops", iops);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
 
     io_destroy(ctx);
     munmap(data, total_buffer_size);
-    close(file);
+    stripe.close();
     return 0;
 }
\ No newline at end of file
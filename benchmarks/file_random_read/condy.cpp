@@ -1,57 +1,136 @@
+#include "access.hpp"
+#include "interval.hpp"
+#include "report.hpp"
+#include "stripe.hpp"
 #include <algorithm>
 #include <chrono>
 #include <condy.hpp>
 #include <cstddef>
+#include <cstdio>
 #include <fcntl.h>
+#include <latch>
 #include <random>
+#include <stdexcept>
 #include <string>
+#include <thread>
 #include <unistd.h>
 #include <vector>
 
 static size_t block_size = 1024 * 1024; // 1MB
 static size_t num_tasks = 32;
 static size_t seed = 42;
+static size_t num_ops = 0;
+static AccessPattern pattern;
 static bool direct_io = false;
 static bool fixed = false;
 static bool iopoll = false;
 static bool sqpoll = false;
+static bool per_file_threads = false;
+static bool json_output = false;
+static int interval_ms = 0;
 
-condy::Coro<void> do_reads(int id, char *buffer, int file, size_t &index,
-                           size_t offsets[], size_t total_blocks) {
-    while (index < total_blocks) {
-        size_t current_offset = offsets[index];
+// Offsets index the stripe across files, whose fixed slots are 0..num_files
+condy::Coro<void> do_reads(int id, char *buffer, const int *files,
+                           size_t num_files, size_t &index,
+                           const AccessOffsets &offsets,
+                           IntervalCounter &progress) {
+    while (index < offsets.size()) {
+        size_t k = stripe_file(offsets[index], block_size, num_files);
+        size_t current_offset =
+            stripe_offset(offsets[index], block_size, num_files);
         index++;
         if (fixed) {
             auto buf = condy::fixed(id, condy::buffer(buffer, block_size));
-            co_await condy::async_read(condy::fixed(0), buf, current_offset);
+            co_await condy::async_read(condy::fixed(k), buf, current_offset);
         } else {
             auto buf = condy::buffer(buffer, block_size);
-            co_await condy::async_read(file, buf, current_offset);
+            co_await condy::async_read(files[k], buf, current_offset);
         }
+        progress.add(block_size);
     }
 }
 
+// One runtime on the calling thread, set up before the ready latch so only
+// the reads are timed
+void run_reads(const int *files, size_t num_files, char *buffer,
+               const AccessOffsets &offsets, IntervalCounter &progress,
+               std::latch &ready) {
+    condy::RuntimeOptions options;
+    // Disable periodic event checking for fair comparison with liburing bench
+    options.sq_size(num_tasks).event_interval(
+        std::numeric_limits<size_t>::max());
+    if (iopoll) {
+        options.enable_iopoll();
+    }
+    if (sqpoll) {
+        options.enable_sqpoll();
+    }
+
+    condy::Runtime runtime(options);
+
+    if (fixed) {
+        std::vector<iovec> iovecs(num_tasks);
+        for (size_t i = 0; i < num_tasks; ++i) {
+            iovecs[i].iov_base = buffer + i * block_size;
+            iovecs[i].iov_len = block_size;
+        }
+        runtime.buffer_table().init(num_tasks);
+        runtime.buffer_table().update(0, iovecs.data(), num_tasks);
+        // One slot per file, as many as the stripe is wide
+        runtime.fd_table().init(num_files);
+        runtime.fd_table().update(0, files, num_files);
+    }
+
+    size_t index = 0;
+
+    for (size_t i = 0; i < num_tasks; ++i) {
+        condy::co_spawn(runtime,
+                        do_reads(i, buffer + i * block_size, files, num_files,
+                                 index, offsets, progress))
+            .detach();
+    }
+
+    ready.arrive_and_wait();
+    runtime.allow_exit();
+    runtime.run();
+}
+
 void usage(const char *prog_name) {
-    std::printf("Usage: %s [-hdfpq] [-b block_size] [-t num_tasks] [-s seed] "
-                "<filename>\n"
+    std::printf("Usage: %s [-hjdfpqT] [-i interval_ms] [-b block_size] "
+                "[-t num_tasks] [-s seed] [-n num_ops] [-a access] "
+                "<filename>...\n"
                 "  -h              Show this help message\n"
+                "  -j              Print metrics and config as JSON\n"
+                "  -i interval_ms  Sample progress every interval_ms\n"
                 "  -b block_size   Block size of each read operation in bytes\n"
-                "  -t num_tasks    Number of concurrent tasks\n"
+                "  -t num_tasks    Number of concurrent tasks per runtime\n"
                 "  -s seed         Seed for random number generator\n"
+                "  -n num_ops      Number of reads, default one per block\n"
+                "  -a access       uniform, zipf:THETA, hotspot:OPS:DATA (in\n"
+                "                  percent) or runs:LEN, default uniform\n"
                 "  -d              Use direct I/O\n"
                 "  -f              Use fixed file descriptor and buffer\n"
                 "  -p              Use I/O polling\n"
-                "  -q              Use SQ polling\n",
+                "  -q              Use SQ polling\n"
+                "  -T              One runtime thread per file, each reading\n"
+                "                  only its own; otherwise reads are striped\n"
+                "                  across the files block by block\n",
                 prog_name);
 }
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hb:t:s:dfpq")) != -1) {
+    while ((opt = getopt(argc, argv, "hji:b:t:s:n:a:dfpqT")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
         case 'b':
             block_size = std::stoul(optarg);
             break;
@@ -61,6 +140,18 @@ int main(int argc, char *argv[]) {
         case 's':
             seed = std::stoul(optarg);
             break;
+        case 'n':
+            num_ops = std::stoul(optarg);
+            break;
+        case 'a':
+            try {
+                pattern = AccessPattern::parse(optarg);
+            } catch (const std::exception &e) {
+                std::fprintf(stderr, "-a %s: %s\n", optarg, e.what());
+                usage(argv[0]);
+                return 1;
+            }
+            break;
         case 'd':
             direct_io = true;
             break;
@@ -73,6 +164,9 @@ int main(int argc, char *argv[]) {
         case 'q':
             sqpoll = true;
             break;
+        case 'T':
+            per_file_threads = true;
+            break;
         default:
             usage(argv[0]);
             return 1;
@@ -84,76 +178,91 @@ int main(int argc, char *argv[]) {
         return 1;
     }
 
-    std::string filename = argv[optind];
-
-    condy::RuntimeOptions options;
-    // Disable periodic event checking for fair comparison with liburing bench
-    options.sq_size(num_tasks).event_interval(
-        std::numeric_limits<size_t>::max());
-    if (iopoll) {
-        options.enable_iopoll();
-    }
-    if (sqpoll) {
-        options.enable_sqpoll();
+    Stripe stripe;
+    if (!stripe.open(argv + optind, argc - optind, block_size, direct_io)) {
+        return 1;
     }
 
-    condy::Runtime runtime(options);
-
-    int oflags = O_RDONLY;
-    if (direct_io) {
-        oflags |= O_DIRECT;
+    // Each thread draws its share of the ops over its own file, otherwise
+    // one runtime draws them all over the whole stripe
+    size_t num_threads = per_file_threads ? stripe.num_files() : 1;
+    std::vector<AccessOffsets> offsets;
+    for (size_t k = 0; k < num_threads; ++k) {
+        if (per_file_threads) {
+            size_t thread_ops =
+                num_ops == 0 ? 0 : std::max<size_t>(1, num_ops / num_threads);
+            offsets.push_back(pattern.offsets(stripe.blocks_per_file(),
+                                              block_size, thread_ops,
+                                              seed + k));
+        } else {
+            offsets.push_back(pattern.offsets(stripe.num_blocks(), block_size,
+                                              num_ops, seed));
+        }
     }
-    int file = open(filename.c_str(), oflags);
-
-    size_t file_size = lseek(file, 0, SEEK_END);
-    lseek(file, 0, SEEK_SET);
-
-    size_t num_blocks = (file_size + block_size - 1) / block_size;
-    std::vector<size_t> offsets(num_blocks);
-    for (size_t i = 0; i < num_blocks; ++i) {
-        offsets[i] = i * block_size;
+    size_t num_reads = 0;
+    for (const AccessOffsets &thread_offsets : offsets) {
+        num_reads += thread_offsets.size();
     }
-    // Shuffle offsets for random read
-    std::shuffle(offsets.begin(), offsets.end(), std::mt19937{seed});
 
-    size_t total_buffer_size = block_size * num_tasks;
+    size_t thread_buffer_size = block_size * num_tasks;
+    size_t total_buffer_size = thread_buffer_size * num_threads;
     void *data = mmap(nullptr, total_buffer_size, PROT_READ | PROT_WRITE,
                       MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
     char *total_buffer = static_cast<char *>(data);
 
-    if (fixed) {
-        std::vector<iovec> iovecs(num_tasks);
-        for (size_t i = 0; i < num_tasks; ++i) {
-            iovecs[i].iov_base = total_buffer + i * block_size;
-            iovecs[i].iov_len = block_size;
-        }
-        runtime.buffer_table().init(num_tasks);
-        runtime.buffer_table().update(0, iovecs.data(), num_tasks);
-        runtime.fd_table().init(1);
-        runtime.fd_table().update(0, &file, 1);
+    std::vector<IntervalCounter> progress(num_threads);
+    std::latch ready(num_threads + 1);
+    std::vector<std::thread> threads;
+    for (size_t k = 0; k < num_threads; ++k) {
+        const int *files = per_file_threads ? stripe.fds() + k : stripe.fds();
+        size_t num_files = per_file_threads ? 1 : stripe.num_files();
+        threads.emplace_back(run_reads, files, num_files,
+                             total_buffer + k * thread_buffer_size,
+                             std::cref(offsets[k]), std::ref(progress[k]),
+                             std::ref(ready));
     }
 
-    size_t index = 0;
-
-    for (size_t i = 0; i < num_tasks; ++i) {
-        condy::co_spawn(runtime,
-                        do_reads(i, total_buffer + i * block_size, file, index,
-                                 offsets.data(), num_blocks))
-            .detach();
-    }
+    IntervalSampler sampler(interval_ms, !json_output, progress.data(),
+                            progress.size());
+    ready.arrive_and_wait();
+    sampler.start();
 
     auto start = std::chrono::high_resolution_clock::now();
 
-    runtime.allow_exit();
-    runtime.run();
+    for (auto &thread : threads) {
+        thread.join();
+    }
 
     auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
     std::chrono::duration<double> elapsed = end - start;
-    double iops = static_cast<double>(num_blocks) / elapsed.count();
-    std::printf(
-        "time_ms:%ld\n",
+    double iops = static_cast<double>(num_reads) / elapsed.count();
+    Report report("file_random_read", "condy");
+    report.config("file", stripe.names());
+    report.config("num_files", stripe.num_files());
+    report.config("file_size", stripe.size());
+    report.config("block_size", block_size);
+    report.config("seed", seed);
+    report.config("access", pattern.name());
+    report.config("num_ops", num_reads);
+    report.config("num_tasks", num_tasks);
+    report.config("direct_io", direct_io);
+    report.config("fixed", fixed);
+    report.config("iopoll", iopoll);
+    report.config("sqpoll", sqpoll);
+    report.config("per_file_threads", per_file_threads);
+    report.config("sq_size", num_tasks);
+    report.config("event_interval",
+                  std::numeric_limits<size_t>::max());
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
         std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
-    std::printf("iops:%.2f\n", iops);
+    report.metric("iops", iops);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
 
+    munmap(data, total_buffer_size);
+    stripe.close();
     return 0;
 }
\ No newline at end of file
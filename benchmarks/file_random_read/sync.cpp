@@ -1,47 +1,87 @@
+#include "access.hpp"
+#include "interval.hpp"
+#include "report.hpp"
+#include "stripe.hpp"
 #include <algorithm>
 #include <chrono>
 #include <cstddef>
+#include <cstdio>
 #include <fcntl.h>
 #include <random>
+#include <stdexcept>
 #include <string>
 #include <unistd.h>
 #include <vector>
 
 static size_t block_size = 1024 * 1024; // 1MB
 static size_t seed = 42;
+static size_t num_ops = 0;
+static AccessPattern pattern;
 static bool direct_io = false;
+static bool json_output = false;
+static int interval_ms = 0;
+static IntervalCounter progress;
 
-void do_reads(int file, size_t &index, size_t offsets[], size_t total_blocks) {
+void do_reads(const Stripe &stripe, size_t &index,
+              const AccessOffsets &offsets, size_t total_blocks) {
     std::vector<char> buffer(block_size);
     while (index < total_blocks) {
-        size_t current_offset = offsets[index];
+        size_t k = stripe_file(offsets[index], block_size, stripe.num_files());
+        size_t current_offset =
+            stripe_offset(offsets[index], block_size, stripe.num_files());
         index++;
-        ::pread(file, buffer.data(), block_size, current_offset);
+        ::pread(stripe.fd(k), buffer.data(), block_size, current_offset);
+        progress.add(block_size);
     }
 }
 
 void usage(const char *prog_name) {
-    std::printf("Usage: %s [-hd] [-b block_size] [-s seed] <filename>\n"
+    std::printf("Usage: %s [-hjd] [-i interval_ms] [-b block_size] [-s seed] "
+                "[-n num_ops] [-a access] <filename>...\n"
                 "  -h              Show this help message\n"
+                "  -j              Print metrics and config as JSON\n"
+                "  -i interval_ms  Sample progress every interval_ms\n"
                 "  -b block_size   Block size of each read operation in bytes\n"
                 "  -s seed         Seed for random number generator\n"
-                "  -d              Use direct I/O\n",
+                "  -n num_ops      Number of reads, default one per block\n"
+                "  -a access       uniform, zipf:THETA, hotspot:OPS:DATA (in\n"
+                "                  percent) or runs:LEN, default uniform\n"
+                "  -d              Use direct I/O\n"
+                "Reads are striped across the files block by block\n",
                 prog_name);
 }
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hb:s:d")) != -1) {
+    while ((opt = getopt(argc, argv, "hji:b:s:n:a:d")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
         case 'b':
             block_size = std::stoul(optarg);
             break;
         case 's':
             seed = std::stoul(optarg);
             break;
+        case 'n':
+            num_ops = std::stoul(optarg);
+            break;
+        case 'a':
+            try {
+                pattern = AccessPattern::parse(optarg);
+            } catch (const std::exception &e) {
+                std::fprintf(stderr, "-a %s: %s\n", optarg, e.what());
+                usage(argv[0]);
+                return 1;
+            }
+            break;
         case 'd':
             direct_io = true;
             break;
@@ -56,37 +96,44 @@ int main(int argc, char *argv[]) {
         return 1;
     }
 
-    std::string filename = argv[optind];
-
-    int oflags = O_RDONLY;
-    if (direct_io) {
-        oflags |= O_DIRECT;
+    Stripe stripe;
+    if (!stripe.open(argv + optind, argc - optind, block_size, direct_io)) {
+        return 1;
     }
-    int file = open(filename.c_str(), oflags);
 
-    size_t file_size = lseek(file, 0, SEEK_END);
-    lseek(file, 0, SEEK_SET);
+    AccessOffsets offsets =
+        pattern.offsets(stripe.num_blocks(), block_size, num_ops, seed);
+    size_t num_reads = offsets.size();
 
-    size_t num_blocks = (file_size + block_size - 1) / block_size;
-    std::vector<size_t> offsets(num_blocks);
-    for (size_t i = 0; i < num_blocks; ++i) {
-        offsets[i] = i * block_size;
-    }
-    // Shuffle offsets for random read
-    std::shuffle(offsets.begin(), offsets.end(), std::mt19937{seed});
+    IntervalSampler sampler(interval_ms, !json_output, &progress);
+    sampler.start();
 
     auto start = std::chrono::high_resolution_clock::now();
 
     size_t index = 0;
-    do_reads(file, index, offsets.data(), num_blocks);
+    do_reads(stripe, index, offsets, num_reads);
 
     auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
     std::chrono::duration<double> elapsed = end - start;
-    double iops = static_cast<double>(num_blocks) / elapsed.count();
-    std::printf(
-        "time_ms:%ld\n",
+    double iops = static_cast<double>(num_reads) / elapsed.count();
+    Report report("file_random_read", "sync");
+    report.config("file", stripe.names());
+    report.config("num_files", stripe.num_files());
+    report.config("file_size", stripe.size());
+    report.config("block_size", block_size);
+    report.config("seed", seed);
+    report.config("access", pattern.name());
+    report.config("num_ops", num_reads);
+    report.config("direct_io", direct_io);
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
         std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
-    std::printf("iops:%.2f\n", iops);
+    report.metric("iops", iops);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
 
+    stripe.close();
     return 0;
 }
\ No newline at end of file
@@ -1,46 +1,176 @@
+#include "access.hpp"
+#include "interval.hpp"
+#include "report.hpp"
+#include "stripe.hpp"
 #include <algorithm>
 #include <chrono>
 #include <cstdio>
 #include <cstring>
 #include <fcntl.h>
 #include <getopt.h>
+#include <latch>
 #include <liburing.h>
 #include <random>
+#include <stdexcept>
 #include <string>
 #include <sys/mman.h>
 #include <sys/stat.h>
+#include <thread>
 #include <unistd.h>
 #include <vector>
 
 static size_t block_size = 1024 * 1024; // 1MB
 static size_t num_tasks = 32;
 static size_t seed = 42;
+static size_t num_ops = 0;
+static AccessPattern pattern;
 static bool direct_io = false;
 static bool fixed = false;
 static bool iopoll = false;
 static bool sqpoll = false;
+static bool per_file_threads = false;
+static bool json_output = false;
+static int interval_ms = 0;
+static int ring_flags = 0;
+
+// Queues a read of the stripe offset off into slot, against the files
+// first..first + num_files, which are registered as fixed slots 0..num_files
+static void prep_read(io_uring *ring, const Stripe &stripe, size_t first,
+                      size_t num_files, char *buffer, size_t slot,
+                      size_t off) {
+    size_t k = stripe_file(off, block_size, num_files);
+    size_t file_off = stripe_offset(off, block_size, num_files);
+    size_t to_read =
+        std::min(block_size, stripe.file_size(first + k) - file_off);
+
+    io_uring_sqe *sqe = io_uring_get_sqe(ring);
+    if (fixed) {
+        io_uring_prep_read_fixed(sqe, k, buffer + slot * block_size, to_read,
+                                 file_off, slot);
+        sqe->flags |= IOSQE_FIXED_FILE;
+    } else {
+        io_uring_prep_read(sqe, stripe.fd(first + k),
+                           buffer + slot * block_size, to_read, file_off);
+    }
+    sqe->user_data = slot;
+}
+
+// One ring on the calling thread, set up before the ready latch so only the
+// reads are timed
+static int run_ring(const Stripe &stripe, size_t first, size_t num_files,
+                    char *buffer, const AccessOffsets &offsets,
+                    IntervalCounter &progress, std::latch &ready) {
+    int r;
+    io_uring ring;
+    if ((r = io_uring_queue_init((unsigned)num_tasks, &ring, ring_flags)) <
+        0) {
+        std::fprintf(stderr, "io_uring_queue_init: %s\n", strerror(-r));
+        ready.count_down();
+        return 1;
+    }
+
+    if (fixed) {
+        std::vector<iovec> iovecs(num_tasks);
+        for (size_t i = 0; i < num_tasks; ++i) {
+            iovecs[i].iov_base = buffer + i * block_size;
+            iovecs[i].iov_len = block_size;
+        }
+        if (io_uring_register_buffers(&ring, iovecs.data(), num_tasks) < 0) {
+            std::fprintf(stderr, "io_uring_register_buffers failed\n");
+            io_uring_queue_exit(&ring);
+            ready.count_down();
+            return 1;
+        }
+
+        // One slot per file, as many as the stripe is wide
+        if (io_uring_register_files(&ring, stripe.fds() + first, num_files) <
+            0) {
+            std::fprintf(stderr, "io_uring_register_files failed\n");
+            io_uring_queue_exit(&ring);
+            ready.count_down();
+            return 1;
+        }
+    }
+
+    size_t num_reads = offsets.size();
+    size_t index = 0;
+    size_t left = num_reads;
+
+    ready.arrive_and_wait();
+
+    // Launch initial read requests
+    for (size_t i = 0; i < num_tasks && index < num_reads; ++i) {
+        prep_read(&ring, stripe, first, num_files, buffer, i, offsets[index]);
+        index++;
+    }
+
+    while (index < num_reads || left > 0) {
+        io_uring_submit_and_wait(&ring, 1);
+        io_uring_cqe *cqe;
+        unsigned head;
+        size_t processed = 0;
+        io_uring_for_each_cqe(&ring, head, cqe) {
+            size_t slot = (size_t)cqe->user_data;
+            if (cqe->res < 0) {
+                std::fprintf(stderr, "io_uring read error: %d\n", cqe->res);
+                io_uring_queue_exit(&ring);
+                return 1;
+            }
+            left--;
+            progress.add(cqe->res);
+            // Launch new read if there's more data
+            if (index < num_reads) {
+                prep_read(&ring, stripe, first, num_files, buffer, slot,
+                          offsets[index]);
+                index++;
+            }
+
+            processed++;
+        }
+
+        io_uring_cq_advance(&ring, processed);
+    }
+
+    io_uring_queue_exit(&ring);
+    return 0;
+}
 
 void usage(const char *prog_name) {
-    std::printf("Usage: %s [-hdfpq] [-b block_size] [-t num_tasks] [-s seed] "
-                "<filename>\n"
+    std::printf("Usage: %s [-hjdfpqT] [-i interval_ms] [-b block_size] "
+                "[-t num_tasks] [-s seed] [-n num_ops] [-a access] "
+                "<filename>...\n"
                 "  -h              Show this help message\n"
+                "  -j              Print metrics and config as JSON\n"
+                "  -i interval_ms  Sample progress every interval_ms\n"
                 "  -b block_size   Block size of each read operation in bytes\n"
-                "  -t num_tasks    Number of concurrent tasks\n"
+                "  -t num_tasks    Number of concurrent tasks per ring\n"
                 "  -s seed         Seed for random number generator\n"
+                "  -n num_ops      Number of reads, default one per block\n"
+                "  -a access       uniform, zipf:THETA, hotspot:OPS:DATA (in\n"
+                "                  percent) or runs:LEN, default uniform\n"
                 "  -d              Use direct I/O\n"
                 "  -f              Use fixed file descriptor and buffer\n"
                 "  -p              Use I/O polling\n"
-                "  -q              Use SQ polling\n",
+                "  -q              Use SQ polling\n"
+                "  -T              One ring thread per file, each reading\n"
+                "                  only its own; otherwise reads are striped\n"
+                "                  across the files block by block\n",
                 prog_name);
 }
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hb:t:s:dfpq")) != -1) {
+    while ((opt = getopt(argc, argv, "hji:b:t:s:n:a:dfpqT")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
         case 'b':
             block_size = std::stoul(optarg);
             break;
@@ -50,6 +180,18 @@ int main(int argc, char *argv[]) {
         case 's':
             seed = std::stoul(optarg);
             break;
+        case 'n':
+            num_ops = std::stoul(optarg);
+            break;
+        case 'a':
+            try {
+                pattern = AccessPattern::parse(optarg);
+            } catch (const std::exception &e) {
+                std::fprintf(stderr, "-a %s: %s\n", optarg, e.what());
+                usage(argv[0]);
+                return 1;
+            }
+            break;
         case 'd':
             direct_io = true;
             break;
@@ -62,6 +204,9 @@ int main(int argc, char *argv[]) {
         case 'q':
             sqpoll = true;
             break;
+        case 'T':
+            per_file_threads = true;
+            break;
         default:
             usage(argv[0]);
             return 1;
@@ -73,148 +218,110 @@ int main(int argc, char *argv[]) {
         return 1;
     }
 
-    std::string filename = argv[optind];
-
-    int oflags = O_RDONLY;
-    if (direct_io) {
-        oflags |= O_DIRECT;
-    }
-    int file = open(filename.c_str(), oflags);
-    if (file < 0) {
-        perror("open");
+    Stripe stripe;
+    if (!stripe.open(argv + optind, argc - optind, block_size, direct_io)) {
         return 1;
     }
 
-    size_t file_size = lseek(file, 0, SEEK_END);
-    lseek(file, 0, SEEK_SET);
+    ring_flags = IORING_SETUP_SINGLE_ISSUER;
+    if (iopoll) {
+        ring_flags |= IORING_SETUP_IOPOLL;
+    }
+    if (sqpoll) {
+        ring_flags |= IORING_SETUP_SQPOLL;
+    }
 
-    size_t num_blocks = (file_size + block_size - 1) / block_size;
-    std::vector<size_t> offsets(num_blocks);
-    for (size_t i = 0; i < num_blocks; ++i) {
-        offsets[i] = i * block_size;
+    // Each thread draws its share of the ops over its own file, otherwise
+    // one ring draws them all over the whole stripe
+    size_t num_threads = per_file_threads ? stripe.num_files() : 1;
+    std::vector<AccessOffsets> offsets;
+    for (size_t k = 0; k < num_threads; ++k) {
+        if (per_file_threads) {
+            size_t thread_ops =
+                num_ops == 0 ? 0 : std::max<size_t>(1, num_ops / num_threads);
+            offsets.push_back(pattern.offsets(stripe.blocks_per_file(),
+                                              block_size, thread_ops,
+                                              seed + k));
+        } else {
+            offsets.push_back(pattern.offsets(stripe.num_blocks(), block_size,
+                                              num_ops, seed));
+        }
+    }
+    size_t num_reads = 0;
+    for (const AccessOffsets &thread_offsets : offsets) {
+        num_reads += thread_offsets.size();
     }
-    std::shuffle(offsets.begin(), offsets.end(), std::mt19937{seed});
 
-    size_t total_buffer_size = block_size * num_tasks;
+    size_t thread_buffer_size = block_size * num_tasks;
+    size_t total_buffer_size = thread_buffer_size * num_threads;
     void *data = mmap(nullptr, total_buffer_size, PROT_READ | PROT_WRITE,
                       MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
     if (data == MAP_FAILED) {
         perror("mmap");
-        close(file);
+        stripe.close();
         return 1;
     }
     char *total_buffer = static_cast<char *>(data);
 
-    int flags = IORING_SETUP_SINGLE_ISSUER;
-    if (iopoll) {
-        flags |= IORING_SETUP_IOPOLL;
-    }
-    if (sqpoll) {
-        flags |= IORING_SETUP_SQPOLL;
-    }
-
-    int r;
-    io_uring ring;
-    if ((r = io_uring_queue_init((unsigned)num_tasks, &ring, flags)) < 0) {
-        std::fprintf(stderr, "io_uring_queue_init: %s\n", strerror(-r));
-        munmap(data, total_buffer_size);
-        close(file);
-        return 1;
-    }
-
-    if (fixed) {
-        std::vector<iovec> iovecs(num_tasks);
-        for (size_t i = 0; i < num_tasks; ++i) {
-            iovecs[i].iov_base = total_buffer + i * block_size;
-            iovecs[i].iov_len = block_size;
-        }
-        if (io_uring_register_buffers(&ring, iovecs.data(), num_tasks) < 0) {
-            std::fprintf(stderr, "io_uring_register_buffers failed\n");
-            return 1;
-        }
-
-        if (io_uring_register_files(&ring, &file, 1) < 0) {
-            std::fprintf(stderr, "io_uring_register_files failed\n");
-            return 1;
-        }
+    std::vector<IntervalCounter> progress(num_threads);
+    std::vector<int> results(num_threads);
+    std::latch ready(num_threads + 1);
+    std::vector<std::thread> threads;
+    for (size_t k = 0; k < num_threads; ++k) {
+        size_t first = per_file_threads ? k : 0;
+        size_t num_files = per_file_threads ? 1 : stripe.num_files();
+        threads.emplace_back([&, k, first, num_files] {
+            results[k] = run_ring(stripe, first, num_files,
+                                  total_buffer + k * thread_buffer_size,
+                                  offsets[k], progress[k], ready);
+        });
     }
 
-    size_t index = 0;
-    size_t left = num_blocks;
-
-    io_uring_sqe *sqe;
+    IntervalSampler sampler(interval_ms, !json_output, progress.data(),
+                            progress.size());
+    ready.arrive_and_wait();
+    sampler.start();
 
     auto start = std::chrono::high_resolution_clock::now();
 
-    // Launch initial read requests
-    for (size_t i = 0; i < num_tasks && index < num_blocks; ++i) {
-        size_t off = offsets[index];
-        size_t to_read = std::min(block_size, file_size - off);
-
-        sqe = io_uring_get_sqe(&ring);
-        if (fixed) {
-            io_uring_prep_read_fixed(sqe, 0, total_buffer + i * block_size,
-                                     to_read, off, i);
-            sqe->flags |= IOSQE_FIXED_FILE;
-        } else {
-            io_uring_prep_read(sqe, file, total_buffer + i * block_size,
-                               to_read, off);
-        }
-        sqe->user_data = i;
-        index++;
-    }
-
-    while (index < num_blocks || left > 0) {
-        io_uring_submit_and_wait(&ring, 1);
-        io_uring_cqe *cqe;
-        unsigned head;
-        size_t processed = 0;
-        io_uring_for_each_cqe(&ring, head, cqe) {
-            size_t slot = (size_t)cqe->user_data;
-            if (cqe->res < 0) {
-                std::fprintf(stderr, "io_uring read error: %d\n", cqe->res);
-                io_uring_queue_exit(&ring);
-                munmap(data, total_buffer_size);
-                close(file);
-                return 1;
-            }
-            left--;
-            // Launch new read if there's more data
-            if (index < num_blocks) {
-                size_t off = offsets[index];
-                size_t to_read = std::min(block_size, file_size - off);
-
-                sqe = io_uring_get_sqe(&ring);
-                if (fixed) {
-                    io_uring_prep_read_fixed(sqe, 0,
-                                             total_buffer + slot * block_size,
-                                             to_read, off, slot);
-                    sqe->flags |= IOSQE_FIXED_FILE;
-                } else {
-                    io_uring_prep_read(sqe, file,
-                                       total_buffer + slot * block_size,
-                                       to_read, off);
-                }
-                sqe->user_data = slot;
-                index++;
-            }
-
-            processed++;
-        }
-
-        io_uring_cq_advance(&ring, processed);
+    for (auto &thread : threads) {
+        thread.join();
     }
 
     auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
+    if (std::any_of(results.begin(), results.end(),
+                    [](int result) { return result != 0; })) {
+        munmap(data, total_buffer_size);
+        stripe.close();
+        return 1;
+    }
     std::chrono::duration<double> elapsed = end - start;
-    double iops = static_cast<double>(num_blocks) / elapsed.count();
-    std::printf(
-        "time_ms:%ld\n",
+    double iops = static_cast<double>(num_reads) / elapsed.count();
+    Report report("file_random_read", "uring");
+    report.config("file", stripe.names());
+    report.config("num_files", stripe.num_files());
+    report.config("file_size", stripe.size());
+    report.config("block_size", block_size);
+    report.config("seed", seed);
+    report.config("access", pattern.name());
+    report.config("num_ops", num_reads);
+    report.config("num_tasks", num_tasks);
+    report.config("direct_io", direct_io);
+    report.config("fixed", fixed);
+    report.config("iopoll", iopoll);
+    report.config("sqpoll", sqpoll);
+    report.config("per_file_threads", per_file_threads);
+    report.config("ring_flags", ring_flags);
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
         std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
-    std::printf("iops:%.2f\n", iops);
+    report.metric("iops", iops);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
 
-    io_uring_queue_exit(&ring);
     munmap(data, total_buffer_size);
-    close(file);
+    stripe.close();
     return 0;
 }
\ No newline at end of file
@@ -1,3 +1,5 @@
+#include "interval.hpp"
+#include "report.hpp"
 #include <algorithm>
 #include <chrono>
 #include <cstdio>
@@ -12,10 +14,16 @@
 
 static size_t block_size = 1024 * 1024; // 1MB
 static size_t num_tasks = 32;
+static bool json_output = false;
+static int interval_ms = 0;
+static IntervalCounter progress;
 
 void usage(const char *prog_name) {
-    std::printf("Usage: %s [-h] [-b block_size] [-t num_tasks] <filename>\n"
+    std::printf("Usage: %s [-hj] [-i interval_ms] [-b block_size] "
+                "[-t num_tasks] <filename>\n"
                 "  -h              Show this help message\n"
+                "  -j              Print metrics and config as JSON\n"
+                "  -i interval_ms  Sample progress every interval_ms\n"
                 "  -b block_size   Block size of each read operation in bytes\n"
                 "  -t num_tasks    Number of concurrent tasks\n",
                 prog_name);
@@ -23,11 +31,17 @@ void usage(const char *prog_name) {
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hb:t:")) != -1) {
+    while ((opt = getopt(argc, argv, "hji:b:t:")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
         case 'b':
             block_size = std::stoul(optarg);
             break;
@@ -84,6 +98,9 @@ int main(int argc, char *argv[]) {
         cbs_ptr[i] = &cbs[i];
     }
 
+    IntervalSampler sampler(interval_ms, !json_output, &progress);
+    sampler.start();
+
     auto start = std::chrono::high_resolution_clock::now();
 
     // Launch initial read requests
@@ -122,6 +139,7 @@ int main(int argc, char *argv[]) {
                 return 1;
             }
             left -= events[j].res;
+            progress.add(events[j].res);
             // Submit a new read if there's more data
             if (offset < file_size) {
                 size_t to_read = std::min(block_size, file_size - offset);
@@ -142,13 +160,23 @@ int main(int argc, char *argv[]) {
     }
 
     auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
     std::chrono::duration<double> elapsed = end - start;
     double throughput = static_cast<double>(file_size) / elapsed.count() /
                         (1024 * 1024); // MB/s
-    std::printf(
-        "time_ms:%ld\n",
+    Report report("file_read", "aio");
+    report.config("file", filename);
+    report.config("file_size", file_size);
+    report.config("block_size", block_size);
+    report.config("num_tasks", num_tasks);
+    report.config("direct_io", true);
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
         std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
-    std::printf("throughput_mbps:%.2f\n", throughput);
+    report.metric("throughput_mbps", throughput);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
 
     io_destroy(ctx);
     munmap(data, total_buffer_size);
@@ -1,3 +1,5 @@
+#include "interval.hpp"
+#include "report.hpp"
 #include <cstddef>
 #include <fcntl.h>
 #include <string>
@@ -6,6 +8,9 @@
 
 static size_t block_size = 1024 * 1024; // 1MB
 static bool direct_io = false;
+static bool json_output = false;
+static int interval_ms = 0;
+static IntervalCounter progress;
 
 void do_reads(int file, size_t &offset, size_t total_size) {
     std::vector<char> buffer(block_size);
@@ -14,13 +19,16 @@ void do_reads(int file, size_t &offset, size_t total_size) {
         size_t current_offset = offset;
         offset += to_read;
         ::pread(file, buffer.data(), to_read, current_offset);
+        progress.add(to_read);
     }
 }
 
 void usage(const char *prog_name) {
     std::printf(
-        "Usage: %s [-hd] [-b block_size] <filename>\n"
+        "Usage: %s [-hjd] [-i interval_ms] [-b block_size] <filename>\n"
         "  -h              Show this help message\n"
+        "  -j              Print metrics and config as JSON\n"
+        "  -i interval_ms  Sample progress every interval_ms\n"
         "  -b block_size   Block size of each read operation in bytes\n"
         "  -d              Use direct I/O\n",
         prog_name);
@@ -28,11 +36,17 @@ void usage(const char *prog_name) {
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hb:t:d")) != -1) {
+    while ((opt = getopt(argc, argv, "hji:b:t:d")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
         case 'b':
             block_size = std::stoul(optarg);
             break;
@@ -64,18 +78,30 @@ int main(int argc, char *argv[]) {
 
     std::vector<std::thread> threads;
 
+    IntervalSampler sampler(interval_ms, !json_output, &progress);
+    sampler.start();
+
     auto start = std::chrono::high_resolution_clock::now();
 
     do_reads(file, offset, file_size);
 
     auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
     std::chrono::duration<double> elapsed = end - start;
     double throughput = static_cast<double>(file_size) / elapsed.count() /
                         (1024 * 1024); // MB/s
-    std::printf(
-        "time_ms:%ld\n",
+    Report report("file_read", "sync");
+    report.config("file", filename);
+    report.config("file_size", file_size);
+    report.config("block_size", block_size);
+    report.config("direct_io", direct_io);
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
         std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
-    std::printf("throughput_mbps:%.2f\n", throughput);
+    report.metric("throughput_mbps", throughput);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
 
     return 0;
 }
\ No newline at end of file
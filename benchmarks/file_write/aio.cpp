@@ -0,0 +1,236 @@
+#include "interval.hpp"
+#include "report.hpp"
+#include "write.hpp"
+#include <chrono>
+#include <cstdio>
+#include <cstring>
+#include <fcntl.h>
+#include <getopt.h>
+#include <libaio.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <vector>
+
+static size_t block_size = 1024 * 1024;  // 1MB
+static size_t size = 1024 * 1024 * 1024; // 1GB
+static size_t num_tasks = 32;
+static std::string mode = "append";
+static size_t sync_every = 0;
+static size_t seed = 42;
+static bool json_output = false;
+static int interval_ms = 0;
+static IntervalCounter progress;
+
+void usage(const char *prog_name) {
+    std::printf("Usage: %s [-hj] [-i interval_ms] [-b block_size] "
+                "[-t num_tasks] [-z size] [-m mode] [-y sync_every] "
+                "[-s seed] <filename>\n"
+                "  -h              Show this help message\n"
+                "  -j              Print metrics and config as JSON\n"
+                "  -i interval_ms  Sample progress every interval_ms\n"
+                "  -b block_size   Block size of each write in bytes\n"
+                "  -t num_tasks    Number of concurrent tasks\n"
+                "  -z size         Bytes to write\n"
+                "  -m mode         append (truncates the file) or random\n"
+                "                  (overwrites an existing file), default "
+                "append\n"
+                "  -y sync_every   fdatasync after every sync_every writes, 0\n"
+                "                  for only once at the end\n"
+                "  -s seed         Seed for random number generator\n",
+                prog_name);
+}
+
+int main(int argc, char *argv[]) {
+    int opt;
+    while ((opt = getopt(argc, argv, "hji:b:t:z:m:y:s:")) != -1) {
+        switch (opt) {
+        case 'h':
+            usage(argv[0]);
+            return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
+        case 'b':
+            block_size = std::stoul(optarg);
+            break;
+        case 't':
+            num_tasks = std::stoul(optarg);
+            break;
+        case 'z':
+            size = std::stoul(optarg);
+            break;
+        case 'm':
+            mode = optarg;
+            break;
+        case 'y':
+            sync_every = std::stoul(optarg);
+            break;
+        case 's':
+            seed = std::stoul(optarg);
+            break;
+        default:
+            usage(argv[0]);
+            return 1;
+        }
+    }
+
+    if (optind >= argc || !valid_write_mode(mode)) {
+        usage(argv[0]);
+        return 1;
+    }
+
+    std::string filename = argv[optind];
+
+    // Buffered writes block in io_submit, so aio is only asynchronous direct
+    int file = open_write_file(filename, mode, size, true);
+    if (file < 0) {
+        return 1;
+    }
+
+    size_t num_blocks = size / block_size;
+    std::vector<size_t> offsets =
+        write_offsets(mode, num_blocks, block_size, seed);
+
+    size_t total_buffer_size = block_size * num_tasks;
+    void *data = mmap(nullptr, total_buffer_size, PROT_READ | PROT_WRITE,
+                      MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (data == MAP_FAILED) {
+        perror("mmap");
+        close(file);
+        return 1;
+    }
+    char *total_buffer = static_cast<char *>(data);
+    fill_random(total_buffer, total_buffer_size, seed);
+
+    io_context_t ctx = 0;
+    if (io_setup(num_tasks, &ctx) < 0) {
+        perror("io_setup");
+        munmap(data, total_buffer_size);
+        close(file);
+        return 1;
+    }
+
+    size_t next = 0;
+    size_t active = 0;
+    size_t syncs = 0;
+    std::vector<iocb> cbs(num_tasks);
+    std::vector<iocb *> cbs_ptr(num_tasks);
+    std::vector<io_event> events(num_tasks);
+    // Whether the write in flight on each slot is followed by an fdatasync
+    std::vector<bool> slot_syncs(num_tasks);
+
+    for (size_t i = 0; i < num_tasks; ++i) {
+        cbs_ptr[i] = &cbs[i];
+    }
+
+    // Reuses the slot's iocb for its next write, or for the fdatasync after
+    // a write that needs one
+    auto submit = [&](size_t idx, bool fdsync) {
+        memset(&cbs[idx], 0, sizeof(iocb));
+        if (fdsync) {
+            io_prep_fdsync(&cbs[idx], file);
+        } else {
+            slot_syncs[idx] = syncs_after(next, sync_every);
+            io_prep_pwrite(&cbs[idx], file, total_buffer + idx * block_size,
+                           block_size, offsets[next]);
+            next++;
+        }
+        cbs[idx].data = (void *)idx;
+        if (io_submit(ctx, 1, &cbs_ptr[idx]) < 0) {
+            perror("io_submit");
+            return false;
+        }
+        return true;
+    };
+
+    IntervalSampler sampler(interval_ms, !json_output, &progress);
+    sampler.start();
+
+    auto start = std::chrono::high_resolution_clock::now();
+
+    bool ok = true;
+    // Launch initial write requests
+    for (size_t i = 0; ok && i < num_tasks && next < num_blocks; i++) {
+        active++;
+        ok = submit(i, false);
+    }
+
+    while (ok && active > 0) {
+        int ret = io_getevents(ctx, 1, num_tasks, events.data(), nullptr);
+        if (ret < 0) {
+            perror("io_getevents");
+            ok = false;
+            break;
+        }
+        for (int j = 0; ok && j < ret; ++j) {
+            size_t idx = (size_t)events[j].obj->data;
+            bool was_fdsync = cbs[idx].aio_lio_opcode == IO_CMD_FDSYNC;
+            if ((ssize_t)events[j].res < 0) {
+                std::fprintf(stderr, "AIO %s error: %zd\n",
+                             was_fdsync ? "fdatasync" : "write",
+                             (ssize_t)events[j].res);
+                ok = false;
+                break;
+            }
+            if (was_fdsync) {
+                syncs++;
+            } else {
+                progress.add(events[j].res);
+                if (slot_syncs[idx]) {
+                    ok = submit(idx, true);
+                    continue;
+                }
+            }
+            if (next < num_blocks) {
+                ok = submit(idx, false);
+            } else {
+                active--;
+            }
+        }
+    }
+    if (!ok) {
+        io_destroy(ctx);
+        munmap(data, total_buffer_size);
+        close(file);
+        return 1;
+    }
+    // Everything is durable before the clock stops
+    ::fdatasync(file);
+    syncs++;
+
+    auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
+    std::chrono::duration<double> elapsed = end - start;
+    size_t written = num_blocks * block_size;
+    double throughput = static_cast<double>(written) / elapsed.count() /
+                        (1024 * 1024); // MB/s
+    double iops = static_cast<double>(num_blocks) / elapsed.count();
+    Report report("file_write", "aio");
+    report.config("file", filename);
+    report.config("size", written);
+    report.config("block_size", block_size);
+    report.config("mode", mode);
+    report.config("seed", seed);
+    report.config("num_ops", num_blocks);
+    report.config("sync_every", sync_every);
+    report.config("num_tasks", num_tasks);
+    report.config("direct_io", true);
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
+        std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
+    report.metric("throughput_mbps", throughput);
+    report.metric("iops", iops);
+    report.metric("syncs", syncs);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
+
+    io_destroy(ctx);
+    munmap(data, total_buffer_size);
+    close(file);
+    return 0;
+}
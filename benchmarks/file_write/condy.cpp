@@ -0,0 +1,237 @@
+#include "interval.hpp"
+#include "report.hpp"
+#include "write.hpp"
+#include <chrono>
+#include <condy.hpp>
+#include <cstddef>
+#include <fcntl.h>
+#include <string>
+#include <unistd.h>
+#include <vector>
+
+static size_t block_size = 1024 * 1024;  // 1MB
+static size_t size = 1024 * 1024 * 1024; // 1GB
+static size_t num_tasks = 32;
+static std::string mode = "append";
+static size_t sync_every = 0;
+static size_t seed = 42;
+static bool direct_io = false;
+static bool fixed = false;
+static bool linked = false;
+static bool sqpoll = false;
+static bool json_output = false;
+static int interval_ms = 0;
+static size_t syncs = 0;
+static IntervalCounter progress;
+
+// File is an fd or condy::fixed(index), Buffer plain or registered
+template <typename File, typename Buffer>
+condy::Coro<void> do_writes(File file, Buffer buf, size_t &index,
+                            size_t offsets[], size_t total_blocks) {
+    while (index < total_blocks) {
+        size_t current = index;
+        index++;
+        if (!syncs_after(current, sync_every)) {
+            co_await condy::async_write(file, buf, offsets[current]);
+        } else if (linked) {
+            // One submission, the kernel starts the fdatasync once the write
+            // completes without a round trip through this task
+            co_await (condy::async_write(file, buf, offsets[current]) >>
+                      condy::async_fsync(file, IORING_FSYNC_DATASYNC));
+            syncs++;
+        } else {
+            co_await condy::async_write(file, buf, offsets[current]);
+            co_await condy::async_fsync(file, IORING_FSYNC_DATASYNC);
+            syncs++;
+        }
+        progress.add(block_size);
+    }
+}
+
+void usage(const char *prog_name) {
+    std::printf("Usage: %s [-hjdflq] [-i interval_ms] [-b block_size] "
+                "[-t num_tasks] [-z size] [-m mode] [-y sync_every] "
+                "[-s seed] <filename>\n"
+                "  -h              Show this help message\n"
+                "  -j              Print metrics and config as JSON\n"
+                "  -i interval_ms  Sample progress every interval_ms\n"
+                "  -b block_size   Block size of each write in bytes\n"
+                "  -t num_tasks    Number of concurrent tasks\n"
+                "  -z size         Bytes to write\n"
+                "  -m mode         append (truncates the file) or random\n"
+                "                  (overwrites an existing file), default "
+                "append\n"
+                "  -y sync_every   fdatasync after every sync_every writes, 0\n"
+                "                  for only once at the end\n"
+                "  -s seed         Seed for random number generator\n"
+                "  -d              Use direct I/O\n"
+                "  -f              Use fixed file descriptor and buffer\n"
+                "  -l              Link each fdatasync to its write\n"
+                "  -q              Use SQ polling\n",
+                prog_name);
+}
+
+int main(int argc, char *argv[]) {
+    int opt;
+    while ((opt = getopt(argc, argv, "hji:b:t:z:m:y:s:dflq")) != -1) {
+        switch (opt) {
+        case 'h':
+            usage(argv[0]);
+            return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
+        case 'b':
+            block_size = std::stoul(optarg);
+            break;
+        case 't':
+            num_tasks = std::stoul(optarg);
+            break;
+        case 'z':
+            size = std::stoul(optarg);
+            break;
+        case 'm':
+            mode = optarg;
+            break;
+        case 'y':
+            sync_every = std::stoul(optarg);
+            break;
+        case 's':
+            seed = std::stoul(optarg);
+            break;
+        case 'd':
+            direct_io = true;
+            break;
+        case 'f':
+            fixed = true;
+            break;
+        case 'l':
+            linked = true;
+            break;
+        case 'q':
+            sqpoll = true;
+            break;
+        default:
+            usage(argv[0]);
+            return 1;
+        }
+    }
+
+    if (optind >= argc || !valid_write_mode(mode)) {
+        usage(argv[0]);
+        return 1;
+    }
+
+    std::string filename = argv[optind];
+
+    // A linked write and fdatasync take two entries
+    size_t sq_size = num_tasks * 2;
+    condy::RuntimeOptions options;
+    // Disable periodic event checking for fair comparison with liburing bench
+    options.sq_size(sq_size).event_interval(
+        std::numeric_limits<size_t>::max());
+    if (sqpoll) {
+        options.enable_sqpoll();
+    }
+
+    condy::Runtime runtime(options);
+
+    int file = open_write_file(filename, mode, size, direct_io);
+    if (file < 0) {
+        return 1;
+    }
+
+    size_t num_blocks = size / block_size;
+    std::vector<size_t> offsets =
+        write_offsets(mode, num_blocks, block_size, seed);
+
+    size_t total_buffer_size = block_size * num_tasks;
+    void *data = mmap(nullptr, total_buffer_size, PROT_READ | PROT_WRITE,
+                      MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (data == MAP_FAILED) {
+        perror("mmap");
+        close(file);
+        return 1;
+    }
+    char *total_buffer = static_cast<char *>(data);
+    fill_random(total_buffer, total_buffer_size, seed);
+
+    if (fixed) {
+        std::vector<iovec> iovecs(num_tasks);
+        for (size_t i = 0; i < num_tasks; ++i) {
+            iovecs[i].iov_base = total_buffer + i * block_size;
+            iovecs[i].iov_len = block_size;
+        }
+        runtime.buffer_table().init(num_tasks);
+        runtime.buffer_table().update(0, iovecs.data(), num_tasks);
+        runtime.fd_table().init(1);
+        runtime.fd_table().update(0, &file, 1);
+    }
+
+    size_t index = 0;
+
+    for (size_t i = 0; i < num_tasks; ++i) {
+        auto buf = condy::buffer(total_buffer + i * block_size, block_size);
+        if (fixed) {
+            condy::co_spawn(runtime,
+                            do_writes(condy::fixed(0), condy::fixed(i, buf),
+                                      index, offsets.data(), num_blocks))
+                .detach();
+        } else {
+            condy::co_spawn(runtime, do_writes(file, buf, index,
+                                               offsets.data(), num_blocks))
+                .detach();
+        }
+    }
+
+    IntervalSampler sampler(interval_ms, !json_output, &progress);
+    sampler.start();
+
+    auto start = std::chrono::high_resolution_clock::now();
+
+    runtime.allow_exit();
+    runtime.run();
+    // Everything is durable before the clock stops
+    ::fdatasync(file);
+    syncs++;
+
+    auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
+    std::chrono::duration<double> elapsed = end - start;
+    size_t written = num_blocks * block_size;
+    double throughput = static_cast<double>(written) / elapsed.count() /
+                        (1024 * 1024); // MB/s
+    double iops = static_cast<double>(num_blocks) / elapsed.count();
+    Report report("file_write", "condy");
+    report.config("file", filename);
+    report.config("size", written);
+    report.config("block_size", block_size);
+    report.config("mode", mode);
+    report.config("seed", seed);
+    report.config("num_ops", num_blocks);
+    report.config("sync_every", sync_every);
+    report.config("num_tasks", num_tasks);
+    report.config("direct_io", direct_io);
+    report.config("fixed", fixed);
+    report.config("linked", linked);
+    report.config("sqpoll", sqpoll);
+    report.config("sq_size", sq_size);
+    report.config("event_interval",
+                  std::numeric_limits<size_t>::max());
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
+        std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
+    report.metric("throughput_mbps", throughput);
+    report.metric("iops", iops);
+    report.metric("syncs", syncs);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
+
+    munmap(data, total_buffer_size);
+    close(file);
+    return 0;
+}
@@ -0,0 +1,156 @@
+#include "interval.hpp"
+#include "report.hpp"
+#include "write.hpp"
+#include <chrono>
+#include <cstddef>
+#include <fcntl.h>
+#include <string>
+#include <sys/mman.h>
+#include <unistd.h>
+#include <vector>
+
+static size_t block_size = 1024 * 1024;  // 1MB
+static size_t size = 1024 * 1024 * 1024; // 1GB
+static std::string mode = "append";
+static size_t sync_every = 0;
+static size_t seed = 42;
+static bool direct_io = false;
+static bool json_output = false;
+static int interval_ms = 0;
+static IntervalCounter progress;
+
+size_t do_writes(int file, char *buffer, size_t offsets[],
+                 size_t total_blocks) {
+    size_t syncs = 0;
+    for (size_t index = 0; index < total_blocks; ++index) {
+        ::pwrite(file, buffer, block_size, offsets[index]);
+        progress.add(block_size);
+        if (syncs_after(index, sync_every)) {
+            ::fdatasync(file);
+            syncs++;
+        }
+    }
+    return syncs;
+}
+
+void usage(const char *prog_name) {
+    std::printf("Usage: %s [-hjd] [-i interval_ms] [-b block_size] [-z size] "
+                "[-m mode] [-y sync_every] [-s seed] <filename>\n"
+                "  -h              Show this help message\n"
+                "  -j              Print metrics and config as JSON\n"
+                "  -i interval_ms  Sample progress every interval_ms\n"
+                "  -b block_size   Block size of each write in bytes\n"
+                "  -z size         Bytes to write\n"
+                "  -m mode         append (truncates the file) or random\n"
+                "                  (overwrites an existing file), default "
+                "append\n"
+                "  -y sync_every   fdatasync after every sync_every writes, 0\n"
+                "                  for only once at the end\n"
+                "  -s seed         Seed for random number generator\n"
+                "  -d              Use direct I/O\n",
+                prog_name);
+}
+
+int main(int argc, char *argv[]) {
+    int opt;
+    while ((opt = getopt(argc, argv, "hji:b:z:m:y:s:d")) != -1) {
+        switch (opt) {
+        case 'h':
+            usage(argv[0]);
+            return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
+        case 'b':
+            block_size = std::stoul(optarg);
+            break;
+        case 'z':
+            size = std::stoul(optarg);
+            break;
+        case 'm':
+            mode = optarg;
+            break;
+        case 'y':
+            sync_every = std::stoul(optarg);
+            break;
+        case 's':
+            seed = std::stoul(optarg);
+            break;
+        case 'd':
+            direct_io = true;
+            break;
+        default:
+            usage(argv[0]);
+            return 1;
+        }
+    }
+
+    if (optind >= argc || !valid_write_mode(mode)) {
+        usage(argv[0]);
+        return 1;
+    }
+
+    std::string filename = argv[optind];
+
+    int file = open_write_file(filename, mode, size, direct_io);
+    if (file < 0) {
+        return 1;
+    }
+
+    size_t num_blocks = size / block_size;
+    std::vector<size_t> offsets =
+        write_offsets(mode, num_blocks, block_size, seed);
+
+    void *data = mmap(nullptr, block_size, PROT_READ | PROT_WRITE,
+                      MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (data == MAP_FAILED) {
+        perror("mmap");
+        close(file);
+        return 1;
+    }
+    char *buffer = static_cast<char *>(data);
+    fill_random(buffer, block_size, seed);
+
+    IntervalSampler sampler(interval_ms, !json_output, &progress);
+    sampler.start();
+
+    auto start = std::chrono::high_resolution_clock::now();
+
+    size_t syncs = do_writes(file, buffer, offsets.data(), num_blocks);
+    // Everything is durable before the clock stops
+    ::fdatasync(file);
+    syncs++;
+
+    auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
+    std::chrono::duration<double> elapsed = end - start;
+    size_t written = num_blocks * block_size;
+    double throughput = static_cast<double>(written) / elapsed.count() /
+                        (1024 * 1024); // MB/s
+    double iops = static_cast<double>(num_blocks) / elapsed.count();
+    Report report("file_write", "sync");
+    report.config("file", filename);
+    report.config("size", written);
+    report.config("block_size", block_size);
+    report.config("mode", mode);
+    report.config("seed", seed);
+    report.config("num_ops", num_blocks);
+    report.config("sync_every", sync_every);
+    report.config("direct_io", direct_io);
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
+        std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
+    report.metric("throughput_mbps", throughput);
+    report.metric("iops", iops);
+    report.metric("syncs", syncs);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
+
+    munmap(data, block_size);
+    close(file);
+    return 0;
+}
@@ -0,0 +1,292 @@
+#include "interval.hpp"
+#include "report.hpp"
+#include "write.hpp"
+#include <chrono>
+#include <cstdio>
+#include <cstring>
+#include <fcntl.h>
+#include <getopt.h>
+#include <liburing.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <vector>
+
+static size_t block_size = 1024 * 1024;  // 1MB
+static size_t size = 1024 * 1024 * 1024; // 1GB
+static size_t num_tasks = 32;
+static std::string mode = "append";
+static size_t sync_every = 0;
+static size_t seed = 42;
+static bool direct_io = false;
+static bool fixed = false;
+static bool linked = false;
+static bool sqpoll = false;
+static bool json_output = false;
+static int interval_ms = 0;
+static IntervalCounter progress;
+
+// user_data is the slot index times two, plus one for an fdatasync
+static constexpr uint64_t fsync_tag = 1;
+
+void usage(const char *prog_name) {
+    std::printf("Usage: %s [-hjdflq] [-i interval_ms] [-b block_size] "
+                "[-t num_tasks] [-z size] [-m mode] [-y sync_every] "
+                "[-s seed] <filename>\n"
+                "  -h              Show this help message\n"
+                "  -j              Print metrics and config as JSON\n"
+                "  -i interval_ms  Sample progress every interval_ms\n"
+                "  -b block_size   Block size of each write in bytes\n"
+                "  -t num_tasks    Number of concurrent tasks\n"
+                "  -z size         Bytes to write\n"
+                "  -m mode         append (truncates the file) or random\n"
+                "                  (overwrites an existing file), default "
+                "append\n"
+                "  -y sync_every   fdatasync after every sync_every writes, 0\n"
+                "                  for only once at the end\n"
+                "  -s seed         Seed for random number generator\n"
+                "  -d              Use direct I/O\n"
+                "  -f              Use fixed fd and buffer\n"
+                "  -l              Link each fdatasync to its write\n"
+                "  -q              Use SQ polling\n",
+                prog_name);
+}
+
+static void prep_fsync(io_uring *ring, int file, size_t idx) {
+    io_uring_sqe *sqe = io_uring_get_sqe(ring);
+    if (fixed) {
+        io_uring_prep_fsync(sqe, 0, IORING_FSYNC_DATASYNC);
+        sqe->flags |= IOSQE_FIXED_FILE;
+    } else {
+        io_uring_prep_fsync(sqe, file, IORING_FSYNC_DATASYNC);
+    }
+    sqe->user_data = idx * 2 + fsync_tag;
+}
+
+// Queues a write from slot idx, with its fdatasync right behind it if linked
+static void prep_write(io_uring *ring, int file, char *buffer, size_t idx,
+                       size_t offset, bool sync) {
+    io_uring_sqe *sqe = io_uring_get_sqe(ring);
+    if (fixed) {
+        io_uring_prep_write_fixed(sqe, 0, buffer, block_size, offset, idx);
+        sqe->flags |= IOSQE_FIXED_FILE;
+    } else {
+        io_uring_prep_write(sqe, file, buffer, block_size, offset);
+    }
+    sqe->user_data = idx * 2;
+    if (sync && linked) {
+        sqe->flags |= IOSQE_IO_LINK;
+        prep_fsync(ring, file, idx);
+    }
+}
+
+int main(int argc, char *argv[]) {
+    int opt;
+    while ((opt = getopt(argc, argv, "hji:b:t:z:m:y:s:dflq")) != -1) {
+        switch (opt) {
+        case 'h':
+            usage(argv[0]);
+            return 0;
+        case 'j':
+            json_output = true;
+            break;
+        case 'i':
+            interval_ms = std::stoi(optarg);
+            break;
+        case 'b':
+            block_size = std::stoul(optarg);
+            break;
+        case 't':
+            num_tasks = std::stoul(optarg);
+            break;
+        case 'z':
+            size = std::stoul(optarg);
+            break;
+        case 'm':
+            mode = optarg;
+            break;
+        case 'y':
+            sync_every = std::stoul(optarg);
+            break;
+        case 's':
+            seed = std::stoul(optarg);
+            break;
+        case 'd':
+            direct_io = true;
+            break;
+        case 'f':
+            fixed = true;
+            break;
+        case 'l':
+            linked = true;
+            break;
+        case 'q':
+            sqpoll = true;
+            break;
+        default:
+            usage(argv[0]);
+            return 1;
+        }
+    }
+
+    if (optind >= argc || !valid_write_mode(mode)) {
+        usage(argv[0]);
+        return 1;
+    }
+
+    std::string filename = argv[optind];
+
+    int file = open_write_file(filename, mode, size, direct_io);
+    if (file < 0) {
+        return 1;
+    }
+
+    size_t num_blocks = size / block_size;
+    std::vector<size_t> offsets =
+        write_offsets(mode, num_blocks, block_size, seed);
+
+    size_t total_buffer_size = block_size * num_tasks;
+    void *data = mmap(nullptr, total_buffer_size, PROT_READ | PROT_WRITE,
+                      MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (data == MAP_FAILED) {
+        perror("mmap");
+        close(file);
+        return 1;
+    }
+    char *total_buffer = static_cast<char *>(data);
+    fill_random(total_buffer, total_buffer_size, seed);
+
+    int flags = IORING_SETUP_SINGLE_ISSUER;
+    if (sqpoll) {
+        flags |= IORING_SETUP_SQPOLL;
+    }
+    // A linked write and fdatasync take two entries
+    size_t sq_size = num_tasks * 2;
+    int r;
+    io_uring ring;
+    if ((r = io_uring_queue_init(sq_size, &ring, flags)) < 0) {
+        std::fprintf(stderr, "io_uring_queue_init: %s\n", strerror(-r));
+        munmap(data, total_buffer_size);
+        close(file);
+        return 1;
+    }
+
+    if (fixed) {
+        std::vector<iovec> iovecs(num_tasks);
+        for (size_t i = 0; i < num_tasks; ++i) {
+            iovecs[i].iov_base = total_buffer + i * block_size;
+            iovecs[i].iov_len = block_size;
+        }
+        if (io_uring_register_buffers(&ring, iovecs.data(), num_tasks) < 0) {
+            std::fprintf(stderr, "io_uring_register_buffers failed\n");
+            return 1;
+        }
+
+        if (io_uring_register_files(&ring, &file, 1) < 0) {
+            std::fprintf(stderr, "io_uring_register_files failed\n");
+            return 1;
+        }
+    }
+
+    size_t next = 0;
+    size_t active = 0;
+    size_t syncs = 0;
+    // Whether the write in flight on each slot is followed by an fdatasync
+    std::vector<bool> slot_syncs(num_tasks);
+
+    auto submit_next = [&](size_t idx) {
+        if (next >= num_blocks) {
+            active--;
+            return;
+        }
+        slot_syncs[idx] = syncs_after(next, sync_every);
+        prep_write(&ring, file, total_buffer + idx * block_size, idx,
+                   offsets[next], slot_syncs[idx]);
+        next++;
+    };
+
+    IntervalSampler sampler(interval_ms, !json_output, &progress);
+    sampler.start();
+
+    auto start = std::chrono::high_resolution_clock::now();
+
+    // Launch initial write requests
+    for (size_t i = 0; i < num_tasks && next < num_blocks; i++) {
+        active++;
+        submit_next(i);
+    }
+
+    while (active > 0) {
+        io_uring_submit_and_wait(&ring, 1);
+        io_uring_cqe *cqe;
+        unsigned head;
+        size_t processed = 0;
+        io_uring_for_each_cqe(&ring, head, cqe) {
+            size_t idx = (size_t)(cqe->user_data / 2);
+            bool is_fsync = cqe->user_data % 2 == fsync_tag;
+            if (cqe->res < 0) {
+                std::fprintf(stderr, "io_uring %s error: %d\n",
+                             is_fsync ? "fdatasync" : "write", cqe->res);
+                io_uring_queue_exit(&ring);
+                munmap(data, total_buffer_size);
+                close(file);
+                return 1;
+            }
+            if (is_fsync) {
+                syncs++;
+                submit_next(idx);
+            } else {
+                progress.add(cqe->res);
+                if (!slot_syncs[idx]) {
+                    submit_next(idx);
+                } else if (!linked) {
+                    // The fdatasync costs a round trip, unlike a linked one
+                    // which is already queued behind the write
+                    prep_fsync(&ring, file, idx);
+                }
+            }
+            processed++;
+        }
+        io_uring_cq_advance(&ring, processed);
+    }
+    // Everything is durable before the clock stops
+    ::fdatasync(file);
+    syncs++;
+
+    auto end = std::chrono::high_resolution_clock::now();
+    sampler.stop();
+    std::chrono::duration<double> elapsed = end - start;
+    size_t written = num_blocks * block_size;
+    double throughput = static_cast<double>(written) / elapsed.count() /
+                        (1024 * 1024); // MB/s
+    double iops = static_cast<double>(num_blocks) / elapsed.count();
+    Report report("file_write", "uring");
+    report.config("file", filename);
+    report.config("size", written);
+    report.config("block_size", block_size);
+    report.config("mode", mode);
+    report.config("seed", seed);
+    report.config("num_ops", num_blocks);
+    report.config("sync_every", sync_every);
+    report.config("num_tasks", num_tasks);
+    report.config("direct_io", direct_io);
+    report.config("fixed", fixed);
+    report.config("linked", linked);
+    report.config("sqpoll", sqpoll);
+    report.config("sq_size", sq_size);
+    report.config("ring_flags", flags);
+    report.config("interval_ms", interval_ms);
+    report.metric(
+        "time_ms",
+        std::chrono::duration_cast<std::chrono::milliseconds>(elapsed).count());
+    report.metric("throughput_mbps", throughput);
+    report.metric("iops", iops);
+    report.metric("syncs", syncs);
+    report.intervals(sampler.intervals());
+    report.print(json_output);
+
+    io_uring_queue_exit(&ring);
+    munmap(data, total_buffer_size);
+    close(file);
+    return 0;
+}
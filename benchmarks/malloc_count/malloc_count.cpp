@@ -0,0 +1,75 @@
+// Counts heap allocations when loaded with LD_PRELOAD. Benchmarks look the
+// counters up with dlsym, see benchmarks/common/memory.hpp, and report
+// nothing when the library is not loaded. Forwards to glibc's own entry
+// points so no dlsym(RTLD_NEXT) bootstrapping is needed.
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+
+extern "C" {
+void *__libc_malloc(size_t size);
+void *__libc_calloc(size_t count, size_t size);
+void *__libc_realloc(void *ptr, size_t size);
+void *__libc_memalign(size_t alignment, size_t size);
+void __libc_free(void *ptr);
+}
+
+static std::atomic<uint64_t> allocations{0};
+static std::atomic<uint64_t> allocated_bytes{0};
+
+static void count(size_t size) {
+    allocations.fetch_add(1, std::memory_order_relaxed);
+    allocated_bytes.fetch_add(size, std::memory_order_relaxed);
+}
+
+extern "C" {
+
+uint64_t malloc_count_allocations() {
+    return allocations.load(std::memory_order_relaxed);
+}
+
+uint64_t malloc_count_bytes() {
+    return allocated_bytes.load(std::memory_order_relaxed);
+}
+
+void *malloc(size_t size) {
+    count(size);
+    return __libc_malloc(size);
+}
+
+void *calloc(size_t num, size_t size) {
+    count(num * size);
+    return __libc_calloc(num, size);
+}
+
+// Growing or moving a block counts as a new allocation, freeing through
+// realloc does not
+void *realloc(void *ptr, size_t size) {
+    if (size > 0) {
+        count(size);
+    }
+    return __libc_realloc(ptr, size);
+}
+
+void *memalign(size_t alignment, size_t size) {
+    count(size);
+    return __libc_memalign(alignment, size);
+}
+
+void *aligned_alloc(size_t alignment, size_t size) {
+    count(size);
+    return __libc_memalign(alignment, size);
+}
+
+int posix_memalign(void **ptr, size_t alignment, size_t size) {
+    count(size);
+    void *result = __libc_memalign(alignment, size);
+    if (result == nullptr) {
+        return 12; // ENOMEM
+    }
+    *ptr = result;
+    return 0;
+}
+
+void free(void *ptr) { __libc_free(ptr); }
+}
@@ -1,7 +1,9 @@
+#include "report.hpp"
 #include <condy.hpp>
 #include <cstddef>
 
 static size_t num = 50'000'000;
+static bool json_output = false;
 
 condy::Coro<void> test() {
     for (size_t i = 0; i < num; i++) {
@@ -10,19 +12,23 @@ condy::Coro<void> test() {
 }
 
 void usage(const char *prog_name) {
-    std::printf("Usage: %s [-h] [-n num]\n"
+    std::printf("Usage: %s [-hj] [-n num]\n"
                 "  -h            Show this help message\n"
+                "  -j            Print metrics and config as JSON\n"
                 "  -n num        Set the number of operations to perform\n",
                 prog_name);
 }
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hn:")) != -1) {
+    while ((opt = getopt(argc, argv, "hjn:")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
         case 'n':
             num = std::stoul(optarg);
             break;
@@ -43,5 +49,9 @@ int main(int argc, char *argv[]) {
     auto duration =
         std::chrono::duration_cast<std::chrono::milliseconds>(end - start)
             .count();
-    std::printf("time_ms:%ld\n", duration);
+    Report report("post", "condy");
+    report.config("num", num);
+    report.config("runtime_options", "default");
+    report.metric("time_ms", duration);
+    report.print(json_output);
 }
\ No newline at end of file
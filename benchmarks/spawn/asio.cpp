@@ -1,12 +1,52 @@
+#include "memory.hpp"
+#include "report.hpp"
 #include "asio/use_awaitable.hpp"
 #include <asio.hpp>
+#include <asio/experimental/channel.hpp>
 
 static size_t num_tasks = 1'000'000;
+static bool keep_alive = false;
+static bool json_output = false;
+
+// With -a every task parks on the gate, like an idle connection. The last
+// one to park wakes the spawner through ready, which then closes the gate,
+// so peak RSS covers all of them suspended at once. The last one to finish
+// wakes the spawner again through done.
+using Gate = asio::experimental::channel<void(asio::error_code, int)>;
+static size_t parked = 0;
+static size_t finished = 0;
 
 asio::awaitable<void> task_func() { co_return; }
 
+asio::awaitable<void> parked_task_func(Gate *gate, Gate *ready, Gate *done) {
+    if (++parked == num_tasks) {
+        co_await ready->async_send(asio::error_code{}, 0);
+    }
+    co_await gate->async_receive(asio::as_tuple(asio::use_awaitable));
+    if (++finished == num_tasks) {
+        co_await done->async_send(asio::error_code{}, 0);
+    }
+}
+
 asio::awaitable<void> spawner() {
     auto ex = co_await asio::this_coro::executor;
+    if (keep_alive) {
+        // use_awaitable would not start a task until it is awaited, so the
+        // tasks are detached to let every one of them reach the gate
+        Gate gate(ex, 1);
+        Gate ready(ex, 1);
+        Gate done(ex, 1);
+        for (size_t i = 0; i < num_tasks; ++i) {
+            asio::co_spawn(ex, parked_task_func(&gate, &ready, &done),
+                           asio::detached);
+        }
+        if (num_tasks > 0) {
+            co_await ready.async_receive(asio::use_awaitable);
+            gate.close();
+            co_await done.async_receive(asio::use_awaitable);
+        }
+        co_return;
+    }
     std::vector<asio::awaitable<void>> tasks;
     for (size_t i = 0; i < num_tasks; ++i) {
         tasks.emplace_back(
@@ -18,22 +58,31 @@ asio::awaitable<void> spawner() {
 }
 
 void usage(const char *prog_name) {
-    std::printf("Usage: %s [-h] [-n num_tasks]\n"
+    std::printf("Usage: %s [-hja] [-n num_tasks]\n"
                 "  -h            Show this help message\n"
-                "  -n num_tasks  Set the number of tasks to spawn\n",
+                "  -j            Print metrics and config as JSON\n"
+                "  -n num_tasks  Set the number of tasks to spawn\n"
+                "  -a            Keep every task alive, suspended, until all\n"
+                "                are spawned\n",
                 prog_name);
 }
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hn:")) != -1) {
+    while ((opt = getopt(argc, argv, "hjan:")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
         case 'n':
             num_tasks = std::stoul(optarg);
             break;
+        case 'a':
+            keep_alive = true;
+            break;
         default:
             usage(argv[0]);
             return 1;
@@ -44,6 +93,9 @@ int main(int argc, char *argv[]) {
 
     asio::co_spawn(io_context, spawner(), asio::detached);
 
+    size_t rss_baseline_kb = current_rss_kb();
+    std::optional<uint64_t> allocations_start = malloc_count();
+
     auto start = std::chrono::high_resolution_clock::now();
 
     io_context.run();
@@ -52,7 +104,12 @@ int main(int argc, char *argv[]) {
     auto duration =
         std::chrono::duration_cast<std::chrono::milliseconds>(end - start)
             .count();
-    std::printf("time_ms:%ld\n", duration);
+    Report report("spawn", "asio");
+    report.config("num_tasks", num_tasks);
+    report.config("keep_alive", keep_alive);
+    report.metric("time_ms", duration);
+    add_memory_metrics(report, rss_baseline_kb, allocations_start);
+    report.print(json_output);
 
     return 0;
 }
\ No newline at end of file
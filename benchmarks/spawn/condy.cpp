@@ -1,13 +1,40 @@
+#include "memory.hpp"
+#include "report.hpp"
 #include <condy.hpp>
+#include <optional>
 
 static size_t num_tasks = 1'000'000;
+static bool keep_alive = false;
+static bool json_output = false;
 
-condy::Coro<void> task_func() { co_return; }
+// With -a every task parks on the gate, like an idle connection. The last
+// one to park wakes the spawner through ready, which then closes the gate,
+// so peak RSS covers all of them suspended at once.
+using Gate = condy::Channel<std::optional<int>>;
+static size_t parked = 0;
+
+condy::Coro<void> task_func(Gate *gate, Gate *ready) {
+    if (gate != nullptr) {
+        if (++parked == num_tasks) {
+            co_await ready->push(0);
+        }
+        co_await gate->pop();
+    }
+    co_return;
+}
 
 condy::Coro<void> spawner() {
+    Gate gate(1);
+    Gate ready(1);
     std::vector<condy::Task<void>> tasks;
     for (size_t i = 0; i < num_tasks; ++i) {
-        tasks.emplace_back(condy::co_spawn(task_func()));
+        tasks.emplace_back(condy::co_spawn(keep_alive
+                                               ? task_func(&gate, &ready)
+                                               : task_func(nullptr, nullptr)));
+    }
+    if (keep_alive && num_tasks > 0) {
+        co_await ready.pop();
+        gate.push_close();
     }
     for (auto &t : tasks) {
         co_await t;
@@ -15,22 +42,31 @@ condy::Coro<void> spawner() {
 }
 
 void usage(const char *prog_name) {
-    std::printf("Usage: %s [-h] [-n num_tasks]\n"
+    std::printf("Usage: %s [-hja] [-n num_tasks]\n"
                 "  -h            Show this help message\n"
-                "  -n num_tasks  Set the number of tasks to spawn\n",
+                "  -j            Print metrics and config as JSON\n"
+                "  -n num_tasks  Set the number of tasks to spawn\n"
+                "  -a            Keep every task alive, suspended, until all\n"
+                "                are spawned\n",
                 prog_name);
 }
 
 int main(int argc, char *argv[]) {
     int opt;
-    while ((opt = getopt(argc, argv, "hn:")) != -1) {
+    while ((opt = getopt(argc, argv, "hjan:")) != -1) {
         switch (opt) {
         case 'h':
             usage(argv[0]);
             return 0;
+        case 'j':
+            json_output = true;
+            break;
         case 'n':
             num_tasks = std::stoul(optarg);
             break;
+        case 'a':
+            keep_alive = true;
+            break;
         default:
             usage(argv[0]);
             return 1;
@@ -41,6 +77,9 @@ int main(int argc, char *argv[]) {
 
     condy::co_spawn(runtime, spawner()).detach();
 
+    size_t rss_baseline_kb = current_rss_kb();
+    std::optional<uint64_t> allocations_start = malloc_count();
+
     auto start = std::chrono::high_resolution_clock::now();
 
     runtime.allow_exit();
@@ -50,7 +89,13 @@ int main(int argc, char *argv[]) {
     auto duration =
         std::chrono::duration_cast<std::chrono::milliseconds>(end - start)
             .count();
-    std::printf("time_ms:%ld\n", duration);
+    Report report("spawn", "condy");
+    report.config("num_tasks", num_tasks);
+    report.config("keep_alive", keep_alive);
+    report.config("runtime_options", "default");
+    report.metric("time_ms", duration);
+    add_memory_metrics(report, rss_baseline_kb, allocations_start);
+    report.print(json_output);
 
     return 0;
 }
\ No newline at end of file
@@ -0,0 +1,11 @@
+#[path="/root/package/benchmarks_rust/src/access.rs"] mod access;
+use access::*;
+fn main(){
+  let specs=["uniform","zipf:0.99","zipf:0.5","hotspot:90:10","runs:16"];
+  let nbs=[1usize,7,1000,1<<21];
+  for s in specs { for nb in nbs {
+    let p: AccessPattern = s.parse().unwrap(); let o=p.offsets(nb,4096,nb*2+5,42);
+    let mut h:u64=0; let mut i=0; while i<o.len() && i<200000 { h=h.wrapping_mul(1000003)^(o.get(i) as u64); i+=1;}
+    println!("{} {} {}",s,nb,h);
+  }}
+}
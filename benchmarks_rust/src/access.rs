@@ -0,0 +1,292 @@
+//! Which blocks a random read benchmark reads, and in what order, mirrors
+//! benchmarks/common/access.hpp. Parsed from the `-a` option:
+//!
+//! - `uniform`: every block once in random order, reshuffled each pass
+//! - `zipf:THETA`: zipfian block popularity, 0 < THETA < 1
+//! - `hotspot:OPS:DATA`: OPS% of reads go to DATA% of the blocks
+//! - `runs:LEN`: runs of LEN sequential blocks from random starts
+//!
+//! Hot blocks are scattered over the file, not packed at its start. Offsets
+//! are computed from the read index on demand, bit for bit the same as the
+//! C++ ones, so a multi-terabyte device costs no memory.
+
+use std::fmt;
+use std::str::FromStr;
+
+#[derive(Clone, Copy, Debug, PartialEq)]
+pub enum AccessPattern {
+    Uniform,
+    Zipf { theta: f64 },
+    Hotspot { hot_ops: f64, hot_data: f64 },
+    Runs { length: usize },
+}
+
+impl FromStr for AccessPattern {
+    type Err = String;
+
+    fn from_str(spec: &str) -> Result<Self, String> {
+        let parts: Vec<&str> = spec.split(':').collect();
+        let number = |s: &str| {
+            s.parse::<f64>()
+                .map_err(|_| format!("invalid number in access pattern: {s}"))
+        };
+        match parts.as_slice() {
+            ["uniform"] => Ok(AccessPattern::Uniform),
+            ["zipf", theta] => {
+                let theta = number(theta)?;
+                if !(theta > 0.0 && theta < 1.0) {
+                    return Err("zipf theta must be in (0, 1)".into());
+                }
+                Ok(AccessPattern::Zipf { theta })
+            }
+            ["hotspot", ops, data] => {
+                let hot_ops = number(ops)? / 100.0;
+                let hot_data = number(data)? / 100.0;
+                if !((0.0..=1.0).contains(&hot_ops) && hot_data > 0.0 && hot_data <= 1.0) {
+                    return Err("hotspot percentages out of range".into());
+                }
+                Ok(AccessPattern::Hotspot { hot_ops, hot_data })
+            }
+            ["runs", length] => match length.parse::<usize>() {
+                Ok(length) if length > 0 => Ok(AccessPattern::Runs { length }),
+                _ => Err("run length must be a positive integer".into()),
+            },
+            _ => Err(format!("unknown access pattern: {spec}")),
+        }
+    }
+}
+
+impl fmt::Display for AccessPattern {
+    fn fmt(&self, f: &mut fmt::Formatter) -> fmt::Result {
+        match self {
+            AccessPattern::Uniform => write!(f, "uniform"),
+            AccessPattern::Zipf { theta } => write!(f, "zipf:{theta}"),
+            AccessPattern::Hotspot { hot_ops, hot_data } => {
+                write!(f, "hotspot:{}:{}", hot_ops * 100.0, hot_data * 100.0)
+            }
+            AccessPattern::Runs { length } => write!(f, "runs:{length}"),
+        }
+    }
+}
+
+/// Bijection on `[0, n)`: a 4-round Feistel network over the smallest even
+/// number of bits covering `n`, cycle walking values that land outside
+#[derive(Clone, Debug)]
+pub struct Permutation {
+    n: u64,
+    half_bits: u32,
+    half_mask: u64,
+    keys: [u64; Permutation::ROUNDS],
+}
+
+impl Permutation {
+    const ROUNDS: usize = 4;
+
+    pub fn new(n: u64, key: u64) -> Self {
+        let mut bits = 1;
+        while bits < 64 && (1u64 << bits) < n {
+            bits += 1;
+        }
+        let half_bits = (bits + 1) / 2;
+        let mut keys = [0; Self::ROUNDS];
+        for (r, k) in keys.iter_mut().enumerate() {
+            *k = Self::stream(key, r as u64);
+        }
+        Permutation {
+            n,
+            half_bits,
+            half_mask: (1u64 << half_bits) - 1,
+            keys,
+        }
+    }
+
+    pub fn apply(&self, mut x: u64) -> u64 {
+        // The domain is under 4n, so this walks fewer than 4 steps on average
+        loop {
+            x = self.encrypt(x);
+            if x < self.n {
+                return x;
+            }
+        }
+    }
+
+    /// splitmix64 finalizer
+    pub fn mix(mut z: u64) -> u64 {
+        z = (z ^ (z >> 30)).wrapping_mul(0xbf58476d1ce4e5b9);
+        z = (z ^ (z >> 27)).wrapping_mul(0x94d049bb133111eb);
+        z ^ (z >> 31)
+    }
+
+    /// Output `i` of the splitmix64 generator seeded with `key`
+    pub fn stream(key: u64, i: u64) -> u64 {
+        Self::mix(key.wrapping_add((i + 1).wrapping_mul(0x9e3779b97f4a7c15)))
+    }
+
+    fn encrypt(&self, x: u64) -> u64 {
+        let mut left = x >> self.half_bits;
+        let mut right = x & self.half_mask;
+        for key in self.keys {
+            let next = left ^ (Self::mix(right ^ key) & self.half_mask);
+            left = right;
+            right = next;
+        }
+        (left << self.half_bits) | right
+    }
+}
+
+/// Offset of every read, computed from its index on demand rather than
+/// stored. Draws for read `i` come from index `i` of a seeded stream, never
+/// from shared generator state.
+#[derive(Clone, Debug)]
+pub struct AccessOffsets {
+    pattern: AccessPattern,
+    num_blocks: usize,
+    block_size: usize,
+    num_ops: usize,
+    seed: u64,
+    draws: u64,
+    blocks: Permutation,
+    // Zipf
+    zetan: f64,
+    zeta2: f64,
+    alpha: f64,
+    eta: f64,
+    // Hotspot
+    hot: usize,
+    // Runs
+    run_length: usize,
+}
+
+impl AccessOffsets {
+    pub fn len(&self) -> usize {
+        self.num_ops
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.num_ops == 0
+    }
+
+    pub fn get(&self, i: usize) -> usize {
+        let n = self.num_blocks;
+        let block = match self.pattern {
+            AccessPattern::Zipf { .. } => {
+                let u = unit(Permutation::stream(self.draws, i as u64));
+                let uz = u * self.zetan;
+                let rank = if uz < 1.0 {
+                    0
+                } else if uz < self.zeta2 {
+                    1
+                } else {
+                    (n as f64 * (self.eta * u - self.eta + 1.0).powf(self.alpha)) as usize
+                };
+                self.blocks.apply(rank.min(n - 1) as u64) as usize
+            }
+            AccessPattern::Hotspot { hot_ops, .. } => {
+                let to_hot =
+                    self.hot == n || unit(Permutation::stream(self.draws, 2 * i as u64)) < hot_ops;
+                let draw = Permutation::stream(self.draws, 2 * i as u64 + 1);
+                let index = if to_hot {
+                    below(draw, self.hot)
+                } else {
+                    self.hot + below(draw, n - self.hot)
+                };
+                self.blocks.apply(index as u64) as usize
+            }
+            AccessPattern::Runs { .. } => {
+                let run = i / self.run_length;
+                let first = below(
+                    Permutation::stream(self.draws, run as u64),
+                    n - self.run_length + 1,
+                );
+                first + i % self.run_length
+            }
+            AccessPattern::Uniform => {
+                // Each pass over the file is a fresh permutation
+                let pass = i / n;
+                if pass == 0 {
+                    self.blocks.apply(i as u64) as usize
+                } else {
+                    Permutation::new(n as u64, self.seed.wrapping_add(pass as u64))
+                        .apply((i % n) as u64) as usize
+                }
+            }
+        };
+        block * self.block_size
+    }
+}
+
+/// Uniform in `[0, bound)` from a 64-bit draw
+fn below(draw: u64, bound: usize) -> usize {
+    ((draw as u128 * bound as u128) >> 64) as usize
+}
+
+fn unit(draw: u64) -> f64 {
+    (draw >> 11) as f64 * (1.0 / (1u64 << 53) as f64)
+}
+
+impl AccessPattern {
+    /// Offsets of `num_ops` reads; `num_ops == 0` reads as many blocks as the
+    /// file has, so uniform keeps reading every block exactly once
+    pub fn offsets(
+        &self,
+        num_blocks: usize,
+        block_size: usize,
+        num_ops: usize,
+        seed: u64,
+    ) -> AccessOffsets {
+        let mut offsets = AccessOffsets {
+            pattern: *self,
+            num_blocks,
+            block_size,
+            num_ops: match (num_blocks, num_ops) {
+                (0, _) => 0,
+                (n, 0) => n,
+                (_, ops) => ops,
+            },
+            seed,
+            draws: Permutation::mix(seed),
+            blocks: Permutation::new(num_blocks as u64, seed),
+            zetan: 0.0,
+            zeta2: 0.0,
+            alpha: 0.0,
+            eta: 0.0,
+            hot: 0,
+            run_length: 0,
+        };
+        if num_blocks == 0 {
+            return offsets;
+        }
+        match *self {
+            AccessPattern::Zipf { theta } => {
+                // Gray et al., "Quickly generating billion-record synthetic
+                // databases", as used by YCSB; rank 0 is the most popular
+                // block. Past 2^20 blocks the tail of zeta(n) is integrated
+                // instead of summed, so setup stays fast on whole devices.
+                let exact = num_blocks.min(1 << 20);
+                let mut zetan = 0.0;
+                for i in 1..=exact {
+                    zetan += 1.0 / (i as f64).powf(theta);
+                }
+                if num_blocks > exact {
+                    let a = exact as f64 + 0.5;
+                    let b = num_blocks as f64 + 0.5;
+                    zetan += (b.powf(1.0 - theta) - a.powf(1.0 - theta)) / (1.0 - theta);
+                }
+                offsets.zetan = zetan;
+                offsets.zeta2 = 1.0 + 1.0 / 2f64.powf(theta);
+                offsets.alpha = 1.0 / (1.0 - theta);
+                offsets.eta = (1.0 - (2.0 / num_blocks as f64).powf(1.0 - theta))
+                    / (1.0 - offsets.zeta2 / zetan);
+            }
+            AccessPattern::Hotspot { hot_data, .. } => {
+                offsets.hot =
+                    ((hot_data * num_blocks as f64).round() as usize).clamp(1, num_blocks);
+            }
+            AccessPattern::Runs { length } => {
+                offsets.run_length = length.min(num_blocks);
+            }
+            AccessPattern::Uniform => {}
+        }
+        offsets
+    }
+}
@@ -1,14 +1,17 @@
+use benchmarks_rust::{IntervalCounter, IntervalSampler, Report};
 use clap::Parser;
 use futures::SinkExt;
 use futures::StreamExt;
 use futures::channel::mpsc::{Receiver, Sender, channel};
 use monoio::spawn;
+use std::sync::Arc;
 use std::time::Instant;
 
 #[derive(Parser, Debug)]
 #[command(author, version, about)]
 struct Args {
-    /// Channel buffer size
+    /// Channel buffer size, 0 for the smallest the channel allows: futures
+    /// channels always keep one slot per sender, so it is not a rendezvous
     #[arg(short = 'b', long, default_value_t = 1024)]
     buffer_size: usize,
     /// Number of messages per producer
@@ -17,6 +20,15 @@ struct Args {
     /// Number of producer/consumer pairs
     #[arg(short = 'p', long, default_value_t = 1)]
     task_pair: usize,
+    /// Producers feeding each consumer
+    #[arg(short = 'P', long, default_value_t = 1)]
+    producers: usize,
+    /// Print metrics and config as JSON
+    #[arg(short = 'j', long, default_value_t = false)]
+    json: bool,
+    /// Sample progress every interval_ms milliseconds, 0 to disable
+    #[arg(short = 'i', long, default_value_t = 0)]
+    interval_ms: u64,
 }
 
 async fn producer(mut tx: Sender<Option<i32>>, num_messages: usize) {
@@ -26,22 +38,31 @@ async fn producer(mut tx: Sender<Option<i32>>, num_messages: usize) {
     let _ = tx.send(None).await;
 }
 
-async fn consumer(mut rx: Receiver<Option<i32>>) {
+/// Every producer ends with a None, the consumer stops after the last one
+async fn consumer(mut rx: Receiver<Option<i32>>, producers: usize, progress: Arc<IntervalCounter>) {
     let mut _count = 0;
+    let mut remaining = producers;
     while let Some(value) = rx.next().await {
         if value.is_none() {
-            break;
+            remaining -= 1;
+            if remaining == 0 {
+                break;
+            }
+            continue;
         }
         _count += 1;
+        progress.add(0);
     }
 }
 
-async fn run_all(args: &Args) {
-    let mut handles = Vec::with_capacity(args.task_pair * 2);
+async fn run_all(args: &Args, progress: &Arc<IntervalCounter>) {
+    let mut handles = Vec::with_capacity(args.task_pair * (args.producers + 1));
     for _ in 0..args.task_pair {
         let (tx, rx) = channel::<Option<i32>>(args.buffer_size);
-        handles.push(spawn(producer(tx, args.num_messages)));
-        handles.push(spawn(consumer(rx)));
+        for _ in 0..args.producers {
+            handles.push(spawn(producer(tx.clone(), args.num_messages)));
+        }
+        handles.push(spawn(consumer(rx, args.producers, progress.clone())));
     }
     for handle in handles {
         let _ = handle.await;
@@ -51,14 +72,29 @@ async fn run_all(args: &Args) {
 fn main() {
     let args = Args::parse();
 
+    let progress = Arc::new(IntervalCounter::default());
+    let sampler = IntervalSampler::start(args.interval_ms, !args.json, progress.clone());
     let start = Instant::now();
 
     monoio::RuntimeBuilder::<monoio::FusionDriver>::new()
         .enable_timer()
         .build()
         .unwrap()
-        .block_on(run_all(&args));
+        .block_on(run_all(&args, &progress));
 
     let duration = start.elapsed().as_millis();
-    println!("time_ms:{}", duration);
+    let elapsed = start.elapsed().as_secs_f64();
+    let total_messages = args.num_messages * args.producers * args.task_pair;
+    let intervals = sampler.stop();
+    let mut report = Report::new("channel", "monoio");
+    report.config("buffer_size", args.buffer_size);
+    report.config("num_messages", args.num_messages);
+    report.config("task_pair", args.task_pair);
+    report.config("producers", args.producers);
+    report.config("interval_ms", args.interval_ms);
+    report.metric("time_ms", duration);
+    report.metric("messages_per_s", total_messages as f64 / elapsed);
+    report.metric("ns_per_message", elapsed * 1e9 / total_messages as f64);
+    report.intervals(intervals);
+    report.print(args.json);
 }
@@ -1,11 +1,12 @@
+use benchmarks_rust::access::{AccessOffsets, AccessPattern};
+use benchmarks_rust::stripe::{stripe_file, stripe_offset};
+use benchmarks_rust::{IntervalCounter, IntervalSampler, Report};
 use clap::Parser;
 use monoio::fs::File;
 use monoio::spawn;
-use rand::SeedableRng;
-use rand::rngs::StdRng;
-use rand::seq::SliceRandom;
 use std::os::unix::fs::OpenOptionsExt;
 use std::rc::Rc;
+use std::sync::Arc;
 use std::sync::atomic::{AtomicUsize, Ordering};
 use std::time::Instant;
 
@@ -21,28 +22,45 @@ struct Args {
     /// Seed for random number generator
     #[arg(short = 's', long, default_value_t = 42)]
     seed: u64,
+    /// Number of reads, 0 for one per block
+    #[arg(short = 'n', long, default_value_t = 0)]
+    num_ops: usize,
+    /// uniform, zipf:THETA, hotspot:OPS:DATA (in percent) or runs:LEN
+    #[arg(short = 'a', long, default_value = "uniform")]
+    access: AccessPattern,
     /// Use direct I/O
     #[arg(short = 'd', long, default_value_t = false)]
     direct_io: bool,
-    /// File name
-    filename: String,
+    /// Print metrics and config as JSON
+    #[arg(short = 'j', long, default_value_t = false)]
+    json: bool,
+    /// Sample progress every interval_ms milliseconds, 0 to disable
+    #[arg(short = 'i', long, default_value_t = 0)]
+    interval_ms: u64,
+    /// File names, reads are striped across them block by block
+    #[arg(required = true)]
+    filenames: Vec<String>,
 }
 
 async fn do_reads(
     _id: usize,
-    file: Rc<File>,
+    files: Rc<Vec<File>>,
     block_size: usize,
     index: Rc<AtomicUsize>,
-    offsets: Rc<Vec<usize>>,
+    offsets: Rc<AccessOffsets>,
+    progress: Arc<IntervalCounter>,
 ) {
     loop {
         let current_index = index.fetch_add(1, Ordering::Relaxed);
         if current_index >= offsets.len() {
             break;
         }
-        let current_offset = offsets[current_index];
+        let offset = offsets.get(current_index);
+        let file = &files[stripe_file(offset, block_size, files.len())];
+        let current_offset = stripe_offset(offset, block_size, files.len());
         let buffer = Vec::with_capacity(block_size);
         let _ = file.read_at(buffer, current_offset as u64).await;
+        progress.add(block_size as u64);
     }
 }
 
@@ -55,32 +73,42 @@ async fn main() {
     if args.direct_io {
         open_opts.custom_flags(libc::O_DIRECT);
     }
-    let file = open_opts
-        .open(&args.filename)
-        .await
-        .expect("open file failed");
-
-    let file_size = file.metadata().await.unwrap().len() as usize;
-
-    let num_blocks = (file_size + args.block_size - 1) / args.block_size;
-    let mut offsets: Vec<usize> = (0..num_blocks).map(|i| i * args.block_size).collect();
+    let mut files = Vec::with_capacity(args.filenames.len());
+    let mut file_size = 0;
+    let mut blocks_per_file = usize::MAX;
+    for filename in &args.filenames {
+        let file = open_opts.open(filename).await.expect("open file failed");
+        let size = file.metadata().await.unwrap().len() as usize;
+        // The stripe is as deep as its shortest file
+        blocks_per_file = blocks_per_file.min(size.div_ceil(args.block_size));
+        file_size += size;
+        files.push(file);
+    }
 
-    let mut rng = StdRng::seed_from_u64(args.seed);
-    offsets.shuffle(&mut rng);
+    let num_blocks = blocks_per_file * files.len();
+    let offsets = args
+        .access
+        .offsets(num_blocks, args.block_size, args.num_ops, args.seed);
+    let num_reads = offsets.len();
 
-    let file = Rc::new(file);
+    let files = Rc::new(files);
     let offsets = Rc::new(offsets);
     let index = Rc::new(AtomicUsize::new(0));
 
+    let progress = Arc::new(IntervalCounter::default());
+    let sampler = IntervalSampler::start(args.interval_ms, !args.json, progress.clone());
     let start = Instant::now();
 
     let mut handles = Vec::with_capacity(args.num_tasks);
     for i in 0..args.num_tasks {
-        let file = file.clone();
+        let files = files.clone();
         let offsets = offsets.clone();
         let index = index.clone();
         let block_size = args.block_size;
-        handles.push(spawn(do_reads(i, file, block_size, index, offsets)));
+        let progress = progress.clone();
+        handles.push(spawn(do_reads(
+            i, files, block_size, index, offsets, progress,
+        )));
     }
 
     for handle in handles {
@@ -88,7 +116,21 @@ async fn main() {
     }
 
     let duration = start.elapsed().as_millis();
-    let iops = num_blocks as f64 / start.elapsed().as_secs_f64();
-    println!("time_ms:{}", duration);
-    println!("iops:{:.2}", iops);
+    let iops = num_reads as f64 / start.elapsed().as_secs_f64();
+    let intervals = sampler.stop();
+    let mut report = Report::new("file_random_read", "monoio");
+    report.config("file", args.filenames.join(","));
+    report.config("num_files", args.filenames.len());
+    report.config("file_size", file_size);
+    report.config("block_size", args.block_size);
+    report.config("seed", args.seed);
+    report.config("access", args.access.to_string());
+    report.config("num_ops", num_reads);
+    report.config("num_tasks", args.num_tasks);
+    report.config("direct_io", args.direct_io);
+    report.config("interval_ms", args.interval_ms);
+    report.metric("time_ms", duration);
+    report.metric("iops", iops);
+    report.intervals(intervals);
+    report.print(args.json);
 }
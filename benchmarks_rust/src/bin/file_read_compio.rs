@@ -1,8 +1,10 @@
+use benchmarks_rust::{IntervalCounter, IntervalSampler, Report};
 use clap::Parser;
 use compio::fs::File;
 use compio::io::AsyncReadAt;
 use compio::runtime::spawn;
 use std::rc::Rc;
+use std::sync::Arc;
 use std::sync::atomic::{AtomicUsize, Ordering};
 use std::time::Instant;
 
@@ -18,6 +20,12 @@ struct Args {
     /// Use direct I/O
     #[arg(short = 'd', long, default_value_t = false)]
     direct_io: bool,
+    /// Print metrics and config as JSON
+    #[arg(short = 'j', long, default_value_t = false)]
+    json: bool,
+    /// Sample progress every interval_ms milliseconds, 0 to disable
+    #[arg(short = 'i', long, default_value_t = 0)]
+    interval_ms: u64,
     /// File name
     filename: String,
 }
@@ -28,6 +36,7 @@ async fn do_reads(
     block_size: usize,
     offset: Rc<AtomicUsize>,
     file_size: usize,
+    progress: Arc<IntervalCounter>,
 ) {
     loop {
         let current_offset = offset.fetch_add(block_size, Ordering::Relaxed);
@@ -37,6 +46,7 @@ async fn do_reads(
         let to_read = std::cmp::min(block_size, file_size - current_offset);
         let buffer = Vec::with_capacity(to_read);
         let _ = file.read_at(buffer, current_offset as u64).await;
+        progress.add(to_read as u64);
     }
 }
 
@@ -59,6 +69,8 @@ async fn main() {
     let file = Rc::new(file);
     let offset = Rc::new(AtomicUsize::new(0));
 
+    let progress = Arc::new(IntervalCounter::default());
+    let sampler = IntervalSampler::start(args.interval_ms, !args.json, progress.clone());
     let start = Instant::now();
 
     let mut handles = Vec::with_capacity(args.num_tasks);
@@ -67,7 +79,10 @@ async fn main() {
         let offset = offset.clone();
         let block_size = args.block_size;
         let file_size = file_size;
-        handles.push(spawn(do_reads(i, file, block_size, offset, file_size)));
+        let progress = progress.clone();
+        handles.push(spawn(do_reads(
+            i, file, block_size, offset, file_size, progress,
+        )));
     }
 
     for handle in handles {
@@ -76,6 +91,16 @@ async fn main() {
 
     let duration = start.elapsed().as_millis();
     let throughput = file_size as f64 / (start.elapsed().as_secs_f64()) / (1024.0 * 1024.0);
-    println!("time_ms:{}", duration);
-    println!("throughput_mbps:{:.2}", throughput);
+    let intervals = sampler.stop();
+    let mut report = Report::new("file_read", "compio");
+    report.config("file", args.filename.as_str());
+    report.config("file_size", file_size);
+    report.config("block_size", args.block_size);
+    report.config("num_tasks", args.num_tasks);
+    report.config("direct_io", args.direct_io);
+    report.config("interval_ms", args.interval_ms);
+    report.metric("time_ms", duration);
+    report.metric("throughput_mbps", throughput);
+    report.intervals(intervals);
+    report.print(args.json);
 }
@@ -0,0 +1,156 @@
+use benchmarks_rust::write::{WriteMode, random_buffer, syncs_after};
+use benchmarks_rust::{IntervalCounter, IntervalSampler, Report};
+use clap::Parser;
+use monoio::fs::File;
+use monoio::spawn;
+use std::os::unix::fs::OpenOptionsExt;
+use std::rc::Rc;
+use std::sync::Arc;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::time::Instant;
+
+#[derive(Parser, Debug)]
+#[command(author, version, about)]
+struct Args {
+    /// Block size of each write operation in bytes
+    #[arg(short = 'b', long, default_value_t = 1024 * 1024)]
+    block_size: usize,
+    /// Number of concurrent tasks
+    #[arg(short = 't', long, default_value_t = 32)]
+    num_tasks: usize,
+    /// Bytes to write
+    #[arg(short = 'z', long, default_value_t = 1024 * 1024 * 1024)]
+    size: usize,
+    /// append (truncates the file) or random (overwrites an existing file)
+    #[arg(short = 'm', long, default_value = "append")]
+    mode: WriteMode,
+    /// fdatasync after every sync_every writes, 0 for only once at the end
+    #[arg(short = 'y', long, default_value_t = 0)]
+    sync_every: usize,
+    /// Seed for random number generator
+    #[arg(short = 's', long, default_value_t = 42)]
+    seed: u64,
+    /// Use direct I/O
+    #[arg(short = 'd', long, default_value_t = false)]
+    direct_io: bool,
+    /// Print metrics and config as JSON
+    #[arg(short = 'j', long, default_value_t = false)]
+    json: bool,
+    /// Sample progress every interval_ms milliseconds, 0 to disable
+    #[arg(short = 'i', long, default_value_t = 0)]
+    interval_ms: u64,
+    /// File name
+    filename: String,
+}
+
+async fn do_writes(
+    file: Rc<File>,
+    mut buffer: &'static [u8],
+    sync_every: usize,
+    index: Rc<AtomicUsize>,
+    offsets: Rc<Vec<usize>>,
+    syncs: Rc<AtomicUsize>,
+    progress: Arc<IntervalCounter>,
+) {
+    loop {
+        let current_index = index.fetch_add(1, Ordering::Relaxed);
+        if current_index >= offsets.len() {
+            break;
+        }
+        let current_offset = offsets[current_index];
+        let result = file.write_at(buffer, current_offset as u64).await;
+        buffer = result.1;
+        if syncs_after(current_index, sync_every) {
+            file.sync_data().await.expect("fdatasync failed");
+            syncs.fetch_add(1, Ordering::Relaxed);
+        }
+        progress.add(buffer.len() as u64);
+    }
+}
+
+#[monoio::main]
+async fn main() {
+    let args = Args::parse();
+
+    let mut open_opts = monoio::fs::OpenOptions::new();
+    open_opts.write(true);
+    if args.mode == WriteMode::Append {
+        open_opts.create(true).truncate(true);
+    }
+    if args.direct_io {
+        open_opts.custom_flags(libc::O_DIRECT);
+    }
+    let file = open_opts
+        .open(&args.filename)
+        .await
+        .expect("open file failed");
+
+    // Random overwrites need the extents allocated up front
+    let file_size = file.metadata().await.unwrap().len() as usize;
+    if args.mode == WriteMode::Random && file_size < args.size {
+        eprintln!("{} is smaller than {} bytes", args.filename, args.size);
+        std::process::exit(1);
+    }
+
+    let num_blocks = args.size / args.block_size;
+    let offsets = args.mode.offsets(num_blocks, args.block_size, args.seed);
+    let buffer = random_buffer(args.block_size * args.num_tasks, args.seed);
+
+    let file = Rc::new(file);
+    let offsets = Rc::new(offsets);
+    let index = Rc::new(AtomicUsize::new(0));
+    let syncs = Rc::new(AtomicUsize::new(0));
+
+    let progress = Arc::new(IntervalCounter::default());
+    let sampler = IntervalSampler::start(args.interval_ms, !args.json, progress.clone());
+    let start = Instant::now();
+
+    let mut handles = Vec::with_capacity(args.num_tasks);
+    for i in 0..args.num_tasks {
+        let file = file.clone();
+        let buffer = &buffer[i * args.block_size..(i + 1) * args.block_size];
+        let offsets = offsets.clone();
+        let index = index.clone();
+        let syncs = syncs.clone();
+        let progress = progress.clone();
+        handles.push(spawn(do_writes(
+            file,
+            buffer,
+            args.sync_every,
+            index,
+            offsets,
+            syncs,
+            progress,
+        )));
+    }
+
+    for handle in handles {
+        handle.await;
+    }
+    // Everything is durable before the clock stops
+    file.sync_data().await.expect("fdatasync failed");
+    let syncs = syncs.load(Ordering::Relaxed) + 1;
+
+    let duration = start.elapsed().as_millis();
+    let written = num_blocks * args.block_size;
+    let throughput = written as f64 / start.elapsed().as_secs_f64() / (1024.0 * 1024.0);
+    let iops = num_blocks as f64 / start.elapsed().as_secs_f64();
+    let intervals = sampler.stop();
+    let mut report = Report::new("file_write", "monoio");
+    report.config("file", args.filename.as_str());
+    report.config("size", written);
+    report.config("block_size", args.block_size);
+    report.config("mode", args.mode.to_string());
+    report.config("seed", args.seed);
+    report.config("num_ops", num_blocks);
+    report.config("sync_every", args.sync_every);
+    report.config("num_tasks", args.num_tasks);
+    report.config("direct_io", args.direct_io);
+    report.config("interval_ms", args.interval_ms);
+    report.metric("time_ms", duration);
+    report.metric("throughput_mbps", throughput);
+    report.metric("iops", iops);
+    report.metric("syncs", syncs);
+    report.intervals(intervals);
+    report.print(args.json);
+}
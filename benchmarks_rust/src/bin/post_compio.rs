@@ -1,3 +1,4 @@
+use benchmarks_rust::Report;
 use clap::Parser;
 use compio::runtime::Runtime;
 use futures_lite::future::yield_now;
@@ -9,6 +10,9 @@ struct Args {
     /// Number of operations to perform
     #[arg(short = 'n', long, default_value_t = 50_000_000)]
     num: usize,
+    /// Print metrics and config as JSON
+    #[arg(short = 'j', long, default_value_t = false)]
+    json: bool,
 }
 
 async fn test(num: usize) {
@@ -27,5 +31,8 @@ fn main() {
     runtime.block_on(test(args.num));
 
     let duration = start.elapsed().as_millis();
-    println!("time_ms:{}", duration);
+    let mut report = Report::new("post", "compio");
+    report.config("num", args.num);
+    report.metric("time_ms", duration);
+    report.print(args.json);
 }
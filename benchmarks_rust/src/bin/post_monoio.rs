@@ -1,3 +1,4 @@
+use benchmarks_rust::Report;
 use clap::Parser;
 use futures_lite::future::yield_now;
 use std::time::Instant;
@@ -8,6 +9,9 @@ struct Args {
     /// Number of operations to perform
     #[arg(short = 'n', long, default_value_t = 50_000_000)]
     num: usize,
+    /// Print metrics and config as JSON
+    #[arg(short = 'j', long, default_value_t = false)]
+    json: bool,
 }
 
 async fn test(num: usize) {
@@ -28,5 +32,8 @@ fn main() {
         .block_on(test(args.num));
 
     let duration = start.elapsed().as_millis();
-    println!("time_ms:{}", duration);
+    let mut report = Report::new("post", "monoio");
+    report.config("num", args.num);
+    report.metric("time_ms", duration);
+    report.print(args.json);
 }
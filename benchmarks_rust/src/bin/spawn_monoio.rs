@@ -1,5 +1,10 @@
+use benchmarks_rust::Report;
+use benchmarks_rust::gate::Gate;
+use benchmarks_rust::memory::{add_metrics, current_rss_kb, malloc_count};
 use clap::Parser;
 use monoio::spawn;
+use std::cell::Cell;
+use std::rc::Rc;
 use std::time::Instant;
 
 #[derive(Parser, Debug)]
@@ -8,14 +13,43 @@ struct Args {
     /// Number of tasks to spawn
     #[arg(short = 'n', long, default_value_t = 1_000_000)]
     num_tasks: usize,
+    /// Keep every task alive, suspended, until all are spawned
+    #[arg(short = 'a', long, default_value_t = false)]
+    keep_alive: bool,
+    /// Print metrics and config as JSON
+    #[arg(short = 'j', long, default_value_t = false)]
+    json: bool,
 }
 
-async fn task_func() {}
+/// With -a every task parks on the gate, like an idle connection. The last
+/// one to park opens ready for the spawner, which then opens the gate, so
+/// peak RSS covers all of them suspended at once.
+#[derive(Default)]
+struct Park {
+    gate: Gate,
+    ready: Gate,
+    parked: Cell<usize>,
+}
 
-async fn spawner(num_tasks: usize) {
+async fn task_func(park: Option<Rc<Park>>, num_tasks: usize) {
+    if let Some(park) = park {
+        park.parked.set(park.parked.get() + 1);
+        if park.parked.get() == num_tasks {
+            park.ready.open();
+        }
+        park.gate.wait().await;
+    }
+}
+
+async fn spawner(num_tasks: usize, keep_alive: bool) {
+    let park = keep_alive.then(|| Rc::new(Park::default()));
     let mut handles = Vec::with_capacity(num_tasks);
     for _ in 0..num_tasks {
-        handles.push(spawn(task_func()));
+        handles.push(spawn(task_func(park.clone(), num_tasks)));
+    }
+    if let Some(park) = park.filter(|_| num_tasks > 0) {
+        park.ready.wait().await;
+        park.gate.open();
     }
     for handle in handles {
         let _ = handle.await;
@@ -25,14 +59,23 @@ async fn spawner(num_tasks: usize) {
 fn main() {
     let args = Args::parse();
 
-    let start = Instant::now();
-
-    monoio::RuntimeBuilder::<monoio::FusionDriver>::new()
+    let mut runtime = monoio::RuntimeBuilder::<monoio::FusionDriver>::new()
         .enable_timer()
         .build()
-        .unwrap()
-        .block_on(spawner(args.num_tasks));
+        .unwrap();
+
+    // Taken once the runtime exists, so only the tasks' own cost remains
+    let rss_baseline_kb = current_rss_kb();
+    let allocations_start = malloc_count();
+    let start = Instant::now();
+
+    runtime.block_on(spawner(args.num_tasks, args.keep_alive));
 
     let duration = start.elapsed().as_millis();
-    println!("time_ms:{}", duration);
+    let mut report = Report::new("spawn", "monoio");
+    report.config("num_tasks", args.num_tasks);
+    report.config("keep_alive", args.keep_alive);
+    report.metric("time_ms", duration);
+    add_metrics(&mut report, rss_baseline_kb, allocations_start);
+    report.print(args.json);
 }
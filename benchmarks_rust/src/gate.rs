@@ -0,0 +1,43 @@
+//! A single-threaded gate that parks any number of tasks until opened, for
+//! runtimes without a broadcast primitive of their own. Each parked task
+//! costs one waker.
+
+use std::cell::{Cell, RefCell};
+use std::future::Future;
+use std::pin::Pin;
+use std::task::{Context, Poll, Waker};
+
+#[derive(Default)]
+pub struct Gate {
+    open: Cell<bool>,
+    waiters: RefCell<Vec<Waker>>,
+}
+
+impl Gate {
+    pub fn wait(&self) -> Wait<'_> {
+        Wait { gate: self }
+    }
+
+    pub fn open(&self) {
+        self.open.set(true);
+        for waker in self.waiters.take() {
+            waker.wake();
+        }
+    }
+}
+
+pub struct Wait<'a> {
+    gate: &'a Gate,
+}
+
+impl Future for Wait<'_> {
+    type Output = ();
+
+    fn poll(self: Pin<&mut Self>, cx: &mut Context<'_>) -> Poll<()> {
+        if self.gate.open.get() {
+            return Poll::Ready(());
+        }
+        self.gate.waiters.borrow_mut().push(cx.waker().clone());
+        Poll::Pending
+    }
+}
@@ -0,0 +1,344 @@
+//! Result reporting shared by every benchmark binary, mirrors
+//! benchmarks/common/report.hpp so both produce the same record.
+
+pub mod access;
+pub mod gate;
+pub mod memory;
+pub mod stripe;
+pub mod write;
+
+use std::ffi::CStr;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::sync::{Arc, Condvar, Mutex};
+use std::thread::JoinHandle;
+use std::time::{Duration, Instant, SystemTime, UNIX_EPOCH};
+
+/// Bump whenever fields are renamed or change meaning, scripts/record.py
+/// rejects versions it does not know
+pub const SCHEMA_VERSION: u32 = 1;
+
+#[derive(Clone)]
+pub enum Value {
+    Bool(bool),
+    Int(i128),
+    Float(f64),
+    Str(String),
+}
+
+macro_rules! int_value {
+    ($($t:ty),*) => {
+        $(impl From<$t> for Value {
+            fn from(v: $t) -> Self {
+                Value::Int(v as i128)
+            }
+        })*
+    };
+}
+
+int_value!(i32, i64, u32, u64, usize, u128);
+
+impl From<bool> for Value {
+    fn from(v: bool) -> Self {
+        Value::Bool(v)
+    }
+}
+
+impl From<f64> for Value {
+    fn from(v: f64) -> Self {
+        Value::Float(v)
+    }
+}
+
+impl From<&str> for Value {
+    fn from(v: &str) -> Self {
+        Value::Str(v.to_string())
+    }
+}
+
+impl From<String> for Value {
+    fn from(v: String) -> Self {
+        Value::Str(v)
+    }
+}
+
+impl Value {
+    fn to_json(&self) -> String {
+        match self {
+            Value::Bool(v) => v.to_string(),
+            Value::Int(v) => v.to_string(),
+            // Display prints the shortest representation that round-trips
+            Value::Float(v) if v.is_finite() => v.to_string(),
+            Value::Float(_) => "null".to_string(),
+            Value::Str(v) => quote(v),
+        }
+    }
+
+    fn to_text(&self) -> String {
+        match self {
+            Value::Float(v) => format!("{:.2}", v),
+            Value::Str(v) => v.clone(),
+            other => other.to_json(),
+        }
+    }
+}
+
+fn quote(s: &str) -> String {
+    let mut out = String::from("\"");
+    for c in s.chars() {
+        match c {
+            '"' => out.push_str("\\\""),
+            '\\' => out.push_str("\\\\"),
+            c if (c as u32) < 0x20 => out.push_str(&format!("\\u{:04x}", c as u32)),
+            c => out.push(c),
+        }
+    }
+    out.push('"');
+    out
+}
+
+fn object(fields: &[(String, Value)]) -> String {
+    let body: Vec<String> = fields
+        .iter()
+        .map(|(k, v)| format!("{}:{}", quote(k), v.to_json()))
+        .collect();
+    format!("{{{}}}", body.join(","))
+}
+
+fn array(values: impl IntoIterator<Item = Value>) -> String {
+    let body: Vec<String> = values.into_iter().map(|v| v.to_json()).collect();
+    format!("[{}]", body.join(","))
+}
+
+fn cpu_model() -> String {
+    std::fs::read_to_string("/proc/cpuinfo")
+        .ok()
+        .and_then(|info| {
+            info.lines()
+                .find(|line| line.starts_with("model name"))
+                .and_then(|line| line.split_once(':'))
+                .map(|(_, model)| model.trim().to_string())
+        })
+        .unwrap_or_else(|| "unknown".to_string())
+}
+
+fn environment() -> Vec<(String, Value)> {
+    let mut uts: libc::utsname = unsafe { std::mem::zeroed() };
+    unsafe { libc::uname(&mut uts) };
+    let field = |chars: &[libc::c_char]| {
+        unsafe { CStr::from_ptr(chars.as_ptr()) }
+            .to_string_lossy()
+            .into_owned()
+    };
+    let mut hostname = [0 as libc::c_char; 256];
+    unsafe { libc::gethostname(hostname.as_mut_ptr(), hostname.len() - 1) };
+    let online_cpus = unsafe { libc::sysconf(libc::_SC_NPROCESSORS_ONLN) };
+
+    vec![
+        ("hostname".to_string(), field(&hostname).into()),
+        ("kernel".to_string(), field(&uts.release).into()),
+        ("machine".to_string(), field(&uts.machine).into()),
+        ("cpu_model".to_string(), cpu_model().into()),
+        ("online_cpus".to_string(), (online_cpus as i64).into()),
+        ("compiler".to_string(), "rustc".into()),
+    ]
+}
+
+/// Work completed by one thread. Only the owning thread writes, so a relaxed
+/// load and store is enough and the hot path pays no locked instruction.
+#[derive(Default)]
+#[repr(align(64))]
+pub struct IntervalCounter {
+    ops: AtomicU64,
+    bytes: AtomicU64,
+}
+
+impl IntervalCounter {
+    pub fn add(&self, n: u64) {
+        self.ops
+            .store(self.ops.load(Ordering::Relaxed) + 1, Ordering::Relaxed);
+        self.bytes
+            .store(self.bytes.load(Ordering::Relaxed) + n, Ordering::Relaxed);
+    }
+}
+
+/// Cumulative progress sampled while a benchmark runs, one entry per sample
+#[derive(Default)]
+pub struct Intervals {
+    pub t_ms: Vec<f64>,
+    pub ops: Vec<u64>,
+    pub bytes: Vec<u64>,
+}
+
+impl Intervals {
+    fn sample(&mut self, counter: &IntervalCounter, start: Instant, live: bool) {
+        let t_ms = start.elapsed().as_secs_f64() * 1000.0;
+        let ops = counter.ops.load(Ordering::Relaxed);
+        let bytes = counter.bytes.load(Ordering::Relaxed);
+        if live {
+            let last_t_ms = self.t_ms.last().copied().unwrap_or(0.0);
+            let dt_s = (t_ms - last_t_ms) / 1000.0;
+            let d_ops = ops - self.ops.last().copied().unwrap_or(0);
+            let d_bytes = bytes - self.bytes.last().copied().unwrap_or(0);
+            eprintln!(
+                "interval:{:.0}ms ops/s:{:.0} MB/s:{:.2}",
+                t_ms,
+                d_ops as f64 / dt_s,
+                d_bytes as f64 / dt_s / (1024.0 * 1024.0)
+            );
+        }
+        self.t_ms.push(t_ms);
+        self.ops.push(ops);
+        self.bytes.push(bytes);
+    }
+}
+
+/// Snapshots a counter every `interval_ms` from a background thread, plus
+/// once more at `stop`, so the last interval is usually partial. With
+/// `interval_ms == 0` it does nothing and the record has no intervals.
+pub struct IntervalSampler {
+    counter: Arc<IntervalCounter>,
+    live: bool,
+    start: Instant,
+    stopping: Arc<(Mutex<bool>, Condvar)>,
+    thread: Option<JoinHandle<Intervals>>,
+}
+
+impl IntervalSampler {
+    pub fn start(interval_ms: u64, live: bool, counter: Arc<IntervalCounter>) -> Self {
+        let start = Instant::now();
+        let stopping = Arc::new((Mutex::new(false), Condvar::new()));
+        let thread = (interval_ms > 0).then(|| {
+            let counter = counter.clone();
+            let stopping = stopping.clone();
+            std::thread::spawn(move || {
+                let interval = Duration::from_millis(interval_ms);
+                let mut intervals = Intervals::default();
+                let mut next = start;
+                let (lock, cv) = &*stopping;
+                let mut stop = lock.lock().unwrap();
+                loop {
+                    // Wake on a fixed grid so a slow sample does not shift later ones
+                    next += interval;
+                    while !*stop && Instant::now() < next {
+                        let timeout = next.saturating_duration_since(Instant::now());
+                        stop = cv.wait_timeout(stop, timeout).unwrap().0;
+                    }
+                    if *stop {
+                        return intervals;
+                    }
+                    intervals.sample(&counter, start, live);
+                }
+            })
+        });
+        IntervalSampler {
+            counter,
+            live,
+            start,
+            stopping,
+            thread,
+        }
+    }
+
+    pub fn stop(mut self) -> Intervals {
+        let Some(thread) = self.thread.take() else {
+            return Intervals::default();
+        };
+        let (lock, cv) = &*self.stopping;
+        *lock.lock().unwrap() = true;
+        cv.notify_one();
+        let mut intervals = thread.join().unwrap();
+        intervals.sample(&self.counter, self.start, self.live);
+        intervals
+    }
+}
+
+/// Collects the metrics and effective configuration of one run. `print`
+/// writes the metrics as key:value lines, or everything as one JSON record.
+pub struct Report {
+    benchmark: String,
+    implementation: String,
+    config: Vec<(String, Value)>,
+    metrics: Vec<(String, Value)>,
+    intervals: Option<String>,
+}
+
+impl Report {
+    pub fn new(benchmark: &str, implementation: &str) -> Self {
+        Report {
+            benchmark: benchmark.to_string(),
+            implementation: implementation.to_string(),
+            config: Vec::new(),
+            metrics: Vec::new(),
+            intervals: None,
+        }
+    }
+
+    pub fn config(&mut self, key: &str, value: impl Into<Value>) {
+        self.config.push((key.to_string(), value.into()));
+    }
+
+    pub fn metric(&mut self, key: &str, value: impl Into<Value>) {
+        self.metrics.push((key.to_string(), value.into()));
+    }
+
+    /// Only written to the JSON record, as columns of equal length
+    pub fn intervals(&mut self, intervals: Intervals) {
+        if intervals.t_ms.is_empty() {
+            self.intervals = None;
+            return;
+        }
+        self.intervals = Some(format!(
+            "{{\"t_ms\":{},\"ops\":{},\"bytes\":{}}}",
+            array(intervals.t_ms.into_iter().map(Value::from)),
+            array(intervals.ops.into_iter().map(Value::from)),
+            array(intervals.bytes.into_iter().map(Value::from)),
+        ));
+    }
+
+    // Peak RSS is only meaningful from inside the process, the harness sees
+    // its own high-water mark folded in at fork and exec
+    fn with_max_rss(&self) -> Vec<(String, Value)> {
+        let mut metrics: Vec<(String, Value)> = self
+            .metrics
+            .iter()
+            .map(|(key, value)| (key.clone(), value.clone()))
+            .collect();
+        let mut usage: libc::rusage = unsafe { std::mem::zeroed() };
+        if unsafe { libc::getrusage(libc::RUSAGE_SELF, &mut usage) } == 0 {
+            metrics.push(("max_rss_kb".to_string(), (usage.ru_maxrss as i64).into()));
+        }
+        metrics
+    }
+
+    pub fn print(&self, json: bool) {
+        let metrics = self.with_max_rss();
+        if !json {
+            for (key, value) in &metrics {
+                println!("{}:{}", key, value.to_text());
+            }
+            return;
+        }
+
+        let timestamp = SystemTime::now()
+            .duration_since(UNIX_EPOCH)
+            .map(|d| d.as_secs())
+            .unwrap_or(0);
+        let intervals = self
+            .intervals
+            .as_ref()
+            .map(|intervals| format!(",\"intervals\":{}", intervals))
+            .unwrap_or_default();
+        println!(
+            "{{\"schema_version\":{},\"benchmark\":{},\"implementation\":{},\
+             \"timestamp\":{},\"config\":{},\"env\":{},\"metrics\":{}{}}}",
+            SCHEMA_VERSION,
+            quote(&self.benchmark),
+            quote(&self.implementation),
+            timestamp,
+            object(&self.config),
+            object(&environment()),
+            object(&metrics),
+            intervals,
+        );
+    }
+}
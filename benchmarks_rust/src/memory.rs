@@ -0,0 +1,41 @@
+//! Memory footprint of a run, mirrors benchmarks/common/memory.hpp
+
+use crate::Report;
+
+/// Resident set size right now, from /proc/self/statm
+pub fn current_rss_kb() -> u64 {
+    let statm = std::fs::read_to_string("/proc/self/statm").unwrap_or_default();
+    let resident: u64 = statm
+        .split_whitespace()
+        .nth(1)
+        .and_then(|field| field.parse().ok())
+        .unwrap_or(0);
+    resident * (unsafe { libc::sysconf(libc::_SC_PAGESIZE) } as u64 / 1024)
+}
+
+/// Highest resident set size of this process so far
+pub fn peak_rss_kb() -> u64 {
+    let mut usage: libc::rusage = unsafe { std::mem::zeroed() };
+    unsafe { libc::getrusage(libc::RUSAGE_SELF, &mut usage) };
+    usage.ru_maxrss as u64
+}
+
+/// Heap allocations so far, when the malloc_count library is preloaded
+pub fn malloc_count() -> Option<u64> {
+    let symbol = unsafe { libc::dlsym(libc::RTLD_DEFAULT, c"malloc_count_allocations".as_ptr()) };
+    if symbol.is_null() {
+        return None;
+    }
+    let allocations: extern "C" fn() -> u64 = unsafe { std::mem::transmute(symbol) };
+    Some(allocations())
+}
+
+/// Baseline and peak RSS, and the heap allocations since `allocations_start`
+/// when they are counted
+pub fn add_metrics(report: &mut Report, rss_baseline_kb: u64, allocations_start: Option<u64>) {
+    report.metric("rss_baseline_kb", rss_baseline_kb);
+    report.metric("peak_rss_kb", peak_rss_kb());
+    if let (Some(start), Some(end)) = (allocations_start, malloc_count()) {
+        report.metric("allocations", end - start);
+    }
+}
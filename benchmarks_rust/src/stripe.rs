@@ -0,0 +1,13 @@
+//! Reads striped across several files, mirrors benchmarks/common/stripe.hpp.
+//! Block b of the stripe lives in file b % num_files at block b / num_files,
+//! like RAID 0 with one block per chunk, so a single file reads as before.
+
+/// Which of `num_files` files a byte offset into the stripe falls in
+pub fn stripe_file(offset: usize, block_size: usize, num_files: usize) -> usize {
+    offset / block_size % num_files
+}
+
+/// Where in its file a byte offset into the stripe falls
+pub fn stripe_offset(offset: usize, block_size: usize, num_files: usize) -> usize {
+    offset / block_size / num_files * block_size + offset % block_size
+}
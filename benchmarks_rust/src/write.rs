@@ -0,0 +1,74 @@
+//! Where a write benchmark writes and when it syncs, mirrors
+//! benchmarks/common/write.hpp. Selected with the `-m` option:
+//!
+//! - `append`: blocks in file order into a truncated file, like a log
+//! - `random`: every block of an existing file overwritten once in random order
+
+use crate::access::AccessPattern;
+use rand::rngs::StdRng;
+use rand::{RngCore, SeedableRng};
+use std::fmt;
+use std::str::FromStr;
+
+#[derive(Clone, Copy, Debug, PartialEq)]
+pub enum WriteMode {
+    Append,
+    Random,
+}
+
+impl FromStr for WriteMode {
+    type Err = String;
+
+    fn from_str(mode: &str) -> Result<Self, String> {
+        match mode {
+            "append" => Ok(WriteMode::Append),
+            "random" => Ok(WriteMode::Random),
+            _ => Err(format!("unknown write mode: {mode}")),
+        }
+    }
+}
+
+impl fmt::Display for WriteMode {
+    fn fmt(&self, f: &mut fmt::Formatter) -> fmt::Result {
+        match self {
+            WriteMode::Append => write!(f, "append"),
+            WriteMode::Random => write!(f, "random"),
+        }
+    }
+}
+
+impl WriteMode {
+    pub fn offsets(&self, num_blocks: usize, block_size: usize, seed: u64) -> Vec<usize> {
+        match self {
+            WriteMode::Append => (0..num_blocks).map(|i| i * block_size).collect(),
+            WriteMode::Random => {
+                let shuffled = AccessPattern::Uniform.offsets(num_blocks, block_size, 0, seed);
+                (0..num_blocks).map(|i| shuffled.get(i)).collect()
+            }
+        }
+    }
+}
+
+/// An fdatasync follows every `sync_every`-th write, none if it is 0
+pub fn syncs_after(index: usize, sync_every: usize) -> bool {
+    sync_every > 0 && (index + 1) % sync_every == 0
+}
+
+/// Page aligned like the C++ benchmarks' buffers, O_DIRECT rejects unaligned
+/// ones. Filled with incompressible data and never freed.
+pub fn random_buffer(size: usize, seed: u64) -> &'static [u8] {
+    let data = unsafe {
+        libc::mmap(
+            std::ptr::null_mut(),
+            size,
+            libc::PROT_READ | libc::PROT_WRITE,
+            libc::MAP_PRIVATE | libc::MAP_ANONYMOUS,
+            -1,
+            0,
+        )
+    };
+    assert!(data != libc::MAP_FAILED, "mmap failed");
+    let buffer = unsafe { std::slice::from_raw_parts_mut(data as *mut u8, size) };
+    StdRng::seed_from_u64(seed).fill_bytes(buffer);
+    buffer
+}
@@ -1,14 +1,128 @@
-import channel
-import echo_server
-import file_random_read
-import file_read
-import post
-import spawn
+import argparse
+import importlib
+import sys
+from pathlib import Path
+import history
+import sampler
+import sweep
+
+# Run in this order; each is imported only when selected
+suites = [
+    "channel",
+    "echo_server",
+    "file_random_read",
+    "file_read",
+    "file_write",
+    "post",
+    "spawn",
+]
+
+
+def parse_param(text):
+    name, sep, value = text.partition("=")
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"expected name=value, got {text!r}")
+    return name, value
+
 
 if __name__ == "__main__":
-    channel.run()
-    echo_server.run()
-    file_random_read.run()
-    file_read.run()
-    post.run()
-    spawn.run()
+    parser = argparse.ArgumentParser(description="Run the benchmarks")
+    parser.add_argument(
+        "suites",
+        nargs="*",
+        metavar="suite",
+        help=f"Suites to run, all by default: {', '.join(suites)}",
+    )
+    parser.add_argument(
+        "-i",
+        "--implementation",
+        action="append",
+        default=[],
+        help="Only run implementations matching this glob, e.g. 'Condy*' "
+        "(repeatable)",
+    )
+    parser.add_argument(
+        "-w",
+        "--where",
+        action="append",
+        type=parse_param,
+        default=[],
+        metavar="NAME=VALUE",
+        help="Only run points whose parameter or axis NAME equals VALUE, "
+        "e.g. num_tasks=64 or direct_io=true (repeatable)",
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Print the command line of every selected point and exit",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Measure every selected point again instead of reusing results",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Run single-core benchmarks concurrently on disjoint physical cores",
+    )
+    parser.add_argument(
+        "--isolate-l3",
+        action="store_true",
+        help="With --parallel, give each concurrent run its own L3 cache domain",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="With --parallel, re-run every point serially and compare results",
+    )
+    parser.add_argument(
+        "--timeline-plots",
+        action="store_true",
+        help="Plot the sampled CPU, I/O and memory timeline of every trial",
+    )
+    parser.add_argument(
+        "--no-sampling",
+        action="store_true",
+        help="Do not sample /proc while benchmarks run",
+    )
+    parser.add_argument(
+        "--no-history",
+        action="store_true",
+        help="Do not append results to the history database",
+    )
+    parser.add_argument(
+        "--stripe-dir",
+        action="append",
+        type=Path,
+        default=[],
+        metavar="DIR",
+        help="Directory on its own device for the file_random_read device "
+        "count sweep, one per device (repeatable, default the current "
+        "directory)",
+    )
+    args = parser.parse_args()
+    # Checked here rather than with choices, which rejects an empty list
+    unknown = [name for name in args.suites if name not in suites]
+    if unknown:
+        parser.error(
+            f"unknown suite {', '.join(unknown)} (choose from {', '.join(suites)})"
+        )
+    sweep.only_implementations = args.implementation
+    sweep.only_params = dict(args.where)
+    sweep.dry_run = args.dry_run
+    sweep.use_cache = not args.no_cache
+    sweep.parallel = args.parallel
+    sweep.isolate_l3 = args.isolate_l3
+    sweep.validate = args.validate
+    sweep.timeline_plots = args.timeline_plots
+    sampler.enabled = not args.no_sampling
+    history.enabled = not args.no_history
+    if args.stripe_dir:
+        importlib.import_module("file_random_read").stripe_dirs = args.stripe_dir
+
+    for name in args.suites or suites:
+        importlib.import_module(name).run()
+    if sweep.validation_failed:
+        sys.exit(1)
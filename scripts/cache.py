@@ -0,0 +1,92 @@
+import functools
+import hashlib
+import json
+import os
+import platform
+from pathlib import Path
+from utils import cache_dir
+
+_binary_hashes = {}
+
+
+def cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", maxsplit=1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+@functools.cache
+def host_fingerprint():
+    return {
+        "hostname": platform.node(),
+        "kernel": platform.release(),
+        "machine": platform.machine(),
+        "cpu_model": cpu_model(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def binary_hash(program):
+    # Hashing a binary is cheap but not free, so memoize on path+mtime+size
+    path = Path(program).resolve()
+    st = path.stat()
+    memo_key = (path, st.st_mtime_ns, st.st_size)
+    if memo_key not in _binary_hashes:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _binary_hashes[memo_key] = h.hexdigest()
+    return _binary_hashes[memo_key]
+
+
+def point_key(spec, point, settings):
+    programs = [point["program"]] + list(spec.get("depends", []))
+    identity = {
+        "binaries": {Path(p).name: binary_hash(p) for p in programs},
+        "params": {k: str(v) for k, v in sorted(point["params"].items())},
+        "settings": settings,
+        "host": host_fingerprint(),
+    }
+    encoded = json.dumps(identity, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def entry_path(spec, key):
+    return cache_dir / spec["name"] / f"{key}.json"
+
+
+def load(spec, point, settings):
+    path = entry_path(spec, point_key(spec, point, settings))
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)["samples"]
+
+
+def store(spec, point, settings, samples):
+    key = point_key(spec, point, settings)
+    path = entry_path(spec, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entry = {
+        "key": key,
+        "benchmark": point["benchmark"],
+        "implementation": point["implementation"],
+        "program": Path(point["program"]).name,
+        "params": {k: str(v) for k, v in point["params"].items()},
+        "host": host_fingerprint(),
+        "settings": settings,
+        "samples": samples,
+    }
+    # Write-then-rename so an interrupt never leaves a truncated entry behind
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(entry, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
@@ -1,8 +1,9 @@
-import subprocess
-from matplotlib import pyplot as plt
+import record
+import rusage
+import steady
 from pathlib import Path
-from utils import process_output, benchmark_dir, benchmark_rust_dir, fig_dir, data_dir
-import pandas as pd
+from utils import benchmark_dir, benchmark_rust_dir, fig_dir, data_dir
+from sweep import implementation, execute, summarize, pivot, pivot_errors, save_trials
 
 channel_condy = benchmark_dir / "channel_condy"
 channel_asio = benchmark_dir / "channel_asio"
@@ -10,7 +11,15 @@ channel_compio = benchmark_rust_dir / "channel_compio"
 channel_monoio = benchmark_rust_dir / "channel_monoio"
 
 
-def run_channel(program, buffer_size, num_messages, task_pair):
+def channel_commands(
+    program,
+    buffer_size,
+    num_messages,
+    task_pair,
+    producers=1,
+    interval_ms=100,
+    cpus="0",
+):
     args = [
         "sudo",
         "nice",
@@ -18,184 +27,233 @@ def run_channel(program, buffer_size, num_messages, task_pair):
         "-20",
         "taskset",
         "-c",
-        "0",
+        cpus,
         str(program),
+        "-j",
+        "-i",
+        str(interval_ms),
         "-b",
         str(buffer_size),
         "-n",
         str(num_messages),
         "-p",
         str(task_pair),
+        "-P",
+        str(producers),
     ]
+    return [args]
+
+
+def run_channel(
+    program,
+    buffer_size,
+    num_messages,
+    task_pair,
+    producers=1,
+    interval_ms=100,
+    cpus="0",
+):
+    [args] = channel_commands(
+        program, buffer_size, num_messages, task_pair, producers, interval_ms, cpus
+    )
     print(args)
-    result = subprocess.run(args, capture_output=True, text=True)
-    return result.stdout
+    stdout, usage, timeline = rusage.run(args)
+    rec = record.parse(stdout)
+    rec["timeline"] = timeline
+    steady.add_metrics(rec)
+    # One operation per message passed through a channel
+    return rusage.add_cpu_metrics(rec, usage, num_messages * producers * task_pair)
 
 
-def draw_nm_plot(df_nm):
+def draw_time_plot(df, spec, axis, xlabel, name, metric="time_ms", ylabel="Time (ms)"):
     import numpy as np
+    from matplotlib import pyplot as plt
 
     markers = ["o", "s", "^", "d"]
-    labels = ["Condy", "Asio", "Compio", "Monoio"]
-    columns = ["condy_time_ms", "asio_time_ms", "compio_time_ms", "monoio_time_ms"]
+    wide = pivot(df, spec, axis, metric)
+    errors = pivot_errors(df, spec, axis, metric)
 
-    x = np.arange(len(df_nm))
-    for i, col in enumerate(columns):
-        plt.plot(
+    x = np.arange(len(wide))
+    for i, label in enumerate(wide.columns):
+        plt.errorbar(
             x,
-            df_nm[col],
-            marker=markers[i],
+            wide[label],
+            yerr=errors[label],
+            capsize=3,
+            marker=markers[i % len(markers)],
             linestyle="-",
-            label=labels[i],
+            label=label,
             markersize=8,
             markerfacecolor="none",
             markeredgewidth=2,
         )
 
-    plt.xlabel("Number of Messages")
-    plt.ylabel("Time (ms)")
-    plt.xticks(x, df_nm["num_messages"])
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.xticks(x, wide.index)
     plt.yscale("log")
     plt.legend()
     plt.grid(True, linestyle="--", alpha=0.5)
     plt.tight_layout()
     plt.savefig(
-        fig_dir / "channel_number_of_messages.png",
+        fig_dir / f"{name}.png",
         dpi=200,
         bbox_inches="tight",
     )
     plt.close()
 
 
-def draw_tp_plot(df_tp):
-    import numpy as np
+implementations = [
+    implementation("Condy", channel_condy),
+    implementation("Asio", channel_asio),
+    implementation("Compio", channel_compio),
+    implementation("Monoio", channel_monoio),
+]
 
-    markers = ["o", "s", "^", "d"]
-    labels = ["Condy", "Asio", "Compio", "Monoio"]
-    columns = ["condy_time_ms", "asio_time_ms", "compio_time_ms", "monoio_time_ms"]
 
-    x = np.arange(len(df_tp))
-    for i, col in enumerate(columns):
-        plt.plot(
-            x,
-            df_tp[col],
-            marker=markers[i],
-            linestyle="-",
-            label=labels[i],
-            markersize=8,
-            markerfacecolor="none",
-            markeredgewidth=2,
-        )
+def draw_fan_in_plot(df, spec, name):
+    # One panel per capacity, messages/s against producers per consumer
+    import numpy as np
+    from matplotlib import pyplot as plt
 
-    plt.xlabel("Number of Task Pairs")
-    plt.ylabel("Time (ms)")
-    plt.xticks(x, df_tp["task_pairs"])
-    plt.yscale("log")
-    plt.legend()
-    plt.grid(True, linestyle="--", alpha=0.5)
-    plt.tight_layout()
-    plt.savefig(
-        fig_dir / "channel_task_pairs.png",
-        dpi=200,
-        bbox_inches="tight",
+    markers = ["o", "s", "^", "d"]
+    sizes = [
+        size for size in spec["axes"]["buffer_size"] if size in set(df["buffer_size"])
+    ]
+    fig, axes = plt.subplots(
+        1, len(sizes), figsize=(4.5 * len(sizes), 4), sharey=True, squeeze=False
+    )
+    for ax, size in zip(axes.flat, sizes):
+        df_size = df[df["buffer_size"] == size]
+        wide = pivot(df_size, spec, "producers", "messages_per_s")
+        errors = pivot_errors(df_size, spec, "producers", "messages_per_s")
+        x = np.arange(len(wide))
+        for i, label in enumerate(wide.columns):
+            ax.errorbar(
+                x,
+                wide[label] / 1e6,
+                yerr=[e / 1e6 for e in errors[label]],
+                capsize=3,
+                marker=markers[i % len(markers)],
+                linestyle="-",
+                label=label,
+                markersize=6,
+                markerfacecolor="none",
+                markeredgewidth=2,
+            )
+        ax.set_title("Rendezvous" if size == 0 else f"Capacity {size}")
+        ax.set_xlabel("Producers per Consumer")
+        ax.set_xticks(x, wide.index)
+        ax.grid(True, linestyle="--", alpha=0.5)
+    axes.flat[0].set_ylabel("Million Messages/s")
+    axes.flat[0].legend(fontsize=7)
+    fig.tight_layout()
+    fig.savefig(fig_dir / f"{name}.png", dpi=200, bbox_inches="tight")
+    plt.close(fig)
+
+
+metrics = [
+    "time_ms",
+    "messages_per_s",
+    "ns_per_message",
+    "warmup_ms",
+    "steady_ops_per_s",
+] + rusage.metrics
+
+
+def num_messages_spec():
+    return {
+        "name": "channel",
+        "runner": run_channel,
+        "commands": channel_commands,
+        "cpus": 1,
+        "metrics": metrics,
+        "converge_on": ["time_ms"],
+        "params": {"buffer_size": 1024, "task_pair": 1},
+        "implementations": implementations,
+        "axes": {"num_messages": [131072, 262144, 524288, 1048576, 2097152]},
+    }
+
+
+def task_pairs_spec():
+    return {
+        "name": "channel",
+        "runner": run_channel,
+        "commands": channel_commands,
+        "cpus": 1,
+        "metrics": metrics,
+        "converge_on": ["time_ms"],
+        "params": {"buffer_size": 1024, "num_messages": 1048576},
+        "implementations": implementations,
+        "axes": {"task_pair": [1, 2, 4, 8, 16, 32]},
+    }
+
+
+def buffer_size_spec():
+    # 0 is a rendezvous channel, every send waits for its receive
+    spec = task_pairs_spec()
+    spec["params"] = {"num_messages": 1048576, "task_pair": 1}
+    spec["axes"] = {"buffer_size": [0, 1, 4, 16, 64, 256, 1024, 4096, 65536]}
+    return spec
+
+
+def fan_in_spec():
+    # Small bounded queues where producers contend for free slots
+    spec = task_pairs_spec()
+    spec["params"] = {"num_messages": 262144, "task_pair": 1}
+    spec["axes"] = {
+        "buffer_size": [0, 1, 16, 1024],
+        "producers": [1, 2, 4, 8, 16, 32],
+    }
+    return spec
+
+
+def run_sweep(spec, xlabel, name):
+    axis = next(iter(spec["axes"]))
+    trials = execute(spec)
+    if trials is None:
+        return
+    save_trials(trials, name)
+    df = summarize(trials, spec)
+    df.to_csv(data_dir / f"{name}.csv", index=False)
+    draw_time_plot(df, spec, axis, xlabel, name)
+
+
+def run_buffer_size():
+    spec = buffer_size_spec()
+    trials = execute(spec)
+    if trials is None:
+        return
+    save_trials(trials, "channel_buffer_size")
+    df = summarize(trials, spec)
+    df.to_csv(data_dir / "channel_buffer_size.csv", index=False)
+    draw_time_plot(
+        df,
+        spec,
+        "buffer_size",
+        "Channel Capacity",
+        "channel_buffer_size",
+        "ns_per_message",
+        "Time per Message (ns)",
     )
-    plt.close()
-
-
-def run():
-    default_buffer_size = 1024
-    default_num_messages = 1048576
-    default_task_pair = 1
-
-    num_messages = [131072, 262144, 524288, 1048576, 2097152]
-    task_pairs = [1, 2, 4, 8, 16, 32]
-
-    condy_nm_results = []
-    condy_tp_results = []
-
-    for nm in num_messages:
-        output = run_channel(channel_condy, default_buffer_size, nm, default_task_pair)
-        output = process_output(output)
-        condy_nm_results.append(float(output["time_ms"]))
-    for tp in task_pairs:
-        output = run_channel(
-            channel_condy, default_buffer_size, default_num_messages, tp
-        )
-        output = process_output(output)
-        condy_tp_results.append(float(output["time_ms"]))
-
-    asio_nm_results = []
-    asio_tp_results = []
-
-    for nm in num_messages:
-        output = run_channel(channel_asio, default_buffer_size, nm, default_task_pair)
-        output = process_output(output)
-        asio_nm_results.append(float(output["time_ms"]))
-
-    for tp in task_pairs:
-        output = run_channel(
-            channel_asio, default_buffer_size, default_num_messages, tp
-        )
-        output = process_output(output)
-        asio_tp_results.append(float(output["time_ms"]))
-
-    compio_nm_results = []
-    compio_tp_results = []
 
-    for nm in num_messages:
-        output = run_channel(channel_compio, default_buffer_size, nm, default_task_pair)
-        output = process_output(output)
-        compio_nm_results.append(float(output["time_ms"]))
 
-    for tp in task_pairs:
-        output = run_channel(
-            channel_compio, default_buffer_size, default_num_messages, tp
-        )
-        output = process_output(output)
-        compio_tp_results.append(float(output["time_ms"]))
+def run_fan_in():
+    spec = fan_in_spec()
+    trials = execute(spec)
+    if trials is None:
+        return
+    save_trials(trials, "channel_fan_in")
+    df = summarize(trials, spec)
+    df.to_csv(data_dir / "channel_fan_in.csv", index=False)
+    draw_fan_in_plot(df, spec, "channel_fan_in")
 
-    monoio_nm_results = []
-    monoio_tp_results = []
 
-    for nm in num_messages:
-        output = run_channel(channel_monoio, default_buffer_size, nm, default_task_pair)
-        output = process_output(output)
-        monoio_nm_results.append(float(output["time_ms"]))
-
-    for tp in task_pairs:
-        output = run_channel(
-            channel_monoio, default_buffer_size, default_num_messages, tp
-        )
-        output = process_output(output)
-        monoio_tp_results.append(float(output["time_ms"]))
-
-    num_messages = list(map(str, num_messages))
-    task_pairs = list(map(str, task_pairs))
-
-    df_nm = pd.DataFrame(
-        {
-            "num_messages": num_messages,
-            "condy_time_ms": condy_nm_results,
-            "asio_time_ms": asio_nm_results,
-            "compio_time_ms": compio_nm_results,
-            "monoio_time_ms": monoio_nm_results,
-        }
-    )
-    df_nm.to_csv(data_dir / "channel_number_of_messages.csv", index=False)
-
-    df_tp = pd.DataFrame(
-        {
-            "task_pairs": task_pairs,
-            "condy_time_ms": condy_tp_results,
-            "asio_time_ms": asio_tp_results,
-            "compio_time_ms": compio_tp_results,
-            "monoio_time_ms": monoio_tp_results,
-        }
-    )
-    df_tp.to_csv(data_dir / "channel_task_pairs.csv", index=False)
-
-    draw_nm_plot(df_nm)
-    draw_tp_plot(df_tp)
+def run():
+    run_sweep(num_messages_spec(), "Number of Messages", "channel_number_of_messages")
+    run_sweep(task_pairs_spec(), "Number of Task Pairs", "channel_task_pairs")
+    run_buffer_size()
+    run_fan_in()
 
 
 if __name__ == "__main__":
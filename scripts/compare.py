@@ -0,0 +1,183 @@
+import argparse
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import stats
+
+# Direction of improvement, matched on metric name; metrics matching neither,
+# such as cache_residency, are diagnostics and never compared
+higher_is_better = ["mbps", "per_sec", "per_s", "iops", "round_trips"]
+lower_is_better = [
+    "time_ms",
+    "warmup_ms",
+    "latency",
+    "cpu_user_s",
+    "cpu_sys_s",
+    "ctx_switches",
+    "max_rss_kb",
+    "peak_rss_kb",
+    "bytes_per_task",
+    "allocations_per_task",
+    "cpu_us_per_op",
+    "ns_per_",
+]
+
+
+def direction(metric):
+    if metric == "ops_per_cpu_s":
+        return 1
+    if any(pattern in metric for pattern in lower_is_better):
+        return -1
+    if any(pattern in metric for pattern in higher_is_better):
+        return 1
+    return 0
+
+
+def split_columns(trials):
+    # sweep.execute writes the point's keys, then the trial number, then
+    # metrics, outlier flags and provenance
+    columns = list(trials.columns)
+    keys = columns[: columns.index("trial")]
+    metrics = [
+        column
+        for column in columns[columns.index("trial") + 1 :]
+        if direction(column)
+        and not column.endswith("_outlier")
+        and "." not in column
+        and pd.api.types.is_numeric_dtype(trials[column])
+    ]
+    return keys, metrics
+
+
+def compare_samples(base, new, test, alpha):
+    base = base[~np.isnan(base)]
+    new = new[~np.isnan(new)]
+    if len(base) < 2 or len(new) < 2 or base.mean() == 0:
+        return None
+    low, high = stats.bootstrap_ratio(base, new)
+    p = stats.mann_whitney(base, new)
+    if test == "bootstrap":
+        significant = low > 0 or high < 0
+    else:
+        significant = p < alpha
+    return {
+        "base": base.mean(),
+        "new": new.mean(),
+        "delta": new.mean() / base.mean() - 1,
+        "ci_low": low,
+        "ci_high": high,
+        "p_value": p,
+        "significant": significant,
+    }
+
+
+def compare_trials(name, base, new, test, alpha):
+    keys, metrics = split_columns(base)
+    metrics = [metric for metric in metrics if metric in new]
+    axes = [
+        key for key in keys if key not in ("benchmark", "implementation", "program")
+    ]
+    new_groups = dict(list(new.groupby(keys, sort=False)))
+
+    rows = []
+    for values, base_group in base.groupby(keys, sort=False):
+        if values not in new_groups:
+            continue
+        point = dict(zip(keys, values))
+        for metric in metrics:
+            result = compare_samples(
+                base_group[metric].to_numpy(dtype=float),
+                new_groups[values][metric].to_numpy(dtype=float),
+                test,
+                alpha,
+            )
+            if result is None:
+                continue
+            sign = direction(metric) * np.sign(result["delta"])
+            rows.append(
+                {
+                    "file": name,
+                    "benchmark": point["benchmark"],
+                    "implementation": point["implementation"],
+                    "point": " ".join(f"{axis}={point[axis]}" for axis in axes),
+                    "metric": metric,
+                    **result,
+                    "verdict": "improvement" if sign > 0 else "regression",
+                }
+            )
+    return rows
+
+
+def compare(base_dir, new_dir, threshold=0.05, test="bootstrap", alpha=0.05):
+    rows = []
+    for base_path in sorted(Path(base_dir).glob("*_trials.csv")):
+        new_path = Path(new_dir) / base_path.name
+        if not new_path.exists():
+            print(f"skipping {base_path.name}: not in {new_dir}", file=sys.stderr)
+            continue
+        name = base_path.name.removesuffix("_trials.csv")
+        rows += compare_trials(
+            name, pd.read_csv(base_path), pd.read_csv(new_path), test, alpha
+        )
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    df["reported"] = df["significant"] & (df["delta"].abs() >= threshold)
+    return df
+
+
+def format_table(df):
+    table = df[
+        ["benchmark", "implementation", "point", "metric", "base", "new", "verdict"]
+    ].copy()
+    table["delta"] = df["delta"].map("{:+.1%}".format)
+    table["95% CI"] = [
+        f"[{low:+.1%}, {high:+.1%}]" for low, high in zip(df["ci_low"], df["ci_high"])
+    ]
+    table["p"] = df["p_value"].map("{:.3f}".format)
+    return table.to_string(index=False, float_format="{:.4g}".format)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare two results/data trees and flag significant changes"
+    )
+    parser.add_argument("base", help="Baseline data directory with *_trials.csv")
+    parser.add_argument("new", help="Data directory to check against the baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.05,
+        help="Smallest relative change of the mean to report (default 0.05)",
+    )
+    parser.add_argument(
+        "--test",
+        choices=["bootstrap", "mann-whitney"],
+        default="bootstrap",
+        help="Significance test: 95%% bootstrap CI of the change excluding 0, "
+        "or a two-sided Mann-Whitney U test at --alpha",
+    )
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--metric", action="append", help="Only compare these metrics")
+    parser.add_argument("--csv", type=Path, help="Also write every comparison here")
+    args = parser.parse_args()
+
+    df = compare(args.base, args.new, args.threshold, args.test, args.alpha)
+    if not df.empty and args.metric:
+        df = df[df["metric"].isin(args.metric)]
+    if args.csv is not None:
+        df.to_csv(args.csv, index=False)
+    if df.empty:
+        print("Nothing to compare")
+        sys.exit(0)
+
+    reported = df[df["reported"]]
+    for verdict in ["regression", "improvement"]:
+        rows = reported[reported["verdict"] == verdict]
+        print(f"{len(rows)} significant {verdict}s above {args.threshold:.0%}")
+        if not rows.empty:
+            print(format_table(rows))
+        print()
+    print(f"{len(df)} comparisons, {int(df['significant'].sum())} significant")
+    sys.exit(1 if (reported["verdict"] == "regression").any() else 0)
@@ -1,10 +1,13 @@
 import subprocess
 import time
-from matplotlib import pyplot as plt
 from pathlib import Path
 import os
-from utils import process_output, benchmark_dir, fig_dir, data_dir
-import pandas as pd
+from utils import benchmark_dir, fig_dir, data_dir
+import record
+import rusage
+import sampler
+import steady
+from sweep import implementation, execute, summarize, pivot, pivot_errors, save_trials
 
 echo_server_condy = benchmark_dir / "echo_server_condy"
 echo_server_asio = benchmark_dir / "echo_server_asio"
@@ -12,14 +15,30 @@ echo_server_epoll = benchmark_dir / "echo_server_epoll"
 
 echo_stress = benchmark_dir / "echo_stress"
 
+# Busiest client worker above this CPU utilization means the load generator,
+# not the server, limits the result
+client_saturation = 0.9
+
 next_port = 12345
 
 
-def run_echo_server(program, message_size, num_connections, duration, fixed_fd=False):
-    global next_port
-    port = next_port
-    next_port += 1
+def echo_server_commands(
+    program,
+    message_size,
+    num_connections,
+    duration,
+    fixed_fd=False,
+    client_workers=0,
+    pipeline_depth=1,
+    server_workers=1,
+    interval_ms=100,
+    port=None,
+):
+    if port is None:
+        port = next_port
 
+    # The server takes the first `server_workers` CPUs, the client the rest
+    server_cpus = ",".join(str(i) for i in range(server_workers))
     args_server = [
         "sudo",
         "nice",
@@ -27,151 +46,347 @@ def run_echo_server(program, message_size, num_connections, duration, fixed_fd=F
         "-20",
         "taskset",
         "-c",
-        "0",
+        server_cpus,
         str(program),
-        "0.0.0.0",
-        str(port),
     ]
     if fixed_fd:
         args_server.append("-f")
+    if server_workers > 1:
+        args_server += ["-n", str(server_workers)]
+    args_server += ["0.0.0.0", str(port)]
+
+    cpu_count = os.cpu_count()
+    cpus = ",".join(str(i) for i in range(server_workers, cpu_count))
+    args_stress = [
+        "taskset",
+        "-c",
+        cpus,
+        str(echo_stress),
+        "-j",
+        "-i",
+        str(interval_ms),
+        "-a",
+        "127.0.0.1",
+        "-p",
+        str(port),
+        "-l",
+        str(message_size),
+        "-c",
+        str(num_connections),
+        "-t",
+        str(duration),
+    ]
+    if client_workers > 0:
+        args_stress += ["-w", str(client_workers)]
+    if pipeline_depth > 1:
+        args_stress += ["-k", str(pipeline_depth)]
+    return [args_server, args_stress]
+
+
+def run_echo_server(
+    program,
+    message_size,
+    num_connections,
+    duration,
+    fixed_fd=False,
+    client_workers=0,
+    pipeline_depth=1,
+    server_workers=1,
+    interval_ms=100,
+):
+    global next_port
+    port = next_port
+    next_port += 1
+
+    args_server, args_stress = echo_server_commands(
+        program,
+        message_size,
+        num_connections,
+        duration,
+        fixed_fd,
+        client_workers,
+        pipeline_depth,
+        server_workers,
+        interval_ms,
+        port,
+    )
     print(args_server)
     proc = subprocess.Popen(args_server)
+    # The timeline follows the server, the client only reports at exit
+    sampling = sampler.start(proc.pid)
     time.sleep(0.5)  # Give the server time to start, this may fail but is simpler
     try:
-        cpu_count = os.cpu_count()
-        cpus = ",".join(str(i) for i in range(1, cpu_count))
-        args_stress = [
-            "taskset",
-            "-c",
-            cpus,
-            str(echo_stress),
-            "-a",
-            "127.0.0.1",
-            "-p",
-            str(port),
-            "-l",
-            str(message_size),
-            "-c",
-            str(num_connections),
-            "-t",
-            str(duration),
-        ]
         print(args_stress)
         result = subprocess.run(args_stress, capture_output=True, text=True)
         if result.returncode != 0:
             print("Error running echo_stress:")
             print(result.stderr)
             raise RuntimeError("echo_stress failed")
-        return result.stdout
+        # The record comes from the client, note which server it measured
+        rec = record.parse(result.stdout)
+        rec["config"].update(
+            server=Path(program).name,
+            server_workers=server_workers,
+            fixed_fd=fixed_fd,
+        )
     finally:
-        proc.terminate()
-        proc.wait()
+        timeline = sampler.stop(sampling)
+        server_rss_kb = rusage.peak_rss_kb(proc.pid)
+        server_usage = rusage.terminate(proc)
+    # Costs are the server's, not the client's that wrote the record; one
+    # operation per round trip
+    rusage.add_cpu_metrics(rec, server_usage, rec["metrics"]["round_trips"])
+    rec["metrics"]["max_rss_kb"] = server_rss_kb
+    rec["timeline"] = timeline
+    # Steady state of the client's round trips
+    return steady.add_metrics(rec)
 
 
-def draw_conn_plot(df_conn):
+def draw_throughput_plot(df, spec, axis, xlabel, name):
     import numpy as np
+    from matplotlib import pyplot as plt
 
     markers = ["o", "s", "^", "D"]
-    labels = ["Condy", "Condy Fixed Fd", "Asio", "Epoll"]
-    columns = ["condy_mbps", "condy_fixed_fd_mbps", "asio_mbps", "epoll_mbps"]
+    wide = pivot(df, spec, axis, "mbps")
+    errors = pivot_errors(df, spec, axis, "mbps")
 
-    x = np.arange(len(df_conn))
-    for i, col in enumerate(columns):
-        plt.plot(
+    x = np.arange(len(wide))
+    for i, label in enumerate(wide.columns):
+        plt.errorbar(
             x,
-            df_conn[col],
-            marker=markers[i],
+            wide[label],
+            yerr=errors[label],
+            capsize=3,
+            marker=markers[i % len(markers)],
             linestyle="-",
-            label=labels[i],
+            label=label,
             markersize=8,
             markerfacecolor="none",
             markeredgewidth=2,
         )
 
-    plt.xlabel("Number of Connections")
+    plt.xlabel(xlabel)
     plt.ylabel("Throughput (MB/s)")
-    plt.xticks(x, df_conn["num_connections"])
+    plt.xticks(x, wide.index)
     plt.legend()
     plt.grid(True, linestyle="--", alpha=0.5)
     plt.tight_layout()
     plt.savefig(
-        fig_dir / "echo_server_num_connections.png",
+        fig_dir / f"{name}.png",
         dpi=200,
         bbox_inches="tight",
     )
     plt.close()
 
 
-def run():
-    default_message_size = 1024  # 1 KB
-    default_duration = 10  # seconds
-
-    num_connections = [4, 8, 16, 32, 64]
-
-    condy_conn_results = []
-    for conn in num_connections:
-        output = run_echo_server(
-            echo_server_condy,
-            message_size=default_message_size,
-            num_connections=conn,
-            duration=default_duration,
-        )
-        output = process_output(output)
-        condy_conn_results.append(float(output["resp_bytes_per_sec"]))
-
-    condy_fixed_conn_results = []
-    for conn in num_connections:
-        output = run_echo_server(
-            echo_server_condy,
-            message_size=default_message_size,
-            num_connections=conn,
-            duration=default_duration,
-            fixed_fd=True,
-        )
-        output = process_output(output)
-        condy_fixed_conn_results.append(float(output["resp_bytes_per_sec"]))
-
-    asio_conn_results = []
-    for conn in num_connections:
-        output = run_echo_server(
-            echo_server_asio,
-            message_size=default_message_size,
-            num_connections=conn,
-            duration=default_duration,
+def draw_latency_plot(df, spec, axis, xlabel, name):
+    import numpy as np
+    from matplotlib import pyplot as plt
+
+    markers = ["o", "s", "^", "D"]
+    percentiles = [
+        ("latency_p50_us", "p50"),
+        ("latency_p90_us", "p90"),
+        ("latency_p99_us", "p99"),
+        ("latency_p999_us", "p99.9"),
+    ]
+
+    fig, axes = plt.subplots(2, 2, figsize=(12, 9), sharex=True)
+    for ax, (metric, title) in zip(axes.flat, percentiles):
+        wide = pivot(df, spec, axis, metric)
+        errors = pivot_errors(df, spec, axis, metric)
+        x = np.arange(len(wide))
+        for i, label in enumerate(wide.columns):
+            ax.errorbar(
+                x,
+                wide[label],
+                yerr=errors[label],
+                capsize=3,
+                marker=markers[i % len(markers)],
+                linestyle="-",
+                label=label,
+                markersize=8,
+                markerfacecolor="none",
+                markeredgewidth=2,
+            )
+        ax.set_title(f"{title} Latency")
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel("Latency (µs)")
+        ax.set_xticks(x, wide.index)
+        ax.set_yscale("log")
+        ax.grid(True, linestyle="--", alpha=0.5)
+    axes.flat[0].legend()
+    fig.tight_layout()
+    fig.savefig(
+        fig_dir / f"{name}_latency.png",
+        dpi=200,
+        bbox_inches="tight",
+    )
+    plt.close(fig)
+
+
+def draw_scaling_plot(df, spec, name):
+    import numpy as np
+    from matplotlib import pyplot as plt
+
+    markers = ["o", "s", "^", "D"]
+    per_core = pivot(df, spec, "server_workers", "mbps_per_core")
+    errors = pivot_errors(df, spec, "server_workers", "mbps_per_core")
+    # Efficiency relative to the same implementation on a single core
+    efficiency = per_core / per_core.iloc[0]
+
+    x = np.arange(len(per_core))
+    fig, (ax_core, ax_eff) = plt.subplots(1, 2, figsize=(12, 5))
+    for i, label in enumerate(per_core.columns):
+        style = dict(
+            marker=markers[i % len(markers)],
+            linestyle="-",
+            label=label,
+            markersize=8,
+            markerfacecolor="none",
+            markeredgewidth=2,
         )
-        output = process_output(output)
-        asio_conn_results.append(float(output["resp_bytes_per_sec"]))
-
-    epoll_conn_results = []
-    for conn in num_connections:
-        output = run_echo_server(
-            echo_server_epoll,
-            message_size=default_message_size,
-            num_connections=conn,
-            duration=default_duration,
+        ax_core.errorbar(x, per_core[label], yerr=errors[label], capsize=3, **style)
+        ax_eff.plot(x, efficiency[label], **style)
+    ax_eff.axhline(1.0, color="gray", linestyle=":", label="Linear")
+
+    ax_core.set_ylabel("Throughput per Core (MB/s)")
+    ax_eff.set_ylabel("Scaling Efficiency")
+    for ax in (ax_core, ax_eff):
+        ax.set_xlabel("Server Workers (Cores)")
+        ax.set_xticks(x, per_core.index)
+        ax.grid(True, linestyle="--", alpha=0.5)
+        ax.legend()
+    fig.tight_layout()
+    fig.savefig(
+        fig_dir / f"{name}_scaling.png",
+        dpi=200,
+        bbox_inches="tight",
+    )
+    plt.close(fig)
+
+
+def base_spec():
+    return {
+        "name": "echo_server",
+        "runner": run_echo_server,
+        "commands": echo_server_commands,
+        "depends": [echo_stress],
+        "resource": lambda params: "loopback",
+        "metrics": [
+            "req_bytes_per_sec",
+            "resp_bytes_per_sec",
+            "round_trips",
+            "latency_p50_us",
+            "latency_p90_us",
+            "latency_p99_us",
+            "latency_p999_us",
+            "latency_max_us",
+            "client_cpu_util",
+        ]
+        + steady.metrics
+        + rusage.metrics,
+        # Tail percentiles are too noisy to drive adaptive stopping
+        "converge_on": ["resp_bytes_per_sec"],
+        "implementations": [
+            implementation("Condy", echo_server_condy),
+            implementation("Condy Fixed Fd", echo_server_condy, fixed_fd=True),
+            implementation("Asio", echo_server_asio),
+            implementation("Epoll", echo_server_epoll),
+        ],
+    }
+
+
+def base_params():
+    return {
+        "message_size": 1024,  # 1 KB
+        "num_connections": 16,
+        "pipeline_depth": 1,
+        "server_workers": 1,
+        "duration": 10,  # seconds
+        # A few pinned epoll workers drive all connections on the client
+        "client_workers": min(4, max(1, os.cpu_count() - 1)),
+    }
+
+
+def sweep_spec(axis, values, **params):
+    spec = base_spec()
+    spec["params"] = {k: v for k, v in base_params().items() if k != axis}
+    spec["params"].update(params)
+    spec["axes"] = {axis: values}
+    return spec
+
+
+def server_workers_values():
+    # Powers of two up to half the machine, the other half drives the load
+    limit = max(1, os.cpu_count() // 2)
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    return values
+
+
+def report_client_saturation(df, axis):
+    saturated = df[df["client_cpu_util"] > client_saturation]
+    for _, row in saturated.iterrows():
+        print(
+            f"WARNING: client saturated ({row['client_cpu_util']:.0%} CPU) for "
+            f"{row['implementation']} at {axis}={row[axis]}"
         )
-        output = process_output(output)
-        epoll_conn_results.append(float(output["resp_bytes_per_sec"]))
-
-    def bps_to_mbps(bps):
-        return bps / (1024 * 1024)
-
-    condy_conn_results = list(map(bps_to_mbps, condy_conn_results))
-    condy_fixed_conn_results = list(map(bps_to_mbps, condy_fixed_conn_results))
-    asio_conn_results = list(map(bps_to_mbps, asio_conn_results))
-    epoll_conn_results = list(map(bps_to_mbps, epoll_conn_results))
-
-    df_conn = pd.DataFrame(
-        {
-            "num_connections": num_connections,
-            "condy_mbps": condy_conn_results,
-            "condy_fixed_fd_mbps": condy_fixed_conn_results,
-            "asio_mbps": asio_conn_results,
-            "epoll_mbps": epoll_conn_results,
-        }
+
+
+def run_sweep(spec, xlabel, name):
+    axis = next(iter(spec["axes"]))
+    trials = execute(spec)
+    if trials is None:
+        return
+    trials["mbps"] = trials["resp_bytes_per_sec"] / (1024 * 1024)
+    metrics = spec["metrics"] + ["mbps"]
+    if axis == "server_workers":
+        trials["mbps_per_core"] = trials["mbps"] / trials["server_workers"]
+        metrics.append("mbps_per_core")
+    save_trials(trials, name)
+    df = summarize(trials, spec, metrics=metrics)
+    df.to_csv(data_dir / f"{name}.csv", index=False)
+    report_client_saturation(df, axis)
+    draw_throughput_plot(df, spec, axis, xlabel, name)
+    draw_latency_plot(df, spec, axis, xlabel, name)
+    if axis == "server_workers":
+        draw_scaling_plot(df, spec, name)
+
+
+def run():
+    run_sweep(
+        sweep_spec("num_connections", [4, 8, 16, 32, 64, 256, 1024, 4096, 10240]),
+        "Number of Connections",
+        "echo_server_num_connections",
+    )
+    # 64 B to 1 MB, from small-message syscall overhead to bulk transfer
+    run_sweep(
+        sweep_spec(
+            "message_size", [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576]
+        ),
+        "Message Size (Bytes)",
+        "echo_server_message_size",
+    )
+    run_sweep(
+        sweep_spec("pipeline_depth", [1, 2, 4, 8, 16, 32], message_size=64),
+        "Pipelining Depth (Messages in Flight per Connection)",
+        "echo_server_pipeline_depth",
+    )
+    # One reactor per core with SO_REUSEPORT, enough connections and client
+    # workers to keep every server core busy
+    workers = server_workers_values()
+    run_sweep(
+        sweep_spec(
+            "server_workers",
+            workers,
+            num_connections=256,
+            client_workers=max(1, os.cpu_count() - workers[-1]),
+        ),
+        "Server Workers (Cores)",
+        "echo_server_server_workers",
     )
-    df_conn.to_csv(data_dir / "echo_server_num_connections.csv", index=False)
-    draw_conn_plot(df_conn)
 
 
 if __name__ == "__main__":
@@ -1,17 +1,21 @@
-import subprocess
+import os
 import time
-from matplotlib import pyplot as plt
 from pathlib import Path
 from utils import (
-    process_output,
-    generate_test_file,
     benchmark_dir,
     benchmark_rust_dir,
     fig_dir,
     data_dir,
 )
-import pandas as pd
-
+import scheduler
+import heatmap
+import pagecache
+import record
+import rusage
+import steady
+import sweep
+import testfile
+from sweep import implementation, execute, summarize, pivot, pivot_errors, save_trials
 
 file_random_read_condy = benchmark_dir / "file_random_read_condy"
 file_random_read_sync = benchmark_dir / "file_random_read_sync"
@@ -20,8 +24,18 @@ file_random_read_uring = benchmark_dir / "file_random_read_uring"
 file_random_read_compio = benchmark_rust_dir / "file_random_read_compio"
 file_random_read_monoio = benchmark_rust_dir / "file_random_read_monoio"
 
+# One directory per device for the device count sweep, set from all.py
+stripe_dirs = [Path(".")]
+device_counts = [1, 2, 4, 8]
 
-def run_file_random_read(
+
+def stripe_files(file, num_files=None):
+    # A list of files is striped across, the first num_files of it
+    files = list(file) if isinstance(file, (list, tuple)) else [file]
+    return files[:num_files]
+
+
+def file_random_read_commands(
     program,
     file,
     block_size,
@@ -29,12 +43,15 @@ def run_file_random_read(
     direct_io=False,
     fixed=False,
     iopoll=False,
+    sqpoll=False,
+    num_ops=0,
+    access="uniform",
+    num_files=None,
+    per_file_threads=False,
+    interval_ms=100,
+    cpus="0,2",
 ):
-    # We need to clean vm cache between runs to get accurate results
-    subprocess.run(
-        ["sudo", "sh", "-c", "echo 3 > /proc/sys/vm/drop_caches"], check=True
-    )
-
+    files = stripe_files(file, num_files)
     args = [
         "sudo",
         "nice",
@@ -42,57 +59,106 @@ def run_file_random_read(
         "-20",
         "taskset",
         "-c",
-        "0,2",
+        cpus,
         str(program),
-        str(file),
+        "-j",
+        "-i",
+        str(interval_ms),
+        *[str(path) for path in files],
         "-b",
         str(block_size),
     ]
     if num_tasks is not None:
-        args += ["-t", str(num_tasks)]
+        # Queue depth per file: one ring per file gets it whole, a single
+        # ring striping across the files gets it once per file
+        depth = num_tasks if per_file_threads else num_tasks * len(files)
+        args += ["-t", str(depth)]
     if direct_io:
         args.append("-d")
     if fixed:
         args.append("-f")
     if iopoll:
         args.append("-p")
+    if sqpoll:
+        args.append("-q")
+    if num_ops:
+        args += ["-n", str(num_ops)]
+    if access != "uniform":
+        args += ["-a", access]
+    if per_file_threads:
+        args.append("-T")
+    return [args]
+
+
+def run_file_random_read(
+    program,
+    file,
+    block_size,
+    num_tasks,
+    direct_io=False,
+    fixed=False,
+    iopoll=False,
+    sqpoll=False,
+    num_ops=0,
+    access="uniform",
+    num_files=None,
+    per_file_threads=False,
+    interval_ms=100,
+    cpus="0,2",
+):
+    files = stripe_files(file, num_files)
+    # Evict only the test files so every run starts from a cold cache
+    residency = max(pagecache.evict(path) for path in files)
+
+    [args] = file_random_read_commands(
+        program,
+        file,
+        block_size,
+        num_tasks,
+        direct_io,
+        fixed,
+        iopoll,
+        sqpoll,
+        num_ops,
+        access,
+        num_files,
+        per_file_threads,
+        interval_ms,
+        cpus,
+    )
     print(args)
-    result = subprocess.run(args, capture_output=True, text=True, check=True)
-    return result.stdout
+    # Only the first file's device is sampled
+    stdout, usage, timeline = rusage.run(args, disk=files[0])
+    rec = record.parse(stdout)
+    rec["timeline"] = timeline
+    steady.add_metrics(rec)
+    rec["metrics"]["cache_residency"] = residency
+    # How much of the files the access pattern pulled into the cache
+    rec["metrics"]["cache_residency_end"] = sum(
+        pagecache.residency(path) for path in files
+    ) / len(files)
+    # One operation per read, the binary reports how many it issued
+    return rusage.add_cpu_metrics(rec, usage, rec["config"]["num_ops"])
 
 
-def draw_nt_plot(df_nt):
+def draw_nt_plot(df_nt, spec):
     import numpy as np
+    from matplotlib import pyplot as plt
 
     markers = ["o", "s", "^", "D", "v", "p", "*", "h"]
-    labels = [
-        "Condy",
-        "Condy(Fixed)",
-        "Condy(Fixed+Direct)",
-        "Condy(Fixed+Direct+IOPoll)",
-        "Uring(Fixed+Direct+IOPoll)",
-        "Aio",
-        "Compio(Direct)",
-        "Monoio(Direct)",
-    ]
-    columns = [
-        "condy_iops",
-        "condy_fixed_iops",
-        "condy_fixed_direct_iops",
-        "condy_fixed_direct_iopoll_iops",
-        "uring_all_iops",
-        "aio_iops",
-        "compio_iops",
-        "monoio_iops",
-    ]
-    x = np.arange(len(df_nt))
-    for i, col in enumerate(columns):
-        plt.plot(
+    wide = pivot(df_nt, spec, "num_tasks", "iops")
+    errors = pivot_errors(df_nt, spec, "num_tasks", "iops")
+
+    x = np.arange(len(wide))
+    for i, label in enumerate(wide.columns):
+        plt.errorbar(
             x,
-            df_nt[col] / 1000,
-            marker=markers[i],
+            wide[label] / 1000,
+            yerr=[e / 1000 for e in errors[label]],
+            capsize=3,
+            marker=markers[i % len(markers)],
             linestyle="-",
-            label=labels[i],
+            label=label,
             markersize=8,
             markerfacecolor="none",
             markeredgewidth=2,
@@ -100,7 +166,7 @@ def draw_nt_plot(df_nt):
 
     plt.xlabel("Queue Depth")
     plt.ylabel("KIOPS")
-    plt.xticks(x, df_nt["queue_depth"])
+    plt.xticks(x, wide.index)
     plt.legend()
     plt.grid(True, linestyle="--", alpha=0.5)
     plt.tight_layout()
@@ -112,131 +178,339 @@ def draw_nt_plot(df_nt):
     plt.close()
 
 
-def run():
-    start_time = time.time()
+implementations = [
+    implementation("Condy", file_random_read_condy),
+    implementation("Condy(Fixed)", file_random_read_condy, fixed=True),
+    implementation(
+        "Condy(Fixed+Direct)",
+        file_random_read_condy,
+        fixed=True,
+        direct_io=True,
+    ),
+    implementation(
+        "Condy(Fixed+Direct+IOPoll)",
+        file_random_read_condy,
+        fixed=True,
+        direct_io=True,
+        iopoll=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct+IOPoll)",
+        file_random_read_uring,
+        fixed=True,
+        direct_io=True,
+        iopoll=True,
+    ),
+    implementation(
+        "Condy(Fixed+Direct+SQPoll)",
+        file_random_read_condy,
+        fixed=True,
+        direct_io=True,
+        sqpoll=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct+SQPoll)",
+        file_random_read_uring,
+        fixed=True,
+        direct_io=True,
+        sqpoll=True,
+    ),
+    implementation("Aio", file_random_read_aio),
+    implementation("Compio(Direct)", file_random_read_compio, direct_io=True),
+    implementation("Monoio(Direct)", file_random_read_monoio, direct_io=True),
+]
 
-    test_file = Path("./test_file.bin")
-    if not test_file.exists():
-        generate_test_file(test_file, size_in_mb=8 * 1024)  # 8 GB test file
 
-    default_block_size = 4 * 1024  # 4 KB
-    num_tasks_list = [4, 8, 16, 32, 64, 128]
+# Each file on its own device, read by one ring striping across all of them or
+# by one ring thread per file
+device_implementations = [
+    implementation(
+        "Condy(Fixed+Direct)",
+        file_random_read_condy,
+        fixed=True,
+        direct_io=True,
+    ),
+    implementation(
+        "Condy(Fixed+Direct+PerDevice)",
+        file_random_read_condy,
+        fixed=True,
+        direct_io=True,
+        per_file_threads=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct)",
+        file_random_read_uring,
+        fixed=True,
+        direct_io=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct+PerDevice)",
+        file_random_read_uring,
+        fixed=True,
+        direct_io=True,
+        per_file_threads=True,
+    ),
+    implementation("Aio", file_random_read_aio),
+    implementation("Compio(Direct)", file_random_read_compio, direct_io=True),
+    implementation("Monoio(Direct)", file_random_read_monoio, direct_io=True),
+]
 
-    condy_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_random_read(
-            file_random_read_condy,
-            test_file,
-            block_size=default_block_size,
-            num_tasks=nt,
-        )
-        output = process_output(output)
-        condy_nt_results.append(float(output["iops"]))
-
-    condy_fixed_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_random_read(
-            file_random_read_condy,
-            test_file,
-            block_size=default_block_size,
-            num_tasks=nt,
-            fixed=True,
-        )
-        output = process_output(output)
-        condy_fixed_nt_results.append(float(output["iops"]))
-
-    condy_fixed_direct_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_random_read(
-            file_random_read_condy,
-            test_file,
-            block_size=default_block_size,
-            num_tasks=nt,
-            fixed=True,
-            direct_io=True,
-        )
-        output = process_output(output)
-        condy_fixed_direct_nt_results.append(float(output["iops"]))
-
-    condy_fixed_direct_iopoll_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_random_read(
-            file_random_read_condy,
-            test_file,
-            block_size=default_block_size,
-            num_tasks=nt,
-            fixed=True,
-            direct_io=True,
-            iopoll=True,
-        )
-        output = process_output(output)
-        condy_fixed_direct_iopoll_nt_results.append(float(output["iops"]))
-
-    uring_all_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_random_read(
-            file_random_read_uring,
-            str(test_file),
-            default_block_size,
-            nt,
-            fixed=True,
-            direct_io=True,
-            iopoll=True,
-        )
-        output = process_output(output)
-        uring_all_nt_results.append(float(output["iops"]))
-
-    aio_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_random_read(
-            file_random_read_aio,
-            str(test_file),
-            default_block_size,
-            nt,
-        )
-        output = process_output(output)
-        aio_nt_results.append(float(output["iops"]))
-
-    compio_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_random_read(
-            file_random_read_compio,
-            str(test_file),
-            default_block_size,
-            nt,
-            direct_io=True,
-        )
-        output = process_output(output)
-        compio_nt_results.append(float(output["iops"]))
-
-    monoio_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_random_read(
-            file_random_read_monoio,
-            str(test_file),
-            default_block_size,
-            nt,
-            direct_io=True,
+
+def queue_depth_spec(test_file):
+    return {
+        "name": "file_random_read",
+        "runner": run_file_random_read,
+        "commands": file_random_read_commands,
+        "cpus": 2,
+        "resource": lambda params: scheduler.device_of(params["file"]),
+        # Fraction of the file cached when the run started, should be ~0, and
+        # when it ended
+        "metrics": ["time_ms", "iops", "cache_residency", "cache_residency_end"]
+        + steady.metrics
+        + rusage.metrics,
+        "converge_on": ["time_ms", "iops"],
+        "params": {"file": test_file, "block_size": 4 * 1024},  # 4 KB
+        "implementations": implementations,
+        "axes": {"num_tasks": [4, 8, 16, 32, 64, 128]},
+    }
+
+
+def block_size_spec(test_file):
+    spec = queue_depth_spec(test_file)
+    spec["params"] = {"file": test_file}
+    # 4 KB to 1 MB
+    spec["axes"] = {
+        "block_size": [4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024],
+        "num_tasks": [4, 16, 64, 128],
+    }
+    return spec
+
+
+def access_spec(test_file):
+    spec = queue_depth_spec(test_file)
+    # A fixed op count so every pattern does the same work; a quarter of the
+    # 4 KB blocks, which uniform mostly misses and skewed patterns mostly hit
+    spec["params"] = {
+        "file": test_file,
+        "block_size": 4 * 1024,
+        "num_tasks": 32,
+        "num_ops": 512 * 1024,
+    }
+    spec["implementations"] = [
+        impl
+        for impl in implementations
+        if impl["label"]
+        in [
+            "Condy",
+            "Condy(Fixed)",
+            "Condy(Fixed+Direct)",
+            "Aio",
+            "Compio(Direct)",
+            "Monoio(Direct)",
+        ]
+    ]
+    spec["axes"] = {
+        "access": [
+            "uniform",
+            "zipf:0.5",
+            "zipf:0.9",
+            "zipf:0.99",
+            "hotspot:90:10",
+            "runs:16",
+        ]
+    }
+    return spec
+
+
+def device_cpus(num_threads):
+    # A core per ring thread, plus one for the harness and interrupts
+    allowed = sorted(os.sched_getaffinity(0))
+    return ",".join(str(cpu) for cpu in allowed[: num_threads + 1])
+
+
+def device_spec(device_files):
+    counts = [count for count in device_counts if count <= len(device_files)]
+    spec = queue_depth_spec(device_files)
+    # Wider than any CPU slot, so it has no "cpus" and always runs alone
+    del spec["cpus"]
+    del spec["resource"]
+    # Queue depth is per device; a fixed op count keeps a run short however
+    # many devices share it
+    spec["params"] = {
+        "file": device_files,
+        "block_size": 4 * 1024,
+        "num_tasks": 32,
+        "num_ops": 4 * 1024 * 1024,
+        "cpus": device_cpus(max(counts)),
+    }
+    spec["implementations"] = device_implementations
+    spec["axes"] = {"num_files": counts}
+    return spec
+
+
+def draw_device_plot(df_dev, spec):
+    # Aggregate IOPS next to CPU per read: flat IOPS with rising CPU per read
+    # means the runtime is the ceiling, flat CPU per read means the devices
+    import numpy as np
+    from matplotlib import pyplot as plt
+
+    markers = ["o", "s", "^", "D", "v", "p", "*", "h"]
+    fig, (ax_iops, ax_cpu) = plt.subplots(1, 2, figsize=(12, 4.5))
+    for ax, metric, scale in [
+        (ax_iops, "iops", 1e6),
+        (ax_cpu, "cpu_us_per_op", 1),
+    ]:
+        wide = pivot(df_dev, spec, "num_files", metric)
+        errors = pivot_errors(df_dev, spec, "num_files", metric)
+        x = np.arange(len(wide))
+        for i, label in enumerate(wide.columns):
+            ax.errorbar(
+                x,
+                wide[label] / scale,
+                yerr=[e / scale for e in errors[label]],
+                capsize=3,
+                marker=markers[i % len(markers)],
+                linestyle="-",
+                label=label,
+                markersize=6,
+                markerfacecolor="none",
+                markeredgewidth=2,
+            )
+        ax.set_xlabel("Devices")
+        ax.set_xticks(x, wide.index)
+        ax.grid(True, linestyle="--", alpha=0.5)
+    ax_iops.set_ylabel("MIOPS")
+    ax_cpu.set_ylabel("CPU per read (us)")
+    ax_iops.legend(fontsize=7)
+    fig.tight_layout()
+    fig.savefig(fig_dir / "file_random_read_devices.png", dpi=200, bbox_inches="tight")
+    plt.close(fig)
+
+
+def draw_access_plot(df_ac, spec):
+    import numpy as np
+    from matplotlib import pyplot as plt
+
+    wide = pivot(df_ac, spec, "access", "iops")
+    errors = pivot_errors(df_ac, spec, "access", "iops")
+    # Patterns in sweep order rather than alphabetical
+    order = [access for access in spec["axes"]["access"] if access in wide.index]
+    wide = wide.reindex(order)
+    errors = {
+        label: [bound.reindex(order) for bound in bounds]
+        for label, bounds in errors.items()
+    }
+
+    x = np.arange(len(wide))
+    width = 0.8 / len(wide.columns)
+    for i, label in enumerate(wide.columns):
+        plt.bar(
+            x + (i - (len(wide.columns) - 1) / 2) * width,
+            wide[label] / 1000,
+            width,
+            yerr=[e / 1000 for e in errors[label]],
+            capsize=2,
+            label=label,
         )
-        output = process_output(output)
-        monoio_nt_results.append(float(output["iops"]))
-
-    df_nt = pd.DataFrame(
-        {
-            "queue_depth": num_tasks_list,
-            "condy_iops": condy_nt_results,
-            "condy_fixed_iops": condy_fixed_nt_results,
-            "condy_fixed_direct_iops": condy_fixed_direct_nt_results,
-            "condy_fixed_direct_iopoll_iops": condy_fixed_direct_iopoll_nt_results,
-            "uring_all_iops": uring_all_nt_results,
-            "aio_iops": aio_nt_results,
-            "compio_iops": compio_nt_results,
-            "monoio_iops": monoio_nt_results,
-        }
+
+    plt.xlabel("Access Pattern")
+    plt.ylabel("KIOPS")
+    plt.xticks(x, wide.index, rotation=20)
+    plt.yscale("log")
+    plt.legend(fontsize=7)
+    plt.grid(True, axis="y", linestyle="--", alpha=0.5)
+    plt.tight_layout()
+    plt.savefig(
+        fig_dir / "file_random_read_access.png",
+        dpi=200,
+        bbox_inches="tight",
     )
+    plt.close()
+
+
+def run_queue_depth(test_file):
+    spec = queue_depth_spec(test_file)
+    trials_nt = execute(spec)
+    if trials_nt is None:
+        return
+    save_trials(trials_nt, "file_random_read_queue_depth")
+    df_nt = summarize(trials_nt, spec)
     df_nt.to_csv(data_dir / "file_random_read_queue_depth.csv", index=False)
 
-    draw_nt_plot(df_nt)
+    draw_nt_plot(df_nt, spec)
+
+
+def run_block_size(test_file):
+    spec = block_size_spec(test_file)
+    trials_bs = execute(spec)
+    if trials_bs is None:
+        return
+    save_trials(trials_bs, "file_random_read_block_size")
+    df_bs = summarize(trials_bs, spec)
+    df_bs.to_csv(data_dir / "file_random_read_block_size.csv", index=False)
+
+    best = heatmap.best_configs(df_bs, "iops", "block_size", "num_tasks")
+    best.to_csv(data_dir / "file_random_read_block_size_best.csv", index=False)
+    print("Best configuration per block size:")
+    print(best[best["rank"] == 1].to_string(index=False))
+
+    # IOPS spans orders of magnitude across block sizes, bandwidth does not,
+    # so color by bandwidth to keep every row readable
+    df_bs["mbps"] = df_bs["iops"] * df_bs["block_size"] / (1024 * 1024)
+    heatmap.draw(
+        df_bs,
+        spec,
+        "mbps",
+        "Throughput (MB/s)",
+        fig_dir / "file_random_read_block_size.png",
+        "block_size",
+        "num_tasks",
+    )
+
+
+def run_access(test_file):
+    spec = access_spec(test_file)
+    trials_ac = execute(spec)
+    if trials_ac is None:
+        return
+    save_trials(trials_ac, "file_random_read_access")
+    df_ac = summarize(trials_ac, spec)
+    df_ac.to_csv(data_dir / "file_random_read_access.csv", index=False)
+
+    draw_access_plot(df_ac, spec)
+
+
+def run_devices(device_files):
+    spec = device_spec(device_files)
+    trials_dev = execute(spec)
+    if trials_dev is None:
+        return
+    save_trials(trials_dev, "file_random_read_devices")
+    df_dev = summarize(trials_dev, spec)
+    df_dev.to_csv(data_dir / "file_random_read_devices.csv", index=False)
+
+    draw_device_plot(df_dev, spec)
+
+
+def run():
+    start_time = time.time()
+
+    # 8 GB test file, not written when only printing commands
+    if sweep.dry_run:
+        test_file = testfile.test_file_path(8 * 1024)
+    else:
+        test_file = testfile.provision(8 * 1024)
+
+    run_queue_depth(test_file)
+    run_block_size(test_file)
+    run_access(test_file)
+
+    # The same test file on every device, the current directory's is reused
+    if sweep.dry_run:
+        device_files = [testfile.test_file_path(8 * 1024, d) for d in stripe_dirs]
+    else:
+        device_files = [testfile.provision(8 * 1024, d) for d in stripe_dirs]
+    run_devices(device_files)
 
     end_time = time.time()
     print(f"Total benchmark time: {end_time - start_time:.2f} seconds")
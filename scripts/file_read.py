@@ -1,15 +1,18 @@
-import subprocess
-from matplotlib import pyplot as plt
-from pathlib import Path
 from utils import (
-    process_output,
-    generate_test_file,
     benchmark_dir,
     benchmark_rust_dir,
     fig_dir,
     data_dir,
 )
-import pandas as pd
+import scheduler
+import heatmap
+import pagecache
+import record
+import rusage
+import steady
+import sweep
+import testfile
+from sweep import implementation, execute, summarize, pivot, pivot_errors, save_trials
 
 file_read_condy = benchmark_dir / "file_read_condy"
 file_read_uring = benchmark_dir / "file_read_uring"
@@ -18,7 +21,7 @@ file_read_compio = benchmark_rust_dir / "file_read_compio"
 file_read_monoio = benchmark_rust_dir / "file_read_monoio"
 
 
-def run_file_read(
+def file_read_commands(
     program,
     file,
     block_size,
@@ -27,12 +30,9 @@ def run_file_read(
     fixed=False,
     iopoll=False,
     sqpoll=False,
+    interval_ms=100,
+    cpus="0,2",
 ):
-    # We need to clean vm cache between runs to get accurate results
-    result = subprocess.run(
-        ["sudo", "sh", "-c", "echo 3 > /proc/sys/vm/drop_caches"], check=True
-    )
-
     args = [
         "sudo",
         "nice",
@@ -40,8 +40,11 @@ def run_file_read(
         "-20",
         "taskset",
         "-c",
-        "0,2",
+        cpus,
         str(program),
+        "-j",
+        "-i",
+        str(interval_ms),
         str(file),
         "-b",
         str(block_size),
@@ -56,44 +59,65 @@ def run_file_read(
         args.append("-p")
     if sqpoll:
         args.append("-q")
+    return [args]
+
+
+def run_file_read(
+    program,
+    file,
+    block_size,
+    num_tasks,
+    direct_io=False,
+    fixed=False,
+    iopoll=False,
+    sqpoll=False,
+    interval_ms=100,
+    cpus="0,2",
+):
+    # Evict only the test file so every run starts from a cold cache
+    residency = pagecache.evict(file)
+
+    [args] = file_read_commands(
+        program,
+        file,
+        block_size,
+        num_tasks,
+        direct_io,
+        fixed,
+        iopoll,
+        sqpoll,
+        interval_ms,
+        cpus,
+    )
     print(args)
-    result = subprocess.run(args, capture_output=True, text=True, check=True)
-    return result.stdout
+    stdout, usage, timeline = rusage.run(args, disk=file)
+    rec = record.parse(stdout)
+    rec["timeline"] = timeline
+    steady.add_metrics(rec)
+    rec["metrics"]["cache_residency"] = residency
+    # One operation per block read
+    num_blocks = -(-rec["config"]["file_size"] // block_size)
+    return rusage.add_cpu_metrics(rec, usage, num_blocks)
 
 
-def draw_nt_plot(df_nt):
+def draw_nt_plot(df_nt, spec):
     import numpy as np
+    from matplotlib import pyplot as plt
 
     markers = ["o", "s", "^", "D", "v", "p", "*", "h"]
-    labels = [
-        "Condy",
-        "Condy(Fixed)",
-        "Condy(Fixed+Direct)",
-        "Condy(Fixed+Direct+IOPoll)",
-        "Uring(Fixed+Direct+IOPoll)",
-        "Aio",
-        "Compio(Direct)",
-        "Monoio(Direct)",
-    ]
-    columns = [
-        "condy_throughput_mbps",
-        "condy_fixed_throughput_mbps",
-        "condy_fixed_direct_throughput_mbps",
-        "condy_fixed_direct_iopoll_throughput_mbps",
-        "uring_all_throughput_mbps",
-        "aio_throughput_mbps",
-        "compio_throughput_mbps",
-        "monoio_throughput_mbps",
-    ]
+    wide = pivot(df_nt, spec, "num_tasks", "throughput_mbps")
+    errors = pivot_errors(df_nt, spec, "num_tasks", "throughput_mbps")
 
-    x = np.arange(len(df_nt))
-    for i, col in enumerate(columns):
-        plt.plot(
+    x = np.arange(len(wide))
+    for i, label in enumerate(wide.columns):
+        plt.errorbar(
             x,
-            df_nt[col],
-            marker=markers[i],
+            wide[label],
+            yerr=errors[label],
+            capsize=3,
+            marker=markers[i % len(markers)],
             linestyle="-",
-            label=labels[i],
+            label=label,
             markersize=8,
             markerfacecolor="none",
             markeredgewidth=2,
@@ -101,7 +125,7 @@ def draw_nt_plot(df_nt):
 
     plt.xlabel("Queue Depth")
     plt.ylabel("Throughput (MB/s)")
-    plt.xticks(x, df_nt["queue_depth"])
+    plt.xticks(x, wide.index)
     plt.legend()
     plt.grid(True, linestyle="--", alpha=0.5)
     plt.tight_layout()
@@ -113,121 +137,119 @@ def draw_nt_plot(df_nt):
     plt.close()
 
 
-def run():
-    test_file = Path("./test_file.bin")
-    if not test_file.exists():
-        generate_test_file(test_file, size_in_mb=8 * 1024)  # 8 GB test file
-
-    default_block_size = 64 * 1024  # 64 KB
-
-    num_tasks_list = [4, 8, 16, 32, 64, 128]
-
-    condy_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_read(file_read_condy, str(test_file), default_block_size, nt)
-        output = process_output(output)
-        condy_nt_results.append(float(output["throughput_mbps"]))
-
-    condy_fixed_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_read(
-            file_read_condy,
-            str(test_file),
-            default_block_size,
-            nt,
-            direct_io=False,
-            fixed=True,
-        )
-        output = process_output(output)
-        condy_fixed_nt_results.append(float(output["throughput_mbps"]))
-
-    condy_fixed_direct_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_read(
-            file_read_condy,
-            str(test_file),
-            default_block_size,
-            nt,
-            fixed=True,
-            direct_io=True,
-        )
-        output = process_output(output)
-        condy_fixed_direct_nt_results.append(float(output["throughput_mbps"]))
-
-    condy_fixed_direct_iopoll_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_read(
-            file_read_condy,
-            str(test_file),
-            default_block_size,
-            nt,
-            fixed=True,
-            direct_io=True,
-            iopoll=True,
-        )
-        output = process_output(output)
-        condy_fixed_direct_iopoll_nt_results.append(float(output["throughput_mbps"]))
-
-    uring_all_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_read(
-            file_read_uring,
-            str(test_file),
-            default_block_size,
-            nt,
-            fixed=True,
-            direct_io=True,
-            iopoll=True,
-        )
-        output = process_output(output)
-        uring_all_nt_results.append(float(output["throughput_mbps"]))
-
-    aio_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_read(file_read_aio, str(test_file), default_block_size, nt)
-        output = process_output(output)
-        aio_nt_results.append(float(output["throughput_mbps"]))
-
-    compio_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_read(
-            file_read_compio,
-            str(test_file),
-            default_block_size,
-            nt,
-            direct_io=True,
-        )
-        output = process_output(output)
-        compio_nt_results.append(float(output["throughput_mbps"]))
-
-    monoio_nt_results = []
-    for nt in num_tasks_list:
-        output = run_file_read(
-            file_read_monoio,
-            str(test_file),
-            default_block_size,
-            nt,
-            direct_io=True,
-        )
-        output = process_output(output)
-        monoio_nt_results.append(float(output["throughput_mbps"]))
-
-    df_nt = pd.DataFrame(
-        {
-            "queue_depth": num_tasks_list,
-            "condy_throughput_mbps": condy_nt_results,
-            "condy_fixed_throughput_mbps": condy_fixed_nt_results,
-            "condy_fixed_direct_throughput_mbps": condy_fixed_direct_nt_results,
-            "condy_fixed_direct_iopoll_throughput_mbps": condy_fixed_direct_iopoll_nt_results,
-            "uring_all_throughput_mbps": uring_all_nt_results,
-            "aio_throughput_mbps": aio_nt_results,
-            "compio_throughput_mbps": compio_nt_results,
-            "monoio_throughput_mbps": monoio_nt_results,
-        }
-    )
+implementations = [
+    implementation("Condy", file_read_condy),
+    implementation("Condy(Fixed)", file_read_condy, fixed=True),
+    implementation("Condy(Fixed+Direct)", file_read_condy, fixed=True, direct_io=True),
+    implementation(
+        "Condy(Fixed+Direct+IOPoll)",
+        file_read_condy,
+        fixed=True,
+        direct_io=True,
+        iopoll=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct+IOPoll)",
+        file_read_uring,
+        fixed=True,
+        direct_io=True,
+        iopoll=True,
+    ),
+    implementation(
+        "Condy(Fixed+Direct+SQPoll)",
+        file_read_condy,
+        fixed=True,
+        direct_io=True,
+        sqpoll=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct+SQPoll)",
+        file_read_uring,
+        fixed=True,
+        direct_io=True,
+        sqpoll=True,
+    ),
+    implementation("Aio", file_read_aio),
+    implementation("Compio(Direct)", file_read_compio, direct_io=True),
+    implementation("Monoio(Direct)", file_read_monoio, direct_io=True),
+]
+
+
+def queue_depth_spec(test_file):
+    return {
+        "name": "file_read",
+        "runner": run_file_read,
+        "commands": file_read_commands,
+        "cpus": 2,
+        "resource": lambda params: scheduler.device_of(params["file"]),
+        # Fraction of the file cached when the run started, should be ~0
+        "metrics": ["time_ms", "throughput_mbps", "cache_residency"]
+        + steady.metrics
+        + rusage.metrics,
+        "converge_on": ["time_ms", "throughput_mbps"],
+        "params": {"file": test_file, "block_size": 64 * 1024},  # 64 KB
+        "implementations": implementations,
+        "axes": {"num_tasks": [4, 8, 16, 32, 64, 128]},
+    }
+
+
+def block_size_spec(test_file):
+    spec = queue_depth_spec(test_file)
+    spec["params"] = {"file": test_file}
+    # 4 KB to 1 MB
+    spec["axes"] = {
+        "block_size": [4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024],
+        "num_tasks": [4, 16, 64, 128],
+    }
+    return spec
+
+
+def run_queue_depth(test_file):
+    spec = queue_depth_spec(test_file)
+    trials_nt = execute(spec)
+    if trials_nt is None:
+        return
+    save_trials(trials_nt, "file_read_queue_depth")
+    df_nt = summarize(trials_nt, spec)
     df_nt.to_csv(data_dir / "file_read_queue_depth.csv", index=False)
 
-    draw_nt_plot(df_nt)
+    draw_nt_plot(df_nt, spec)
+
+
+def run_block_size(test_file):
+    spec = block_size_spec(test_file)
+    trials_bs = execute(spec)
+    if trials_bs is None:
+        return
+    save_trials(trials_bs, "file_read_block_size")
+    df_bs = summarize(trials_bs, spec)
+    df_bs.to_csv(data_dir / "file_read_block_size.csv", index=False)
+
+    best = heatmap.best_configs(df_bs, "throughput_mbps", "block_size", "num_tasks")
+    best.to_csv(data_dir / "file_read_block_size_best.csv", index=False)
+    print("Best configuration per block size:")
+    print(best[best["rank"] == 1].to_string(index=False))
+
+    heatmap.draw(
+        df_bs,
+        spec,
+        "throughput_mbps",
+        "Throughput (MB/s)",
+        fig_dir / "file_read_block_size.png",
+        "block_size",
+        "num_tasks",
+    )
+
+
+def run():
+    # 8 GB test file, not written when only printing commands
+    if sweep.dry_run:
+        test_file = testfile.test_file_path(8 * 1024)
+    else:
+        test_file = testfile.provision(8 * 1024)
+
+    run_queue_depth(test_file)
+    run_block_size(test_file)
 
 
 if __name__ == "__main__":
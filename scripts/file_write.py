@@ -0,0 +1,383 @@
+from pathlib import Path
+from utils import (
+    benchmark_dir,
+    benchmark_rust_dir,
+    fig_dir,
+    data_dir,
+)
+import scheduler
+import heatmap
+import pagecache
+import record
+import rusage
+import steady
+import sweep
+import testfile
+from sweep import implementation, execute, summarize, pivot, pivot_errors, save_trials
+
+file_write_condy = benchmark_dir / "file_write_condy"
+file_write_uring = benchmark_dir / "file_write_uring"
+file_write_aio = benchmark_dir / "file_write_aio"
+file_write_sync = benchmark_dir / "file_write_sync"
+file_write_compio = benchmark_rust_dir / "file_write_compio"
+file_write_monoio = benchmark_rust_dir / "file_write_monoio"
+
+
+def scratch_file_path(size_mb, directory=Path(".")):
+    # Not the read suites' test file, writes would invalidate its manifest
+    return directory / f"write_file_{size_mb}M.bin"
+
+
+def provision_scratch(path, size):
+    # Random overwrites need every extent written once, appends truncate the
+    # file and leave it full size again, so a large enough file is reused
+    try:
+        if path.stat().st_size >= size:
+            return
+    except FileNotFoundError:
+        pass
+    testfile.generate(path, size // (1024 * 1024))
+
+
+def file_write_commands(
+    program,
+    file,
+    block_size,
+    num_tasks,
+    size,
+    mode="append",
+    sync_every=0,
+    direct_io=False,
+    fixed=False,
+    linked=False,
+    sqpoll=False,
+    interval_ms=100,
+    cpus="0,2",
+):
+    args = [
+        "sudo",
+        "nice",
+        "-n",
+        "-20",
+        "taskset",
+        "-c",
+        cpus,
+        str(program),
+        "-j",
+        "-i",
+        str(interval_ms),
+        str(file),
+        "-b",
+        str(block_size),
+        "-z",
+        str(size),
+        "-m",
+        mode,
+        "-y",
+        str(sync_every),
+    ]
+    if num_tasks is not None:
+        args += ["-t", str(num_tasks)]
+    if direct_io:
+        args.append("-d")
+    if fixed:
+        args.append("-f")
+    if linked:
+        args.append("-l")
+    if sqpoll:
+        args.append("-q")
+    return [args]
+
+
+def run_file_write(
+    program,
+    file,
+    block_size,
+    num_tasks,
+    size,
+    mode="append",
+    sync_every=0,
+    direct_io=False,
+    fixed=False,
+    linked=False,
+    sqpoll=False,
+    interval_ms=100,
+    cpus="0,2",
+):
+    provision_scratch(file, size)
+    # Flushes what the last run left dirty and starts from a cold cache
+    pagecache.evict(file)
+
+    [args] = file_write_commands(
+        program,
+        file,
+        block_size,
+        num_tasks,
+        size,
+        mode,
+        sync_every,
+        direct_io,
+        fixed,
+        linked,
+        sqpoll,
+        interval_ms,
+        cpus,
+    )
+    print(args)
+    stdout, usage, timeline = rusage.run(args, disk=file)
+    rec = record.parse(stdout)
+    rec["timeline"] = timeline
+    steady.add_metrics(rec)
+    # One operation per block written, the fdatasyncs ride along
+    return rusage.add_cpu_metrics(rec, usage, rec["config"]["num_ops"])
+
+
+def draw_mode_plot(df, spec, axis, metric, xlabel, ylabel, path, log=False):
+    # One panel per write mode, appends and overwrites scale differently
+    import numpy as np
+    from matplotlib import pyplot as plt
+
+    markers = ["o", "s", "^", "D", "v", "p", "*", "h"]
+    modes = [mode for mode in spec["axes"]["mode"] if mode in set(df["mode"])]
+    fig, axes = plt.subplots(
+        1, len(modes), figsize=(6 * len(modes), 4.5), squeeze=False
+    )
+    for ax, mode in zip(axes.flat, modes):
+        df_mode = df[df["mode"] == mode]
+        wide = pivot(df_mode, spec, axis, metric)
+        errors = pivot_errors(df_mode, spec, axis, metric)
+
+        x = np.arange(len(wide))
+        for i, label in enumerate(wide.columns):
+            ax.errorbar(
+                x,
+                wide[label],
+                yerr=errors[label],
+                capsize=3,
+                marker=markers[i % len(markers)],
+                linestyle="-",
+                label=label,
+                markersize=6,
+                markerfacecolor="none",
+                markeredgewidth=2,
+            )
+        ax.set_title(mode.capitalize())
+        ax.set_xlabel(xlabel)
+        ax.set_xticks(x, wide.index)
+        if log:
+            ax.set_yscale("log")
+        ax.grid(True, linestyle="--", alpha=0.5)
+    axes.flat[0].set_ylabel(ylabel)
+    axes.flat[0].legend(fontsize=7)
+    fig.tight_layout()
+    fig.savefig(path, dpi=200, bbox_inches="tight")
+    plt.close(fig)
+
+
+implementations = [
+    implementation("Condy", file_write_condy),
+    implementation("Condy(Fixed)", file_write_condy, fixed=True),
+    implementation(
+        "Condy(Fixed+Direct)",
+        file_write_condy,
+        fixed=True,
+        direct_io=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct)",
+        file_write_uring,
+        fixed=True,
+        direct_io=True,
+    ),
+    implementation(
+        "Condy(Fixed+Direct+SQPoll)",
+        file_write_condy,
+        fixed=True,
+        direct_io=True,
+        sqpoll=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct+SQPoll)",
+        file_write_uring,
+        fixed=True,
+        direct_io=True,
+        sqpoll=True,
+    ),
+    implementation("Aio", file_write_aio),
+    implementation("Compio(Direct)", file_write_compio, direct_io=True),
+    implementation("Monoio(Direct)", file_write_monoio, direct_io=True),
+]
+
+# Linked variants submit each fdatasync behind its write in one chain, the
+# others wait for the write before issuing the fdatasync
+sync_implementations = [
+    implementation("Condy", file_write_condy),
+    implementation("Condy(Link)", file_write_condy, linked=True),
+    implementation(
+        "Condy(Fixed+Direct)",
+        file_write_condy,
+        fixed=True,
+        direct_io=True,
+    ),
+    implementation(
+        "Condy(Fixed+Direct+Link)",
+        file_write_condy,
+        fixed=True,
+        direct_io=True,
+        linked=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct)",
+        file_write_uring,
+        fixed=True,
+        direct_io=True,
+    ),
+    implementation(
+        "Uring(Fixed+Direct+Link)",
+        file_write_uring,
+        fixed=True,
+        direct_io=True,
+        linked=True,
+    ),
+    implementation("Aio", file_write_aio),
+    implementation("Sync", file_write_sync, num_tasks=None),
+    implementation("Sync(Direct)", file_write_sync, num_tasks=None, direct_io=True),
+    implementation("Compio(Direct)", file_write_compio, direct_io=True),
+    implementation("Monoio(Direct)", file_write_monoio, direct_io=True),
+]
+
+
+def queue_depth_spec(scratch_file, size):
+    return {
+        "name": "file_write",
+        "runner": run_file_write,
+        "commands": file_write_commands,
+        "cpus": 2,
+        "resource": lambda params: scheduler.device_of(params["file"]),
+        "metrics": ["time_ms", "throughput_mbps", "iops", "syncs"]
+        + steady.metrics
+        + rusage.metrics,
+        "converge_on": ["time_ms", "throughput_mbps"],
+        "params": {
+            "file": scratch_file,
+            "size": size,
+            "block_size": 16 * 1024,  # 16 KB
+        },
+        "implementations": implementations,
+        "axes": {
+            "mode": ["append", "random"],
+            "num_tasks": [1, 4, 8, 16, 32, 64, 128],
+        },
+    }
+
+
+def block_size_spec(scratch_file, size):
+    spec = queue_depth_spec(scratch_file, size)
+    spec["params"] = {"file": scratch_file, "size": size, "mode": "append"}
+    # 4 KB to 1 MB
+    spec["axes"] = {
+        "block_size": [4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024],
+        "num_tasks": [4, 16, 64, 128],
+    }
+    return spec
+
+
+def sync_every_spec(scratch_file, size):
+    spec = queue_depth_spec(scratch_file, size)
+    # Small writes where the fdatasync dominates, as in a log
+    spec["params"] = {
+        "file": scratch_file,
+        "size": size,
+        "block_size": 4 * 1024,  # 4 KB
+        "num_tasks": 32,
+    }
+    spec["implementations"] = sync_implementations
+    spec["axes"] = {
+        "mode": ["append", "random"],
+        "sync_every": [1, 4, 16, 64, 256],
+    }
+    return spec
+
+
+def run_queue_depth(scratch_file, size):
+    spec = queue_depth_spec(scratch_file, size)
+    trials_nt = execute(spec)
+    if trials_nt is None:
+        return
+    save_trials(trials_nt, "file_write_queue_depth")
+    df_nt = summarize(trials_nt, spec)
+    df_nt.to_csv(data_dir / "file_write_queue_depth.csv", index=False)
+
+    draw_mode_plot(
+        df_nt,
+        spec,
+        "num_tasks",
+        "throughput_mbps",
+        "Queue Depth",
+        "Throughput (MB/s)",
+        fig_dir / "file_write_queue_depth.png",
+    )
+
+
+def run_block_size(scratch_file, size):
+    spec = block_size_spec(scratch_file, size)
+    trials_bs = execute(spec)
+    if trials_bs is None:
+        return
+    save_trials(trials_bs, "file_write_block_size")
+    df_bs = summarize(trials_bs, spec)
+    df_bs.to_csv(data_dir / "file_write_block_size.csv", index=False)
+
+    best = heatmap.best_configs(df_bs, "throughput_mbps", "block_size", "num_tasks")
+    best.to_csv(data_dir / "file_write_block_size_best.csv", index=False)
+    print("Best configuration per block size:")
+    print(best[best["rank"] == 1].to_string(index=False))
+
+    heatmap.draw(
+        df_bs,
+        spec,
+        "throughput_mbps",
+        "Throughput (MB/s)",
+        fig_dir / "file_write_block_size.png",
+        "block_size",
+        "num_tasks",
+    )
+
+
+def run_sync_every(scratch_file, size):
+    spec = sync_every_spec(scratch_file, size)
+    trials_se = execute(spec)
+    if trials_se is None:
+        return
+    save_trials(trials_se, "file_write_sync_every")
+    df_se = summarize(trials_se, spec)
+    df_se.to_csv(data_dir / "file_write_sync_every.csv", index=False)
+
+    draw_mode_plot(
+        df_se,
+        spec,
+        "sync_every",
+        "iops",
+        "Writes per fdatasync",
+        "IOPS",
+        fig_dir / "file_write_sync_every.png",
+        log=True,
+    )
+
+
+def run():
+    # 1 GB for throughput, 64 MB for the sync sweep where every fdatasync
+    # waits for the device; not written when only printing commands
+    large, small = 1024, 64
+    scratch = {size_mb: scratch_file_path(size_mb) for size_mb in [large, small]}
+    if not sweep.dry_run:
+        for size_mb, path in scratch.items():
+            provision_scratch(path, size_mb * 1024 * 1024)
+
+    run_queue_depth(scratch[large], large * 1024 * 1024)
+    run_block_size(scratch[large], large * 1024 * 1024)
+    run_sync_every(scratch[small], small * 1024 * 1024)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,76 @@
+import math
+
+
+def size_label(size):
+    for unit, suffix in [(1024 * 1024, "M"), (1024, "K")]:
+        if size >= unit and size % unit == 0:
+            return f"{size // unit}{suffix}"
+    return str(size)
+
+
+def draw(df, spec, metric, label, path, rows, columns):
+    # One panel per implementation on a shared color scale, so the brightest
+    # cell across panels is the best configuration overall
+    import numpy as np
+    from matplotlib import pyplot as plt
+
+    measured = set(df["implementation"])
+    labels = [
+        impl["label"] for impl in spec["implementations"] if impl["label"] in measured
+    ]
+    num_columns = min(4, len(labels))
+    num_rows = math.ceil(len(labels) / num_columns)
+    fig, axes = plt.subplots(
+        num_rows,
+        num_columns,
+        figsize=(3.5 * num_columns, 3 * num_rows),
+        sharex=True,
+        sharey=True,
+        squeeze=False,
+    )
+    for ax, impl in zip(axes.flat, labels):
+        wide = df[df["implementation"] == impl].pivot(
+            index=rows, columns=columns, values=metric
+        )
+        cells = wide.to_numpy()
+        image = ax.imshow(
+            cells,
+            origin="lower",
+            aspect="auto",
+            cmap="viridis",
+            vmin=df[metric].min(),
+            vmax=df[metric].max(),
+        )
+        for (i, j), value in np.ndenumerate(cells):
+            ax.text(j, i, f"{value:.0f}", ha="center", va="center", fontsize=7)
+        ax.set_xticks(range(len(wide.columns)), wide.columns)
+        ax.set_yticks(range(len(wide.index)), [size_label(v) for v in wide.index])
+        ax.set_title(impl, fontsize=9)
+    for ax in axes.flat[len(labels) :]:
+        ax.axis("off")
+    fig.supxlabel("Queue Depth")
+    fig.supylabel("Block Size")
+    fig.colorbar(image, ax=axes, label=label)
+    fig.savefig(path, dpi=200, bbox_inches="tight")
+    plt.close(fig)
+
+
+def best_configs(df, metric, rows, columns):
+    # Each implementation's best column value for every row value, ranked
+    # within the row; rank 1 is the optimal configuration for that row
+    best = df.loc[df.groupby([rows, "implementation"], sort=False)[metric].idxmax()]
+    best = best.sort_values([rows, metric], ascending=[True, False])
+    best["rank"] = best.groupby(rows).cumcount() + 1
+    best["vs_best"] = best[metric] / best.groupby(rows)[metric].transform("max") - 1
+    return best[
+        [
+            rows,
+            "rank",
+            "implementation",
+            columns,
+            metric,
+            f"{metric}_ci_low",
+            f"{metric}_ci_high",
+            "vs_best",
+        ]
+    ].reset_index(drop=True)
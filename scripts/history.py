@@ -0,0 +1,288 @@
+import argparse
+import datetime
+import hashlib
+import json
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from utils import results_dir, fig_dir
+import cache
+import stats
+
+db_path = results_dir / "history.sqlite"
+# Append every saved trials table to the history database
+enabled = True
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    host TEXT NOT NULL,
+    host_info TEXT NOT NULL,
+    condy_commit TEXT,
+    bench_commit TEXT,
+    digest TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    benchmark TEXT NOT NULL,
+    implementation TEXT NOT NULL,
+    program TEXT NOT NULL,
+    binary_hash TEXT,
+    point TEXT NOT NULL,
+    trial INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    outlier INTEGER
+);
+CREATE INDEX IF NOT EXISTS samples_lookup
+    ON samples(metric, implementation, benchmark);
+"""
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or db_path)
+    conn.executescript(schema)
+    return conn
+
+
+def host_key(host):
+    encoded = json.dumps(host, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+
+def point_label(row, axes):
+    return " ".join(f"{axis}={row[axis]}" for axis in axes)
+
+
+def first_value(trials, column):
+    if column not in trials:
+        return None
+    values = trials[column].dropna()
+    return str(values.iloc[0]) if not values.empty else None
+
+
+def long_format(trials):
+    # One row per trial and metric, so any metric of any table can be
+    # filtered and aggregated with a single query
+    import pandas as pd
+
+    columns = list(trials.columns)
+    keys = columns[: columns.index("trial")]
+    axes = [
+        key for key in keys if key not in ("benchmark", "implementation", "program")
+    ]
+    metrics = [
+        column
+        for column in columns[columns.index("trial") + 1 :]
+        if not column.endswith("_outlier")
+        and "." not in column
+        and column not in ("schema_version", "binary_hash", "timeline")
+        and pd.api.types.is_numeric_dtype(trials[column])
+    ]
+
+    base = trials[["benchmark", "implementation", "program", "trial"]].copy()
+    base["binary_hash"] = trials["binary_hash"] if "binary_hash" in trials else None
+    base["point"] = trials.apply(point_label, axis=1, args=(axes,)) if axes else ""
+    frames = []
+    for metric in metrics:
+        frame = base.copy()
+        frame["metric"] = metric
+        frame["value"] = trials[metric].astype(float)
+        outlier = f"{metric}_outlier"
+        frame["outlier"] = trials[outlier].astype(int) if outlier in trials else None
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def append(trials_path, path=None):
+    # Identical tables, such as a rerun served entirely from the cache or a
+    # directory imported twice, are stored once
+    import pandas as pd
+
+    trials_path = Path(trials_path)
+    name = trials_path.name.removesuffix("_trials.csv")
+    digest = hashlib.sha256(name.encode() + trials_path.read_bytes()).hexdigest()
+    timestamp = datetime.datetime.fromtimestamp(
+        trials_path.stat().st_mtime, datetime.timezone.utc
+    )
+    host = cache.host_fingerprint()
+    trials = pd.read_csv(trials_path)
+
+    with connect(path) as conn:
+        if conn.execute("SELECT 1 FROM runs WHERE digest = ?", (digest,)).fetchone():
+            return None
+        cursor = conn.execute(
+            "INSERT INTO runs (name, timestamp, host, host_info, condy_commit, "
+            "bench_commit, digest) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                name,
+                timestamp.isoformat(timespec="seconds"),
+                host_key(host),
+                json.dumps(host, sort_keys=True),
+                first_value(trials, "env.condy_commit"),
+                first_value(trials, "env.bench_commit"),
+                digest,
+            ),
+        )
+        samples = long_format(trials)
+        samples.insert(0, "run_id", cursor.lastrowid)
+        samples.to_sql("samples", conn, if_exists="append", index=False)
+        return cursor.lastrowid
+
+
+def import_dir(data_dir, path=None):
+    # Backfill from a saved results/data directory, dated by file mtime
+    for trials_path in sorted(Path(data_dir).glob("*_trials.csv")):
+        run_id = append(trials_path, path)
+        status = "already stored" if run_id is None else f"run {run_id}"
+        print(f"{trials_path.name}: {status}")
+
+
+def runs(path=None):
+    import pandas as pd
+
+    with connect(path) as conn:
+        return pd.read_sql_query(
+            "SELECT run_id, name, timestamp, host, condy_commit, bench_commit "
+            "FROM runs ORDER BY timestamp",
+            conn,
+        )
+
+
+def query(metric, implementation=None, benchmark=None, name=None, host=None, path=None):
+    import pandas as pd
+
+    clauses = ["s.metric = ?"]
+    params = [metric]
+    for column, value in [
+        ("s.implementation", implementation),
+        ("s.benchmark", benchmark),
+        ("r.name", name),
+        ("r.host", host),
+    ]:
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    with connect(path) as conn:
+        return pd.read_sql_query(
+            "SELECT r.run_id, r.name, r.timestamp, r.host, r.condy_commit, "
+            "s.benchmark, s.implementation, s.program, s.binary_hash, s.point, "
+            "s.trial, s.value, s.outlier FROM samples s JOIN runs r USING (run_id) "
+            f"WHERE {' AND '.join(clauses)}",
+            conn,
+            params=params,
+        )
+
+
+def select_point(df, point):
+    # Keep rows whose point has every requested axis=value pair
+    wanted = set(point)
+    if not wanted:
+        return df
+    return df[df["point"].str.split().map(wanted.issubset)]
+
+
+def trend(df):
+    # One row per Condy commit in the order it was first measured
+    import pandas as pd
+
+    df = df.copy()
+    df["condy_commit"] = df["condy_commit"].fillna("unknown")
+    rows = []
+    for commit, group in df.groupby("condy_commit", sort=False):
+        row = {
+            "condy_commit": commit,
+            "first_run": group["timestamp"].min(),
+            "runs": group["run_id"].nunique(),
+            "trials": len(group),
+        }
+        row.update(stats.describe(group["value"].dropna()))
+        rows.append(row)
+    return pd.DataFrame(rows).sort_values("first_run", ignore_index=True)
+
+
+def draw_trend(df, title, ylabel, path):
+    from matplotlib import pyplot as plt
+
+    x = range(len(df))
+    plt.errorbar(
+        x,
+        df["mean"],
+        yerr=[df["mean"] - df["ci_low"], df["ci_high"] - df["mean"]],
+        capsize=3,
+        marker="o",
+        markerfacecolor="none",
+        markeredgewidth=2,
+    )
+    plt.xticks(x, [commit[:8] for commit in df["condy_commit"]], rotation=45)
+    plt.xlabel("Condy Commit")
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.grid(True, linestyle="--", alpha=0.5)
+    plt.tight_layout()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    plt.savefig(path, dpi=200, bbox_inches="tight")
+    plt.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the benchmark history")
+    parser.add_argument("--db", type=Path, default=db_path)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="Import a saved results/data tree")
+    add_parser.add_argument("data_dir", type=Path)
+
+    commands.add_parser("runs", help="List stored runs")
+
+    trend_parser = commands.add_parser(
+        "trend", help="Plot one metric of one configuration over Condy commits"
+    )
+    trend_parser.add_argument("metric", help="For example throughput_mbps")
+    trend_parser.add_argument("implementation", help="For example 'Condy(Fixed)'")
+    trend_parser.add_argument(
+        "point", nargs="*", help="Axis values to match, for example num_tasks=32"
+    )
+    trend_parser.add_argument("--name", help="Trials table, e.g. file_read_queue_depth")
+    trend_parser.add_argument("--benchmark")
+    trend_parser.add_argument(
+        "--host", help="Host fingerprint as listed by runs (default: any host)"
+    )
+    args = parser.parse_args()
+
+    if args.command == "add":
+        import_dir(args.data_dir, args.db)
+    elif args.command == "runs":
+        print(runs(args.db).to_string(index=False))
+    else:
+        df = query(
+            args.metric,
+            args.implementation,
+            args.benchmark,
+            args.name,
+            args.host,
+            args.db,
+        )
+        df = select_point(df, args.point)
+        if df.empty:
+            print("No matching samples")
+            sys.exit(1)
+        points = df["point"].unique()
+        if len(points) > 1 or df["name"].nunique() > 1:
+            print(
+                "The selection spans several configurations, narrow it down with "
+                "axis values or --name:"
+            )
+            print(df[["name", "point"]].drop_duplicates().to_string(index=False))
+            sys.exit(1)
+        df = trend(df)
+        print(df.to_string(index=False, float_format="{:.4g}".format))
+        title = " ".join([args.implementation] + list(points)).strip()
+        name = "_".join([args.metric, args.implementation] + args.point)
+        name = re.sub(r"[^A-Za-z0-9.=-]+", "_", name).strip("_")
+        path = fig_dir / "trends" / f"{name}.png"
+        draw_trend(df, title, args.metric, path)
+        print(f"saved {path}")
@@ -0,0 +1,66 @@
+import ctypes
+import mmap
+import os
+import numpy as np
+
+libc = ctypes.CDLL(None, use_errno=True)
+libc.mmap.restype = ctypes.c_void_p
+libc.mmap.argtypes = [
+    ctypes.c_void_p,
+    ctypes.c_size_t,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_long,
+]
+libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+
+map_failed = ctypes.c_void_p(-1).value
+
+# Residency above this after eviction means the cache was not cold
+max_residency = 0.01
+max_attempts = 3
+
+
+def residency(path):
+    # Fraction of the file's pages in the page cache, from mincore on an mmap
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return 0.0
+        addr = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if addr == map_failed:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"mmap {path}: {os.strerror(errno)}")
+        try:
+            pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+            vec = ctypes.create_string_buffer(pages)
+            if libc.mincore(addr, size, vec) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"mincore {path}: {os.strerror(errno)}")
+            resident = int((np.frombuffer(vec.raw, np.uint8) & 1).sum())
+        finally:
+            libc.munmap(addr, size)
+        return resident / pages
+    finally:
+        os.close(fd)
+
+
+def evict(path):
+    # Drops only this file's pages, no root needed and the rest of the host
+    # cache stays warm. Dirty pages are not dropped, so flush them first.
+    for _ in range(max_attempts):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fdatasync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        fraction = residency(path)
+        if fraction <= max_residency:
+            break
+    else:
+        print(f"WARNING: {fraction:.1%} of {path} still cached after eviction")
+    return fraction
@@ -0,0 +1,240 @@
+import argparse
+import shlex
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import channel
+import compare
+import post
+import sampler
+import spawn
+import stats
+import sweep
+from utils import benchmark_dir, data_dir
+
+condy_dir = Path("./third_party/condy")
+build_dir = Path("./build")
+
+# Configurations that only depend on a CPU, keyed like the trials tables
+specs = {
+    "spawn_number_of_tasks": spawn.num_tasks_spec,
+    "post_switch_times": post.switch_times_spec,
+    "channel_number_of_messages": channel.num_messages_spec,
+    "channel_task_pairs": channel.task_pairs_spec,
+}
+
+min_trials = 5
+max_trials = 30
+
+
+def git(*args):
+    result = subprocess.run(
+        ["git", "-C", str(condy_dir), *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip()
+
+
+def candidates(good, bad):
+    # Commits after good up to and including bad, oldest first
+    return git("rev-list", "--reverse", "--ancestry-path", f"{good}..{bad}").split()
+
+
+def build(commit, target):
+    # Reconfigure so CONDY_COMMIT in the record follows the checkout, then
+    # rebuild only the benchmark being bisected
+    git("checkout", "--quiet", commit)
+    subprocess.run(
+        ["cmake", "-B", str(build_dir), "-S", "."], check=True, capture_output=True
+    )
+    subprocess.run(
+        ["cmake", "--build", str(build_dir), "--target", target, "-j"],
+        check=True,
+        capture_output=True,
+    )
+
+
+def failure(error):
+    # A failed git or cmake step, with whatever it printed
+    output = error.stderr or error.stdout or ""
+    if isinstance(output, bytes):
+        output = output.decode(errors="replace")
+    return f"{shlex.join(str(arg) for arg in error.cmd)} failed:\n{output.strip()}"
+
+
+def find_point(spec, implementation, point):
+    wanted = dict(item.split("=", maxsplit=1) for item in point)
+    for candidate in sweep.expand(spec):
+        axes = {axis: str(value) for axis, value in candidate["axes"].items()}
+        if candidate["implementation"] == implementation and all(
+            axes.get(axis) == value for axis, value in wanted.items()
+        ):
+            # Only the C++ binaries are CMake targets built against the
+            # Condy checkout; the Rust ones never change with it
+            if Path(candidate["program"]).parent != benchmark_dir:
+                raise ValueError(
+                    f"{implementation} is not built against Condy, "
+                    f"only the C++ implementations can be bisected"
+                )
+            return candidate
+    raise ValueError(f"no {implementation} point with {' '.join(point)}")
+
+
+def measure(spec, point, metric, samples, count):
+    while len(samples) < count:
+        samples.append(sweep.run_point(spec, point)[metric])
+    return samples
+
+
+def regression(good, samples, metric):
+    # Relative change of the mean oriented so that positive is worse, with
+    # its bootstrap confidence interval
+    low, high = stats.bootstrap_ratio(good, samples)
+    sign = -compare.direction(metric)
+    change = (np.mean(samples) / np.mean(good) - 1) * sign
+    low, high = sorted([low * sign, high * sign])
+    return change, low, high
+
+
+def classify(spec, point, metric, good, threshold):
+    # A commit is bad when its slowdown against the good commit is confidently
+    # above half the threshold, good when confidently below, otherwise more
+    # trials are taken; at max_trials the point estimate decides
+    samples = measure(spec, point, metric, [], min_trials)
+    while True:
+        change, low, high = regression(good, samples, metric)
+        if low > threshold / 2:
+            return "bad", True, change, low, high, samples
+        if high < threshold / 2:
+            return "good", True, change, low, high, samples
+        if len(samples) >= max_trials:
+            verdict = "bad" if change > threshold / 2 else "good"
+            return verdict, False, change, low, high, samples
+        measure(spec, point, metric, samples, len(samples) + 1)
+
+
+def bisect(name, good, bad, implementation, point, metric, threshold):
+    spec = specs[name]()
+    point = find_point(spec, implementation, point)
+    target = Path(point["program"]).name
+    if compare.direction(metric) == 0:
+        raise ValueError(f"{metric} has no direction, pick a time or rate metric")
+    commits = candidates(good, bad)
+    if not commits:
+        raise ValueError(f"{bad} does not descend from {good}")
+    print(f"bisecting {len(commits)} commits on {target} {metric}")
+
+    log = []
+
+    def record(commit, verdict, certain, change, low, high, samples):
+        log.append(
+            {
+                "commit": commit,
+                "verdict": verdict,
+                "certain": certain,
+                "change": change,
+                "ci_low": low,
+                "ci_high": high,
+                "trials": len(samples),
+                "mean": np.mean(samples),
+            }
+        )
+        print(
+            f"{commit[:12]} {verdict}{'' if certain else '?'} "
+            f"{change:+.1%} [{low:+.1%}, {high:+.1%}] over {len(samples)} trials"
+        )
+
+    original = git("rev-parse", "HEAD")
+    try:
+        # Both ends are measured first: the good samples are the reference for
+        # every other commit, and bisecting is pointless unless bad reproduces
+        build(good, target)
+        good_samples = measure(spec, point, metric, [], max_trials)
+        record(good, "good", True, 0.0, 0.0, 0.0, good_samples)
+
+        build(bad, target)
+        verdict, certain, *rest = classify(spec, point, metric, good_samples, threshold)
+        record(bad, verdict, certain, *rest)
+        if verdict != "bad" or not certain:
+            raise RuntimeError(
+                f"{bad[:12]} is only {rest[0]:+.1%} worse than {good[:12]}, "
+                f"no regression of {threshold:.0%} to bisect"
+            )
+
+        # commits[lo] is known good (-1 stands for good itself), commits[hi]
+        # known bad
+        lo, hi = -1, len(commits) - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            build(commits[mid], target)
+            verdict, *rest = classify(spec, point, metric, good_samples, threshold)
+            record(commits[mid], verdict, *rest)
+            if verdict == "bad":
+                hi = mid
+            else:
+                lo = mid
+    finally:
+        # Report a failed restore without hiding what ended the bisection
+        try:
+            build(original, target)
+        except subprocess.CalledProcessError as e:
+            print(f"could not restore {original[:12]}: {failure(e)}", file=sys.stderr)
+        pd.DataFrame(log).to_csv(data_dir / f"bisect_{name}.csv", index=False)
+
+    uncertain = [entry["commit"][:12] for entry in log if not entry["certain"]]
+    return commits[hi], uncertain
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find the Condy commit that made one benchmark point slower"
+    )
+    parser.add_argument("good", help="Condy commit without the regression")
+    parser.add_argument("bad", help="Condy commit with the regression")
+    parser.add_argument("name", choices=list(specs), help="Benchmark configuration")
+    parser.add_argument(
+        "point", nargs="+", help="Axis values of the point, for example num_tasks=32"
+    )
+    parser.add_argument("--implementation", default="Condy")
+    parser.add_argument("--metric", default="time_ms")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.05,
+        help="Relative slowdown of bad over good that is being chased "
+        "(default 0.05); commits are split at half of it",
+    )
+    parser.add_argument("--min-trials", type=int, default=min_trials)
+    parser.add_argument("--max-trials", type=int, default=max_trials)
+    args = parser.parse_args()
+    min_trials = args.min_trials
+    max_trials = args.max_trials
+    # Timelines are not kept, so do not pay for sampling them
+    sampler.enabled = False
+
+    try:
+        commit, uncertain = bisect(
+            args.name,
+            git("rev-parse", args.good),
+            git("rev-parse", args.bad),
+            args.implementation,
+            args.point,
+            args.metric,
+            args.threshold,
+        )
+    except (ValueError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    except subprocess.CalledProcessError as e:
+        print(failure(e), file=sys.stderr)
+        sys.exit(1)
+    print(f"first bad commit: {git('log', '-1', '--oneline', commit)}")
+    if uncertain:
+        print(
+            f"WARNING: {', '.join(uncertain)} could not be classified with "
+            f"confidence in {max_trials} trials, the result may be off"
+        )
@@ -1,9 +1,8 @@
-import subprocess
-from matplotlib import pyplot as plt
+import record
+import rusage
 from pathlib import Path
-from utils import process_output, benchmark_dir, benchmark_rust_dir, fig_dir, data_dir
-import pandas as pd
-
+from utils import benchmark_dir, benchmark_rust_dir, fig_dir, data_dir
+from sweep import implementation, execute, summarize, pivot, pivot_errors, save_trials
 
 post_condy = benchmark_dir / "post_condy"
 post_asio = benchmark_dir / "post_asio"
@@ -11,7 +10,7 @@ post_compio = benchmark_rust_dir / "post_compio"
 post_monoio = benchmark_rust_dir / "post_monoio"
 
 
-def run_post(program, num):
+def post_commands(program, num, cpus="0"):
     args = [
         "sudo",
         "nice",
@@ -19,31 +18,42 @@ def run_post(program, num):
         "-20",
         "taskset",
         "-c",
-        "0",
+        cpus,
         str(program),
+        "-j",
         "-n",
         str(num),
     ]
+    return [args]
+
+
+def run_post(program, num, cpus="0"):
+    [args] = post_commands(program, num, cpus)
     print(args)
-    result = subprocess.run(args, capture_output=True, text=True)
-    return result.stdout
+    stdout, usage, timeline = rusage.run(args)
+    rec = record.parse(stdout)
+    rec["timeline"] = timeline
+    return rusage.add_cpu_metrics(rec, usage, num)
 
 
-def draw_nm_plot(df_nm):
+def draw_nm_plot(df_nm, spec):
     import numpy as np
+    from matplotlib import pyplot as plt
 
     markers = ["o", "s", "d"]
-    labels = ["Condy", "Asio", "Monoio"]
-    columns = ["condy_time_ms", "asio_time_ms", "monoio_time_ms"]
+    wide = pivot(df_nm, spec, "num", "time_ms")
+    errors = pivot_errors(df_nm, spec, "num", "time_ms")
 
-    x = np.arange(len(df_nm))
-    for i, col in enumerate(columns):
-        plt.plot(
+    x = np.arange(len(wide))
+    for i, label in enumerate(wide.columns):
+        plt.errorbar(
             x,
-            df_nm[col],
-            marker=markers[i],
+            wide[label],
+            yerr=errors[label],
+            capsize=3,
+            marker=markers[i % len(markers)],
             linestyle="-",
-            label=labels[i],
+            label=label,
             markersize=8,
             markerfacecolor="none",
             markeredgewidth=2,
@@ -51,7 +61,7 @@ def draw_nm_plot(df_nm):
 
     plt.xlabel("Switch Times")
     plt.ylabel("Time (ms)")
-    plt.xticks(x, df_nm["switch_times"])
+    plt.xticks(x, wide.index)
     plt.yscale("log")
     plt.legend()
     plt.grid(True, linestyle="--", alpha=0.5)
@@ -64,43 +74,34 @@ def draw_nm_plot(df_nm):
     plt.close()
 
 
+def switch_times_spec():
+    return {
+        "name": "post",
+        "runner": run_post,
+        "commands": post_commands,
+        "cpus": 1,
+        "metrics": ["time_ms"] + rusage.metrics,
+        "converge_on": ["time_ms"],
+        "implementations": [
+            implementation("Condy", post_condy),
+            implementation("Asio", post_asio),
+            # implementation("Compio", post_compio),
+            implementation("Monoio", post_monoio),
+        ],
+        "axes": {"num": [524288, 1048576, 2097152, 4194304, 8388608]},
+    }
+
+
 def run():
-    num_messages = [524288, 1048576, 2097152, 4194304, 8388608]
-
-    condy_results = []
-    asio_results = []
-    # compio_time = []
-    monoio_time = []
-
-    for nm in num_messages:
-        output = run_post(post_condy, nm)
-        output = process_output(output)
-        condy_results.append(float(output["time_ms"]))
-
-        output = run_post(post_asio, nm)
-        output = process_output(output)
-        asio_results.append(float(output["time_ms"]))
-
-        # output = run_post(post_compio, nm)
-        # output = process_output(output)
-        # compio_time.append(float(output["time_ms"]))
-
-        output = run_post(post_monoio, nm)
-        output = process_output(output)
-        monoio_time.append(float(output["time_ms"]))
-
-    df_nm = pd.DataFrame(
-        {
-            "switch_times": num_messages,
-            "condy_time_ms": condy_results,
-            "asio_time_ms": asio_results,
-            # "compio_time_ms": compio_time,
-            "monoio_time_ms": monoio_time,
-        }
-    )
+    spec = switch_times_spec()
+    trials_nm = execute(spec)
+    if trials_nm is None:
+        return
+    save_trials(trials_nm, "post_switch_times")
+    df_nm = summarize(trials_nm, spec)
     df_nm.to_csv(data_dir / "post_switch_times.csv", index=False)
 
-    draw_nm_plot(df_nm)
+    draw_nm_plot(df_nm, spec)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+import functools
+import json
+import numbers
+import subprocess
+from pathlib import Path
+
+# Must match REPORT_SCHEMA_VERSION in benchmarks/common/report.hpp and
+# SCHEMA_VERSION in benchmarks_rust/src/lib.rs
+schema_version = 1
+
+# Top-level fields every record carries and their types
+schema = {
+    "schema_version": int,
+    "benchmark": str,
+    "implementation": str,
+    "timestamp": int,
+    "config": dict,
+    "env": dict,
+    "metrics": dict,
+}
+
+# Fields only some records carry
+optional = {"intervals": dict}
+
+
+def validate(record):
+    for field, kind in {**schema, **optional}.items():
+        if field not in record:
+            if field in schema:
+                raise ValueError(f"record is missing {field!r}")
+            continue
+        if not isinstance(record[field], kind):
+            raise ValueError(
+                f"record field {field!r} is {type(record[field]).__name__}, "
+                f"expected {kind.__name__}"
+            )
+    if record["schema_version"] != schema_version:
+        raise ValueError(
+            f"unsupported record schema version {record['schema_version']}, "
+            f"expected {schema_version}"
+        )
+    for name, value in record["metrics"].items():
+        # Non-finite metrics are emitted as null
+        if value is not None and (
+            isinstance(value, bool) or not isinstance(value, numbers.Real)
+        ):
+            raise ValueError(f"metric {name!r} is not a number: {value!r}")
+    return record
+
+
+@functools.cache
+def bench_commit():
+    # Read when the benchmark runs rather than compiled into the binaries, so
+    # a commit to this repository leaves their hashes and cached results alone
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return result.stdout.strip()
+
+
+def parse(output):
+    # Benchmarks started with -j print exactly one JSON line; banners,
+    # warnings and anything else on stdout are ignored
+    records = []
+    for line in output.splitlines():
+        line = line.strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    if len(records) != 1:
+        raise ValueError(f"expected one JSON record, found {len(records)}")
+    record = validate(records[0])
+    record["env"]["bench_commit"] = bench_commit()
+    return record
+
+
+def metric(record, name):
+    if name not in record["metrics"]:
+        raise ValueError(
+            f"{record['benchmark']}/{record['implementation']} "
+            f"did not report {name!r}"
+        )
+    value = record["metrics"][name]
+    return float("nan") if value is None else float(value)
+
+
+def provenance(record):
+    # Flat columns describing what produced a result, for the trials CSVs
+    columns = {"schema_version": record["schema_version"]}
+    columns.update({f"env.{k}": v for k, v in record["env"].items()})
+    columns.update({f"config.{k}": v for k, v in record["config"].items()})
+    return columns
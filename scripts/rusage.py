@@ -0,0 +1,85 @@
+import os
+import signal
+import subprocess
+import tempfile
+from pathlib import Path
+import sampler
+
+# Columns added to every record; CPU time covers all threads of the
+# benchmark, including io_uring's iou-sqp poller, and every descendant
+# reaped on the way up (sudo, nice, taskset). max_rss_kb comes from the
+# binary itself, the wait4 value includes this process's RSS from the fork.
+metrics = [
+    "cpu_user_s",
+    "cpu_sys_s",
+    "vol_ctx_switches",
+    "invol_ctx_switches",
+    "max_rss_kb",
+    "cpu_us_per_op",
+    "ops_per_cpu_s",
+]
+
+
+def usage_metrics(usage):
+    return {
+        "cpu_user_s": usage.ru_utime,
+        "cpu_sys_s": usage.ru_stime,
+        "vol_ctx_switches": usage.ru_nvcsw,
+        "invol_ctx_switches": usage.ru_nivcsw,
+    }
+
+
+def wait(proc):
+    # Reaps proc with wait4 so its rusage is not lost to Popen.wait
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return usage_metrics(usage)
+
+
+def terminate(proc):
+    # Popen.terminate polls first, which would reap the child and drop its
+    # rusage; a zombie can still be signalled safely
+    os.kill(proc.pid, signal.SIGTERM)
+    return wait(proc)
+
+
+def peak_rss_kb(pid):
+    # Largest VmHWM in a still running process tree
+    peak = 0
+    for p in sampler.descendants(pid):
+        try:
+            status = Path(f"/proc/{p}/status").read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith("VmHWM:"):
+                peak = max(peak, int(line.split()[1]))
+    return peak
+
+
+def run(args, disk=None):
+    # subprocess.run(args, capture_output=True, text=True, check=True) that
+    # also returns the rusage of the whole process tree and its timeline
+    # from the sampler. Output goes through temp files so nothing has to
+    # wait on the child besides wait4.
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(args, stdout=out, stderr=err)
+        sampling = sampler.start(proc.pid, disk)
+        usage = wait(proc)
+        timeline = sampler.stop(sampling)
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read().decode()
+        stderr = err.read().decode()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, args, stdout, stderr)
+    return stdout, usage, timeline
+
+
+def add_cpu_metrics(rec, usage, ops):
+    # Cores are the cost: CPU per operation and operations per CPU second
+    rec["metrics"].update(usage)
+    cpu_s = usage["cpu_user_s"] + usage["cpu_sys_s"]
+    rec["metrics"]["cpu_us_per_op"] = cpu_s * 1e6 / ops if ops else None
+    rec["metrics"]["ops_per_cpu_s"] = ops / cpu_s if cpu_s else None
+    return rec
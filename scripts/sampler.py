@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+interval = 0.1  # Seconds between samples
+enabled = True
+clock_ticks = os.sysconf("SC_CLK_TCK")
+sector_size = 512  # /proc/diskstats always counts 512-byte sectors
+
+
+def descendants(pid):
+    pids = [pid]
+    i = 0
+    while i < len(pids):
+        for children in Path(f"/proc/{pids[i]}/task").glob("*/children"):
+            try:
+                pids += [int(child) for child in children.read_text().split()]
+            except OSError:
+                pass
+        i += 1
+    return pids
+
+
+def read_fields(path):
+    # "key: value [kB]" files such as status, io and meminfo
+    fields = {}
+    for line in Path(path).read_text().splitlines():
+        key, _, value = line.partition(":")
+        value = value.split()
+        if value and value[0].isdigit():
+            fields[key] = int(value[0])
+    return fields
+
+
+def process_counters(pid):
+    # stat is parsed after the last ')' since comm may contain spaces. CPU
+    # time and faults include reaped children, so summing them over the tree
+    # stays monotonic when a process in it exits; io does so by itself.
+    stat = Path(f"/proc/{pid}/stat").read_text()
+    stat = stat[stat.rindex(")") + 2 :].split()
+    status = read_fields(f"/proc/{pid}/status")
+    counters = {
+        "cpu_s": sum(int(ticks) for ticks in stat[11:15]) / clock_ticks,
+        "major_faults": int(stat[9]) + int(stat[10]),
+        "threads": int(stat[17]),
+        "rss_kb": status.get("VmRSS", 0),
+    }
+    # io is only readable by the owner, so it is missing for sudo'd runs
+    # unless the harness itself runs as root
+    try:
+        io = read_fields(f"/proc/{pid}/io")
+        counters.update(
+            read_bytes=io["read_bytes"],
+            write_bytes=io["write_bytes"],
+            rchar=io["rchar"],
+            wchar=io["wchar"],
+        )
+    except (OSError, KeyError):
+        pass
+    return counters
+
+
+def disk_counters(device):
+    major, minor = device
+    with open("/proc/diskstats") as f:
+        for line in f:
+            fields = line.split()
+            if (int(fields[0]), int(fields[1])) == (major, minor):
+                return {
+                    "disk_read_bytes": int(fields[5]) * sector_size,
+                    "disk_write_bytes": int(fields[9]) * sector_size,
+                    "disk_in_flight": int(fields[11]),
+                    "disk_busy_ms": int(fields[12]),
+                }
+    return {}
+
+
+def device_of(path):
+    # Files on device-mapper, btrfs or tmpfs may not map to a diskstats row,
+    # the disk columns are then simply absent
+    st_dev = os.stat(path).st_dev
+    return os.major(st_dev), os.minor(st_dev)
+
+
+def snapshot(pid, device):
+    # Counters of the whole tree, so the benchmark is covered behind sudo,
+    # nice and taskset
+    sample = {}
+    for p in descendants(pid):
+        try:
+            counters = process_counters(p)
+        except (OSError, ValueError, IndexError):
+            continue
+        for key, value in counters.items():
+            sample[key] = sample.get(key, 0) + value
+    if not sample:
+        return None
+    if device is not None:
+        sample.update(disk_counters(device))
+    # Dirty and writeback pages expose background flushing during a run
+    meminfo = read_fields("/proc/meminfo")
+    sample["dirty_kb"] = meminfo.get("Dirty", 0)
+    sample["writeback_kb"] = meminfo.get("Writeback", 0)
+    return sample
+
+
+def sample_loop(handle):
+    start = time.monotonic()
+    deadline = start
+    while True:
+        sample = snapshot(handle["pid"], handle["device"])
+        if sample is not None:
+            sample["t"] = time.monotonic() - start
+            handle["samples"].append(sample)
+        # Sleep to the next tick rather than for a fixed time, so slow /proc
+        # reads do not stretch the interval
+        deadline += interval
+        if handle["stop"].wait(max(0.0, deadline - time.monotonic())):
+            break
+
+
+def start(pid, disk=None):
+    # Samples pid and its descendants every `interval` seconds until stop().
+    # `disk` is a path whose block device is sampled alongside.
+    handle = {
+        "pid": pid,
+        "device": device_of(disk) if disk is not None else None,
+        "samples": [],
+        "stop": threading.Event(),
+    }
+    if enabled:
+        handle["thread"] = threading.Thread(
+            target=sample_loop, args=(handle,), daemon=True
+        )
+        handle["thread"].start()
+    return handle
+
+
+def stop(handle):
+    if "thread" not in handle:
+        return None
+    handle["stop"].set()
+    handle["thread"].join()
+    return handle["samples"]
+
+
+def frame(samples):
+    # Counters stay cumulative, rates are derived per interval
+    import pandas as pd
+
+    df = pd.DataFrame(samples)
+    df = df[["t"] + [column for column in df.columns if column != "t"]]
+    dt = df["t"].diff()
+    df["cpu_util"] = df["cpu_s"].diff() / dt
+    for column in ["read_bytes", "write_bytes", "disk_read_bytes", "disk_write_bytes"]:
+        if column in df:
+            df[column.replace("bytes", "mbps")] = df[column].diff() / dt / 2**20
+    if "disk_busy_ms" in df:
+        df["disk_util"] = df["disk_busy_ms"].diff() / 1000 / dt
+    return df
+
+
+def plot(df, title, path):
+    from matplotlib import pyplot as plt
+
+    panels = [
+        ("CPU (cores)", ["cpu_util"]),
+        ("MB/s", ["read_mbps", "write_mbps", "disk_read_mbps", "disk_write_mbps"]),
+        ("Device busy", ["disk_util"]),
+        ("MB", ["rss_kb", "dirty_kb", "writeback_kb"]),
+    ]
+    panels = [
+        (ylabel, [column for column in columns if column in df])
+        for ylabel, columns in panels
+    ]
+    panels = [(ylabel, columns) for ylabel, columns in panels if columns]
+
+    fig, axes = plt.subplots(
+        len(panels), 1, sharex=True, squeeze=False, figsize=(8, 2 * len(panels))
+    )
+    for ax, (ylabel, columns) in zip(axes[:, 0], panels):
+        for column in columns:
+            scale = 1 / 1024 if column.endswith("_kb") else 1
+            ax.plot(df["t"], df[column] * scale, label=column)
+        ax.set_ylabel(ylabel)
+        ax.legend(loc="upper right", fontsize="small")
+        ax.grid(True, linestyle="--", alpha=0.5)
+    axes[-1, 0].set_xlabel("Time (s)")
+    fig.suptitle(title)
+    fig.tight_layout()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(path, dpi=200, bbox_inches="tight")
+    plt.close(fig)
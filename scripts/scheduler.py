@@ -0,0 +1,111 @@
+import os
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+import stats
+
+cpu_root = Path("/sys/devices/system/cpu/")
+
+
+def read_int(path, default=None):
+    try:
+        return int(path.read_text().strip())
+    except (OSError, ValueError):
+        return default
+
+
+def physical_cores():
+    # One entry per physical core, each listing its SMT siblings and L3 domain
+    allowed = os.sched_getaffinity(0)
+    cores = {}
+    for cpu in sorted(allowed):
+        cpu_dir = cpu_root / f"cpu{cpu}"
+        package = read_int(cpu_dir / "topology/physical_package_id", 0)
+        core_id = read_int(cpu_dir / "topology/core_id", cpu)
+        l3 = read_int(cpu_dir / "cache/index3/id", package)
+        core = cores.setdefault((package, core_id), {"cpus": [], "l3": l3})
+        core["cpus"].append(cpu)
+    return sorted(cores.values(), key=lambda core: core["cpus"][0])
+
+
+def cpu_slots(width=1, isolate_l3=False, reserve=1):
+    # Disjoint CPU lists of `width` physical cores each. Only the first SMT
+    # thread of a core is handed out so no two runs share a core. The first
+    # `reserve` cores are left to the harness and the OS.
+    cores = physical_cores()
+    if len(cores) > reserve:
+        cores = cores[reserve:]
+
+    if isolate_l3:
+        groups = defaultdict(list)
+        for core in cores:
+            groups[core["l3"]].append(core)
+        chunks = [group[:width] for group in groups.values() if len(group) >= width]
+    else:
+        chunks = [cores[i : i + width] for i in range(0, len(cores) - width + 1, width)]
+
+    slots = [",".join(str(core["cpus"][0]) for core in chunk) for chunk in chunks]
+    if not slots:
+        slots = [",".join(str(core["cpus"][0]) for core in cores[:width])]
+    return slots
+
+
+def device_of(path):
+    return f"dev:{os.stat(path).st_dev}"
+
+
+def run_parallel(spec, plan, work, isolate_l3=False):
+    # Runs work(point, cpus) for every point, one point per CPU slot at a time.
+    # Points that map to the same spec["resource"] key never overlap.
+    slots = cpu_slots(spec["cpus"], isolate_l3)
+    free = queue.Queue()
+    for slot in slots:
+        free.put(slot)
+
+    resource = spec.get("resource")
+    locks = defaultdict(threading.Lock)
+    locks_guard = threading.Lock()
+
+    def job(point):
+        key = resource(point["params"]) if resource else None
+        if key is None:
+            lock = nullcontext()
+        else:
+            with locks_guard:
+                lock = locks[key]
+        with lock:
+            cpus = free.get()
+            try:
+                return work(point, cpus)
+            finally:
+                free.put(cpus)
+
+    print(f"Running {len(plan)} points on {len(slots)} CPU slots: {slots}")
+    with ThreadPoolExecutor(max_workers=len(slots)) as pool:
+        return list(pool.map(job, plan))
+
+
+def compare(spec, plan, parallel_samples, serial_samples):
+    # Parallel and serial results agree when their 95% CIs overlap
+    mismatches = []
+    for point, par, ser in zip(plan, parallel_samples, serial_samples):
+        for metric in spec["metrics"]:
+            par_low, par_high = stats.confidence_interval([s[metric] for s in par])
+            ser_low, ser_high = stats.confidence_interval([s[metric] for s in ser])
+            if par_high < ser_low or ser_high < par_low:
+                mismatches.append((point, metric, par_low, par_high, ser_low, ser_high))
+
+    for point, metric, par_low, par_high, ser_low, ser_high in mismatches:
+        print(
+            f"MISMATCH {point['implementation']} {point['axes']} {metric}: "
+            f"parallel [{par_low:.2f}, {par_high:.2f}] "
+            f"serial [{ser_low:.2f}, {ser_high:.2f}]"
+        )
+    print(
+        f"Validation: {len(plan) - len({id(m[0]) for m in mismatches})}/{len(plan)} "
+        f"points consistent between parallel and serial runs"
+    )
+    return not mismatches
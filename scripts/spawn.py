@@ -1,8 +1,8 @@
-import subprocess
-from matplotlib import pyplot as plt
+import record
+import rusage
 from pathlib import Path
-from utils import process_output, benchmark_dir, benchmark_rust_dir, fig_dir, data_dir
-import pandas as pd
+from utils import benchmark_dir, benchmark_rust_dir, fig_dir, data_dir
+from sweep import implementation, execute, summarize, pivot, pivot_errors, save_trials
 
 spawn_condy = benchmark_dir / "spawn_condy"
 spawn_asio = benchmark_dir / "spawn_asio"
@@ -10,7 +10,12 @@ spawn_compio = benchmark_rust_dir / "spawn_compio"
 spawn_monoio = benchmark_rust_dir / "spawn_monoio"
 
 
-def run_spawn(program, num_tasks):
+malloc_count = benchmark_dir / "libmalloc_count.so"
+
+
+def spawn_commands(
+    program, num_tasks, keep_alive=False, count_allocations=False, cpus="0"
+):
     args = [
         "sudo",
         "nice",
@@ -18,31 +23,68 @@ def run_spawn(program, num_tasks):
         "-20",
         "taskset",
         "-c",
-        "0",
+        cpus,
+    ]
+    if count_allocations:
+        # sudo drops LD_PRELOAD, so set it on the far side
+        args += ["env", f"LD_PRELOAD={malloc_count.resolve()}"]
+    args += [
         str(program),
+        "-j",
         "-n",
         str(num_tasks),
     ]
+    if keep_alive:
+        args.append("-a")
+    return [args]
+
+
+def add_memory_metrics(rec, num_tasks):
+    # Footprint of one suspended task: the RSS growth over the baseline the
+    # binary took just before spawning, and the allocations made since then
+    metrics = rec["metrics"]
+    peak_rss_kb = metrics.get("peak_rss_kb")
+    rss_baseline_kb = metrics.get("rss_baseline_kb")
+    allocations = metrics.get("allocations")
+    metrics["bytes_per_task"] = (
+        (peak_rss_kb - rss_baseline_kb) * 1024 / num_tasks
+        if peak_rss_kb is not None and rss_baseline_kb is not None and num_tasks
+        else None
+    )
+    metrics["allocations_per_task"] = (
+        allocations / num_tasks if allocations is not None and num_tasks else None
+    )
+    return rec
+
+
+def run_spawn(program, num_tasks, keep_alive=False, count_allocations=False, cpus="0"):
+    [args] = spawn_commands(program, num_tasks, keep_alive, count_allocations, cpus)
     print(args)
-    result = subprocess.run(args, capture_output=True, text=True)
-    return result.stdout
+    stdout, usage, timeline = rusage.run(args)
+    rec = record.parse(stdout)
+    rec["timeline"] = timeline
+    add_memory_metrics(rec, num_tasks)
+    return rusage.add_cpu_metrics(rec, usage, num_tasks)
 
 
-def draw_nt_plot(df_nt):
+def draw_nt_plot(df_nt, spec):
     import numpy as np
+    from matplotlib import pyplot as plt
 
     markers = ["o", "s", "^", "d"]
-    labels = ["Condy", "Asio", "Compio", "Monoio"]
-    columns = ["condy_time_ms", "asio_time_ms", "compio_time_ms", "monoio_time_ms"]
+    wide = pivot(df_nt, spec, "num_tasks", "time_ms")
+    errors = pivot_errors(df_nt, spec, "num_tasks", "time_ms")
 
-    x = np.arange(len(df_nt))
-    for i, col in enumerate(columns):
-        plt.plot(
+    x = np.arange(len(wide))
+    for i, label in enumerate(wide.columns):
+        plt.errorbar(
             x,
-            df_nt[col],
-            marker=markers[i],
+            wide[label],
+            yerr=errors[label],
+            capsize=3,
+            marker=markers[i % len(markers)],
             linestyle="-",
-            label=labels[i],
+            label=label,
             markersize=8,
             markerfacecolor="none",
             markeredgewidth=2,
@@ -50,7 +92,7 @@ def draw_nt_plot(df_nt):
 
     plt.xlabel("Number of Tasks")
     plt.ylabel("Time (ms)")
-    plt.xticks(x, df_nt["num_tasks"])
+    plt.xticks(x, wide.index)
     plt.yscale("log")
     plt.legend()
     plt.grid(True, linestyle="--", alpha=0.5)
@@ -63,43 +105,109 @@ def draw_nt_plot(df_nt):
     plt.close()
 
 
-def run():
-    num_tasks = [131072, 262144, 524288, 1048576, 2097152, 4194304]
-
-    condy_results = []
-    asio_results = []
-    compio_results = []
-    monoio_results = []
-
-    for nt in num_tasks:
-        output = run_spawn(spawn_condy, nt)
-        output = process_output(output)
-        condy_results.append(float(output["time_ms"]))
-
-        output = run_spawn(spawn_asio, nt)
-        output = process_output(output)
-        asio_results.append(float(output["time_ms"]))
-
-        output = run_spawn(spawn_compio, nt)
-        output = process_output(output)
-        compio_results.append(float(output["time_ms"]))
-
-        output = run_spawn(spawn_monoio, nt)
-        output = process_output(output)
-        monoio_results.append(float(output["time_ms"]))
-
-    df_nt = pd.DataFrame(
-        {
-            "num_tasks": num_tasks,
-            "condy_time_ms": condy_results,
-            "asio_time_ms": asio_results,
-            "compio_time_ms": compio_results,
-            "monoio_time_ms": monoio_results,
-        }
+def draw_memory_plot(df, spec):
+    import numpy as np
+    from matplotlib import pyplot as plt
+
+    markers = ["o", "s", "^", "d"]
+    panels = [
+        ("bytes_per_task", "Resident Bytes per Task"),
+        ("allocations_per_task", "Allocations per Task"),
+    ]
+    fig, axes = plt.subplots(1, len(panels), figsize=(12, 4.5))
+    for ax, (metric, ylabel) in zip(axes, panels):
+        wide = pivot(df, spec, "num_tasks", metric)
+        errors = pivot_errors(df, spec, "num_tasks", metric)
+        x = np.arange(len(wide))
+        for i, label in enumerate(wide.columns):
+            ax.errorbar(
+                x,
+                wide[label],
+                yerr=errors[label],
+                capsize=3,
+                marker=markers[i % len(markers)],
+                linestyle="-",
+                label=label,
+                markersize=8,
+                markerfacecolor="none",
+                markeredgewidth=2,
+            )
+        ax.set_xlabel("Number of Live Tasks")
+        ax.set_ylabel(ylabel)
+        ax.set_xticks(x, wide.index)
+        ax.grid(True, linestyle="--", alpha=0.5)
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig(
+        fig_dir / "spawn_memory.png",
+        dpi=200,
+        bbox_inches="tight",
     )
+    plt.close(fig)
+
+
+def num_tasks_spec():
+    return {
+        "name": "spawn",
+        "runner": run_spawn,
+        "commands": spawn_commands,
+        "cpus": 1,
+        "metrics": ["time_ms"] + rusage.metrics,
+        "converge_on": ["time_ms"],
+        "implementations": [
+            implementation("Condy", spawn_condy),
+            implementation("Asio", spawn_asio),
+            implementation("Compio", spawn_compio),
+            implementation("Monoio", spawn_monoio),
+        ],
+        "axes": {
+            "num_tasks": [131072, 262144, 524288, 1048576, 2097152, 4194304],
+        },
+    }
+
+
+def memory_spec():
+    # Every task stays parked until all are spawned, so the peak RSS holds
+    # all of their frames at once
+    spec = num_tasks_spec()
+    spec["params"] = {"keep_alive": True, "count_allocations": True}
+    spec["metrics"] = [
+        "time_ms",
+        "rss_baseline_kb",
+        "peak_rss_kb",
+        "bytes_per_task",
+        "allocations_per_task",
+    ] + rusage.metrics
+    spec["converge_on"] = ["bytes_per_task"]
+    spec["axes"] = {
+        "num_tasks": [16384, 65536, 262144, 1048576],
+    }
+    return spec
+
+
+def run_memory():
+    spec = memory_spec()
+    trials = execute(spec)
+    if trials is None:
+        return
+    save_trials(trials, "spawn_memory")
+    df = summarize(trials, spec)
+    df.to_csv(data_dir / "spawn_memory.csv", index=False)
+    draw_memory_plot(df, spec)
+
+
+def run():
+    run_memory()
+
+    spec = num_tasks_spec()
+    trials_nt = execute(spec)
+    if trials_nt is None:
+        return
+    save_trials(trials_nt, "spawn_number_of_tasks")
+    df_nt = summarize(trials_nt, spec)
     df_nt.to_csv(data_dir / "spawn_number_of_tasks.csv", index=False)
 
-    draw_nt_plot(df_nt)
+    draw_nt_plot(df_nt, spec)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+import functools
+import math
+import numpy as np
+
+# Two-sided 95% critical values of Student's t, indexed by degrees of freedom
+t_975 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]  # fmt: skip
+
+
+def t_critical(df):
+    if df <= len(t_975):
+        return t_975[df - 1]
+    # First terms of the Cornish-Fisher expansion, accurate enough past 30
+    z = 1.959964
+    return z + (z**3 + z) / (4 * df)
+
+
+def confidence_interval(samples):
+    samples = np.asarray(samples, dtype=float)
+    mean = samples.mean()
+    if len(samples) < 2:
+        return mean, mean
+    half = t_critical(len(samples) - 1) * samples.std(ddof=1) / math.sqrt(len(samples))
+    return mean - half, mean + half
+
+
+def converged(samples, target):
+    # Relative half-width of the 95% CI is within target
+    low, high = confidence_interval(samples)
+    mean = (low + high) / 2
+    if mean == 0:
+        return high == low
+    return (high - low) / 2 <= target * abs(mean)
+
+
+def outliers(samples):
+    # Tukey fences at 1.5 IQR
+    samples = np.asarray(samples, dtype=float)
+    q1, q3 = np.percentile(samples, [25, 75])
+    iqr = q3 - q1
+    return (samples < q1 - 1.5 * iqr) | (samples > q3 + 1.5 * iqr)
+
+
+def describe(samples):
+    samples = np.asarray(samples, dtype=float)
+    low, high = confidence_interval(samples)
+    return {
+        "mean": samples.mean(),
+        "median": np.median(samples),
+        "std": samples.std(ddof=1) if len(samples) > 1 else 0.0,
+        "ci_low": low,
+        "ci_high": high,
+        "outliers": int(outliers(samples).sum()),
+    }
+
+
+def warmup_cutoff(series, max_fraction=0.5):
+    # MSER: drop the prefix that minimises the squared standard error of the
+    # mean of what is left, searched over the first half so a slow drift at
+    # the end cannot trim everything
+    series = np.asarray(series, dtype=float)
+    best, cutoff = math.inf, 0
+    for d in range(int(len(series) * max_fraction) + 1):
+        rest = series[d:]
+        score = rest.var() / len(rest)
+        if score < best:
+            best, cutoff = score, d
+    return cutoff
+
+
+@functools.cache
+def u_counts(n1, n2):
+    # Arrangements of n1 + n2 distinct values giving each Mann-Whitney U,
+    # the exact null distribution up to a factor of C(n1 + n2, n1)
+    if n1 == 0 or n2 == 0:
+        return np.ones(1)
+    counts = np.zeros(n1 * n2 + 1)
+    # The largest value comes from the first sample and beats all n2, or not
+    counts[n2 : n2 + (n1 - 1) * n2 + 1] += u_counts(n1 - 1, n2)
+    counts[: n1 * (n2 - 1) + 1] += u_counts(n1, n2 - 1)
+    return counts
+
+
+def mann_whitney(a, b):
+    # Two-sided p-value that a and b come from the same distribution. Exact
+    # without ties, else the tie-corrected normal approximation.
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    n1, n2 = len(a), len(b)
+    values, inverse, ties = np.unique(
+        np.concatenate([a, b]), return_inverse=True, return_counts=True
+    )
+    ranks = (np.cumsum(ties) - (ties - 1) / 2)[inverse]
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+
+    if (ties == 1).all():
+        counts = u_counts(n1, n2)
+        cdf = np.cumsum(counts) / counts.sum()
+        k = int(round(u))
+        below = cdf[k]
+        above = 1 - (cdf[k - 1] if k > 0 else 0)
+        return min(1.0, 2 * min(below, above))
+
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    var = n1 * n2 / 12 * ((n + 1) - (ties**3 - ties).sum() / (n * (n - 1)))
+    if var == 0:
+        return 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(var)
+    return math.erfc(max(z, 0) / math.sqrt(2))
+
+
+def bootstrap_ratio(a, b, resamples=10000, confidence=0.95, seed=0):
+    # Percentile CI of mean(b) / mean(a) - 1, resampling both sides
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    rng = np.random.default_rng(seed)
+    mean_a = rng.choice(a, (resamples, len(a))).mean(axis=1)
+    mean_b = rng.choice(b, (resamples, len(b))).mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = mean_b / mean_a - 1
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.nanpercentile(ratios, [tail, 100 - tail])
+    return low, high
@@ -0,0 +1,36 @@
+import numpy as np
+import stats
+
+# Columns added from the binary's interval samples; the end-to-end metrics
+# still cover the whole run, cold start included
+metrics = ["warmup_ms", "steady_ops_per_s", "steady_mbps"]
+# Fewer complete intervals than this are too short to tell warmup apart
+min_intervals = 5
+
+
+def steady_state(intervals):
+    # Cumulative samples from t=0, the last one taken when the work ended
+    t = np.concatenate([[0.0], intervals["t_ms"]]) / 1000
+    ops = np.concatenate([[0], intervals["ops"]])
+    nbytes = np.concatenate([[0], intervals["bytes"]])
+    # The final interval is partial and holds the drain, so it is left out
+    t, ops, nbytes = t[:-1], ops[:-1], nbytes[:-1]
+    if len(t) - 1 < min_intervals:
+        return None
+    rates = np.diff(ops) / np.diff(t)
+    d = stats.warmup_cutoff(rates)
+    elapsed = t[-1] - t[d]
+    return {
+        "warmup_ms": float(t[d] * 1000),
+        "steady_ops_per_s": float((ops[-1] - ops[d]) / elapsed),
+        "steady_mbps": float((nbytes[-1] - nbytes[d]) / elapsed / 2**20),
+    }
+
+
+def add_metrics(rec):
+    # Runs without intervals, or too short for them, report null
+    steady = None
+    if "intervals" in rec:
+        steady = steady_state(rec["intervals"])
+    rec["metrics"].update(steady or dict.fromkeys(metrics))
+    return rec
@@ -0,0 +1,244 @@
+import fnmatch
+import itertools
+import re
+import shlex
+from pathlib import Path
+from utils import data_dir, fig_dir
+import record
+import sampler
+import stats
+import cache
+import history
+import scheduler
+
+min_trials = 3
+max_trials = 10
+ci_target = 0.02  # Stop once the 95% CI half-width is within 2% of the mean
+use_cache = True
+# Specs that declare "cpus" may run points concurrently on disjoint cores
+parallel = False
+isolate_l3 = False
+validate = False
+# Set once any validated point disagrees between parallel and serial runs
+validation_failed = False
+# Plot the sampled timeline of every trial next to the other figures
+timeline_plots = False
+# Only run implementations matching one of these globs, and points whose
+# params match every name=value pair; empty means everything
+only_implementations = []
+only_params = {}
+# Print the command lines of the selected points instead of running them
+dry_run = False
+
+
+def implementation(label, program, **flags):
+    return {"label": label, "program": program, "flags": flags}
+
+
+def expand(spec):
+    # Cartesian product of the axes for every implementation, in spec order
+    axes = spec.get("axes", {})
+    names = list(axes)
+    plan = []
+    for impl in spec["implementations"]:
+        for values in itertools.product(*(axes[name] for name in names)):
+            params = dict(spec.get("params", {}))
+            params.update(impl["flags"])
+            params.update(zip(names, values))
+            plan.append(
+                {
+                    "benchmark": spec["name"],
+                    "implementation": impl["label"],
+                    "program": impl["program"],
+                    "axes": dict(zip(names, values)),
+                    "params": params,
+                }
+            )
+    return plan
+
+
+def selected(point):
+    if only_implementations and not any(
+        fnmatch.fnmatchcase(point["implementation"], pattern)
+        for pattern in only_implementations
+    ):
+        return False
+    # Flags an implementation does not set are off
+    return all(
+        str(point["params"].get(name, False)).lower() == value.lower()
+        for name, value in only_params.items()
+    )
+
+
+def run_point(spec, point, cpus=None):
+    kwargs = dict(point["params"])
+    if cpus is not None:
+        kwargs["cpus"] = cpus
+    # Runners return the binary's stdout, or the parsed record when they
+    # attach harness-side measurements to it
+    output = spec["runner"](point["program"], **kwargs)
+    rec = output if isinstance(output, dict) else record.parse(output)
+    sample = {metric: record.metric(rec, metric) for metric in spec["metrics"]}
+    sample["timeline"] = rec.pop("timeline", None)
+    sample["record"] = rec
+    return sample
+
+
+def trial_settings(spec):
+    return {
+        "min_trials": spec.get("min_trials", min_trials),
+        "max_trials": spec.get("max_trials", max_trials),
+        "ci_target": spec.get("ci_target", ci_target),
+    }
+
+
+def run_trials(spec, point, cpus=None):
+    settings = trial_settings(spec)
+
+    samples = []
+    while len(samples) < settings["max_trials"]:
+        samples.append(run_point(spec, point, cpus))
+        if len(samples) >= settings["min_trials"] and all(
+            stats.converged([s[metric] for s in samples], settings["ci_target"])
+            for metric in spec.get("converge_on", spec["metrics"])
+        ):
+            break
+    return samples
+
+
+def cached_trials(spec, point, cpus=None):
+    # Points are persisted as soon as they finish, so an interrupted sweep
+    # resumes where it stopped and only rebuilt binaries are re-measured
+    if not use_cache:
+        return run_trials(spec, point, cpus)
+    settings = trial_settings(spec)
+    samples = cache.load(spec, point, settings)
+    if samples is None:
+        samples = run_trials(spec, point, cpus)
+        cache.store(spec, point, settings, samples)
+    else:
+        print(f"cached: {point['implementation']} {point['axes']}")
+    return samples
+
+
+def timeline_name(point, trial):
+    parts = [point["implementation"]]
+    parts += [f"{axis}={value}" for axis, value in point["axes"].items()]
+    return (
+        re.sub(r"[^A-Za-z0-9.=-]+", "_", "_".join(parts)).strip("_") + f"_trial{trial}"
+    )
+
+
+def save_timeline(point, trial, samples):
+    # One CSV per trial under data/timelines/<benchmark>/, optionally plotted
+    name = timeline_name(point, trial)
+    df = sampler.frame(samples)
+    path = data_dir / "timelines" / point["benchmark"] / f"{name}.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False)
+    if timeline_plots:
+        title = f"{point['benchmark']} {name}"
+        sampler.plot(
+            df, title, fig_dir / "timelines" / point["benchmark"] / f"{name}.png"
+        )
+    return path
+
+
+def execute(spec, plan=None):
+    global validation_failed
+    if plan is None:
+        plan = [point for point in expand(spec) if selected(point)]
+    # Nothing to save or plot when every point is filtered out or only shown
+    if not plan:
+        return None
+    if dry_run:
+        for point in plan:
+            for args in spec["commands"](point["program"], **point["params"]):
+                print(shlex.join(str(arg) for arg in args))
+        return None
+
+    if parallel and "cpus" in spec:
+        # Validation compares fresh measurements, so it bypasses the cache
+        trials = run_trials if validate else cached_trials
+        all_samples = scheduler.run_parallel(
+            spec, plan, lambda point, cpus: trials(spec, point, cpus), isolate_l3
+        )
+        if validate:
+            serial_samples = [run_trials(spec, point) for point in plan]
+            if not scheduler.compare(spec, plan, all_samples, serial_samples):
+                validation_failed = True
+    else:
+        all_samples = [cached_trials(spec, point) for point in plan]
+
+    import pandas as pd
+
+    rows = []
+    for point, samples in zip(plan, all_samples):
+        base = {
+            "benchmark": point["benchmark"],
+            "implementation": point["implementation"],
+            "program": Path(point["program"]).name,
+        }
+        base.update(point["axes"])
+        binary_hash = cache.binary_hash(point["program"])
+
+        flags = {
+            metric: stats.outliers([s[metric] for s in samples])
+            for metric in spec["metrics"]
+        }
+        for i, sample in enumerate(samples):
+            row = dict(base, trial=i)
+            row.update({metric: sample[metric] for metric in spec["metrics"]})
+            row.update(record.provenance(sample["record"]))
+            row["binary_hash"] = binary_hash
+            if sample.get("timeline"):
+                row["timeline"] = str(save_timeline(point, i, sample["timeline"]))
+            for metric in spec["metrics"]:
+                row[f"{metric}_outlier"] = bool(flags[metric][i])
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def save_trials(trials, name):
+    # Written to data/<name>_trials.csv for this run and appended to the
+    # history database for trends across runs
+    path = data_dir / f"{name}_trials.csv"
+    trials.to_csv(path, index=False)
+    if history.enabled:
+        history.append(path)
+
+
+def summarize(trials, spec, metrics=None):
+    # One row per point; the metric column itself holds the mean
+    import pandas as pd
+
+    if metrics is None:
+        metrics = spec["metrics"]
+    keys = ["benchmark", "implementation", "program"] + list(spec.get("axes", {}))
+
+    rows = []
+    for values, group in trials.groupby(keys, sort=False):
+        row = dict(zip(keys, values), trials=len(group))
+        for metric in metrics:
+            for name, value in stats.describe(group[metric]).items():
+                row[metric if name == "mean" else f"{metric}_{name}"] = value
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def pivot(df, spec, axis, metric):
+    # Wide view for plotting, one column per implementation in spec order
+    labels = [impl["label"] for impl in spec["implementations"]]
+    wide = df.pivot(index=axis, columns="implementation", values=metric)
+    return wide.reindex(columns=[label for label in labels if label in wide])
+
+
+def pivot_errors(df, spec, axis, metric):
+    # Asymmetric error bars from the CI bounds, shaped for plt.errorbar
+    mean = pivot(df, spec, axis, metric)
+    low = pivot(df, spec, axis, f"{metric}_ci_low")
+    high = pivot(df, spec, axis, f"{metric}_ci_high")
+    return {
+        label: [mean[label] - low[label], high[label] - mean[label]]
+        for label in mean.columns
+    }
@@ -0,0 +1,133 @@
+import json
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+
+block_size = 1024 * 1024  # Unit of generation and verification
+pattern = "pcg64-block-v1"
+seed = 0x5EED
+# Blocks re-read and compared against the pattern on every validation
+spot_checks = 8
+max_workers = 8
+
+
+def test_file_path(size_mb, directory=Path(".")):
+    return directory / f"test_file_{size_mb}M.bin"
+
+
+def manifest_path(path):
+    return path.with_name(path.name + ".manifest.json")
+
+
+def block_data(index):
+    # Every block gets its own stream so any block can be regenerated alone,
+    # and random bytes defeat compressing or deduplicating filesystems
+    return np.random.default_rng([seed, index]).bytes(block_size)
+
+
+def write_blocks(path, first, last):
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        for index in range(first, last):
+            data = block_data(index)
+            offset = index * block_size
+            while data:
+                written = os.pwrite(fd, data, offset)
+                data = data[written:]
+                offset += written
+    finally:
+        os.close(fd)
+
+
+def read_manifest(path):
+    try:
+        return json.loads(manifest_path(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def validate(path, size_mb):
+    # Cheap check: manifest, size, mtime and a few sampled blocks
+    manifest = read_manifest(path)
+    if manifest is None:
+        return "no manifest"
+    expected = {"size": size_mb * 1024 * 1024, "pattern": pattern, "seed": seed}
+    for key, value in expected.items():
+        if manifest.get(key) != value:
+            return f"manifest {key} is {manifest.get(key)}, expected {value}"
+
+    try:
+        st = path.stat()
+    except OSError:
+        return "file missing"
+    if st.st_size != manifest["size"]:
+        return f"size is {st.st_size}, expected {manifest['size']}"
+    if st.st_mtime_ns != manifest["mtime_ns"]:
+        return "modified after provisioning"
+
+    num_blocks = manifest["size"] // block_size
+    sample = random.sample(range(num_blocks), min(spot_checks, num_blocks))
+    with open(path, "rb") as f:
+        for index in sample:
+            f.seek(index * block_size)
+            if f.read(block_size) != block_data(index):
+                return f"block {index} does not match the pattern"
+    return None
+
+
+def generate(path, size_mb):
+    size = size_mb * 1024 * 1024
+    manifest_path(path).unlink(missing_ok=True)
+
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # Preallocate extents up front so parallel writers do not fragment them
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError as e:
+            print(f"fallocate not supported on {path}: {e}")
+            os.ftruncate(fd, size)
+
+        num_blocks = size // block_size
+        workers = max(1, min(max_workers, os.cpu_count(), num_blocks))
+        bounds = [num_blocks * i // workers for i in range(workers + 1)]
+        print(f"Generating {path} ({size_mb} MB) with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(write_blocks, path, bounds[i], bounds[i + 1])
+                for i in range(workers)
+            ]
+            for future in futures:
+                future.result()
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    # The manifest is written last, so its presence marks a complete file
+    manifest = {
+        "size": size,
+        "pattern": pattern,
+        "seed": seed,
+        "block_size": block_size,
+        "mtime_ns": path.stat().st_mtime_ns,
+    }
+    manifest_path(path).write_text(json.dumps(manifest, indent=2))
+
+
+def provision(size_mb, directory=Path(".")):
+    path = test_file_path(size_mb, directory)
+    problem = validate(path, size_mb)
+    if problem is not None:
+        if path.exists():
+            print(f"Regenerating {path}: {problem}")
+        generate(path, size_mb)
+    return path
+
+
+if __name__ == "__main__":
+    # Provision several sizes up front, e.g. below and above RAM
+    for size_mb in sys.argv[1:]:
+        print(provision(int(size_mb)))